@@ -0,0 +1,200 @@
+"""
+Adaptive test sessions driven by the prerequisite graph.
+
+A session keeps, per graph node, the probability that the student has mastered it.
+Answers update that belief with a slip/guess model and propagate along the graph:
+a correct answer raises belief in every prerequisite, a wrong answer lowers belief in
+every dependent. The next question is the one with the largest expected drop in
+uncertainty, and the session stops once every node is decided either way.
+
+Only the answer log lives in the cache; beliefs are replayed from it on each step.
+Answers to one session are handled under a cache lock, so a double submit cannot
+record the same question twice or finish the session twice. The finished attempt
+stores the mastery inferred for every node, not only the questions asked, so that
+IITA does not read the skipped questions as failures.
+"""
+import math
+import random
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+from .knowledge_space import bits, structure_for
+from .models import Test
+
+SLIP = 0.1  # P(wrong answer | node mastered)
+GUESS = 0.2  # P(correct answer | node not mastered)
+PRIOR = 0.5
+DECIDED = 0.1  # A node is decided once its belief is within this distance of 0 or 1
+
+SESSION_TIMEOUT = 2 * 60 * 60
+LOCK_TIMEOUT = 30
+
+
+def load_structure(test_id, version=None):
+    """
+    Graph nodes, transitive prerequisite/dependent indices and questions of a test,
+    cached per graph version. Raises ValueError if the graph has a cycle.
+    """
+    if version is None:
+        version = Test.objects.filter(pk=test_id).values_list('graph__version', flat=True).get()
+    key = f'adaptive-structure:{test_id}:{version}'
+    structure = cache.get(key)
+    if structure is not None:
+        return structure
+
+    test = Test.objects.select_related('graph').get(pk=test_id)
+    knowledge = structure_for(test.graph)
+    structure = {
+        'version': version,
+        'nodes': knowledge.node_ids,
+        'ancestors': [list(bits(mask)) for mask in knowledge.ancestors],
+        'descendants': [list(bits(mask)) for mask in knowledge.descendants],
+        'questions': {
+            question.id: {
+                'node': knowledge.index[question.node_id],
+                'text': question.text,
+                'correct_answer': question.correct_answer,
+                'other_answers': question.other_answers,
+            }
+            for question in test.questions.order_by('testquestion__order')
+            # Questions picked from another graph cannot be placed in this one
+            if question.node_id in knowledge.index
+        },
+    }
+    cache.set(key, structure, SESSION_TIMEOUT)
+    return structure
+
+
+def _entropy(p):
+    if p <= 0 or p >= 1:
+        return 0.0
+    return -(p * math.log2(p) + (1 - p) * math.log2(1 - p))
+
+
+def _posterior(p, correct):
+    if correct:
+        mastered, unmastered = p * (1 - SLIP), (1 - p) * GUESS
+    else:
+        mastered, unmastered = p * SLIP, (1 - p) * (1 - GUESS)
+    return mastered / (mastered + unmastered)
+
+
+def _apply(beliefs, structure, node, correct):
+    """Update beliefs in place for one answer on ``node``."""
+    beliefs[node] = _posterior(beliefs[node], correct)
+    if correct:
+        for ancestor in structure['ancestors'][node]:
+            beliefs[ancestor] = max(beliefs[ancestor], beliefs[node])
+    else:
+        for descendant in structure['descendants'][node]:
+            beliefs[descendant] = min(beliefs[descendant], beliefs[node])
+
+
+def beliefs_for(structure, answers):
+    beliefs = [PRIOR] * len(structure['nodes'])
+    for question_id, correct in answers:
+        _apply(beliefs, structure, structure['questions'][question_id]['node'], correct)
+    return beliefs
+
+
+def _decided(p):
+    return p <= DECIDED or p >= 1 - DECIDED
+
+
+def _expected_information(beliefs, structure, node):
+    """Expected drop in total entropy from asking a question on ``node``."""
+    p = beliefs[node]
+    p_correct = p * (1 - SLIP) + (1 - p) * GUESS
+    gain = _entropy(p)
+
+    after = _posterior(p, True)
+    correct_gain = gain - _entropy(after)
+    for ancestor in structure['ancestors'][node]:
+        if beliefs[ancestor] < after:
+            correct_gain += _entropy(beliefs[ancestor]) - _entropy(after)
+
+    after = _posterior(p, False)
+    wrong_gain = gain - _entropy(after)
+    for descendant in structure['descendants'][node]:
+        if beliefs[descendant] > after:
+            wrong_gain += _entropy(beliefs[descendant]) - _entropy(after)
+
+    return p_correct * correct_gain + (1 - p_correct) * wrong_gain
+
+
+def next_question(structure, answers, beliefs):
+    """The unasked question on an undecided node with the highest expected information, or None."""
+    asked = {question_id for question_id, _ in answers}
+    best, best_gain = None, 0.0
+    scored_nodes = {}
+    for question_id, question in structure['questions'].items():
+        node = question['node']
+        if question_id in asked or _decided(beliefs[node]):
+            continue
+        if node not in scored_nodes:
+            scored_nodes[node] = _expected_information(beliefs, structure, node)
+        if scored_nodes[node] > best_gain:
+            best, best_gain = question_id, scored_nodes[node]
+    return best
+
+
+def serialize_question(structure, question_id):
+    question = structure['questions'][question_id]
+    answers = question['other_answers'] + [question['correct_answer']]
+    random.shuffle(answers)
+    return {"id": question_id, "text": question['text'], "answers": answers}
+
+
+def start_session(test_id, student_id):
+    structure = load_structure(test_id)
+    session_id = uuid.uuid4().hex
+    session = {'test': test_id, 'version': structure['version'], 'student': student_id, 'answers': [], 'pending': None}
+    session['pending'] = next_question(structure, [], beliefs_for(structure, []))
+    cache.set(f'adaptive-session:{session_id}', session, SESSION_TIMEOUT)
+    return session_id, session, structure
+
+
+def load_session(session_id):
+    return cache.get(f'adaptive-session:{session_id}')
+
+
+@contextmanager
+def session_lock(session_id):
+    """Yields whether the lock on the session was acquired; nobody else holds it meanwhile."""
+    key = f'adaptive-lock:{session_id}'
+    acquired = cache.add(key, 1, LOCK_TIMEOUT)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(key)
+
+
+def record_answer(session_id, session, answer):
+    """Grade the pending question, pick the next one and store the session."""
+    structure = load_structure(session['test'], session['version'])
+    question = structure['questions'][session['pending']]
+    session['answers'].append([session['pending'], int(answer == question['correct_answer'])])
+    beliefs = beliefs_for(structure, session['answers'])
+    session['pending'] = next_question(structure, session['answers'], beliefs)
+    cache.set(f'adaptive-session:{session_id}', session, SESSION_TIMEOUT)
+    return structure, beliefs
+
+
+def inferred_nodes(structure, beliefs):
+    """
+    Node id -> 1 if the node is believed mastered, else 0, as stored on the attempt.
+    Only answers can raise a belief above PRIOR, so untouched nodes count as 0. So do
+    nodes without a question in the test, as in a regular attempt.
+    """
+    tested = {question['node'] for question in structure['questions'].values()}
+    return {
+        str(node_id): int(node in tested and belief > PRIOR)
+        for node, (node_id, belief) in enumerate(zip(structure['nodes'], beliefs))
+    }
+
+
+def end_session(session_id):
+    cache.delete(f'adaptive-session:{session_id}')
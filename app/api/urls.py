@@ -1,14 +1,14 @@
 # your_app_name/urls.py
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 from ..views import (
-    CustomTokenObtainPairView, DownloadIQTFormView, GenerateGraphFromIITA, KnowledgeGraphWithTestResultDetailView, QuestionsForTestView, TestAttemptView, TestAttemptsView, TestListGraphView, TestListView, TestResultsView, TestsForGraphView, UserRegistrationView, TeacherView,
+    AdaptiveTestAnswerView, AdaptiveTestStartView, AttemptExportView, BulkEnrollmentView, CustomTokenObtainPairView, CustomTokenRefreshView, DownloadIQTFormView, GenerateGraphFromIITA, ItemStatisticsView, LiveTestResultsView, KnowledgeGraphWithTestResultDetailView, QuestionsForTestView, TestAttemptView, TestAttemptsView, TestListGraphView, TestListView, TestResultsView, TestsForGraphView, UserRegistrationView, TeacherView,
     KnowledgeGraphViewSet, GraphNodeViewSet, QuestionViewSet,
-    FirstQuestionView, KnowledgeGraphDetailView,TestCreationView
+    DuplicateQuestionsView, FirstQuestionView, KnowledgeGraphChangesView, KnowledgeGraphDetailView, KnowledgeGraphDiffView, KnowledgeGraphReductionView, KnowledgeSpaceView, LearningPathView, QTIImportView, SearchView, TestCreationView
 )
 
 urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='user-register'),
+    path('register/bulk/', BulkEnrollmentView.as_view(), name='bulk-enroll'),
     path('login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('graphs/', KnowledgeGraphViewSet.as_view({'get': 'list_graphs', 'post': 'create'}), name='graphs'),
     path('oneQuestion/', FirstQuestionView.as_view(), name='first-question'),
@@ -19,18 +19,31 @@ urlpatterns = [
          GraphNodeViewSet.as_view({'patch': 'update_with_prerequisites'}),
          name='update-node-with-prerequisites'),
     path('questions/', QuestionViewSet.as_view({'get': 'list', 'post': 'create'}), name='questions'),
+    path('questions/duplicates/', DuplicateQuestionsView.as_view(), name='duplicate-questions'),
+    path('questions/import/qti/', QTIImportView.as_view(), name='qti-import'),
     path('questions/<int:pk>/update/', QuestionViewSet.as_view({'patch': 'update_question'}), name='update-question'),
     path('questions/<int:pk>/delete/', QuestionViewSet.as_view({'delete': 'delete_question'}), name='delete-question'),
-    path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('teacheronly/', TeacherView.as_view(), name='teacher-only-view'),
     path('knowledge-graph/<int:pk>/', KnowledgeGraphDetailView.as_view(), name='knowledge-graph-detail'),
+    path('knowledge-graph/<int:pk>/changes/', KnowledgeGraphChangesView.as_view(), name='knowledge-graph-changes'),
+    path('knowledge-graph/<int:pk>/reduction/', KnowledgeGraphReductionView.as_view(), name='knowledge-graph-reduction'),
+    path('knowledge-graph/<int:pk>/diff/<int:other_pk>/', KnowledgeGraphDiffView.as_view(), name='knowledge-graph-diff'),
+    path('knowledge-graph/<int:pk>/knowledge-space/', KnowledgeSpaceView.as_view(), name='knowledge-space'),
     path('tests/', TestListView.as_view(), name='test-list'),
         path('tests-graph/', TestListGraphView.as_view(), name='test-list-graph'),
     path('tests/<int:test_id>/attempt/', TestAttemptView.as_view(), name='test_attempt'),
+    path('tests/<int:test_id>/adaptive/', AdaptiveTestStartView.as_view(), name='adaptive-start'),
+    path('tests/<int:test_id>/adaptive/<str:session_id>/', AdaptiveTestAnswerView.as_view(), name='adaptive-answer'),
     path('tests/create_test/', TestCreationView.as_view(), name='create_test'),
     path('tests/<int:test_id>/attempts/', TestAttemptsView.as_view(), name='test-attempts'),
     path('tests/<int:test_id>/results/', TestResultsView.as_view(), name='test-results'),
+    path('tests/<int:test_id>/results/live/', LiveTestResultsView.as_view(), name='test-results-live'),
+    path('tests/<int:test_id>/item-statistics/', ItemStatisticsView.as_view(), name='item-statistics'),
+    path('attempts/export/', AttemptExportView.as_view(), name='attempt-export'),
     path('generate-graph/<int:test_id>/', GenerateGraphFromIITA.as_view(), name='generate_graph'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('learning-path/', LearningPathView.as_view(), name='learning-path'),
     path('test-attempts/<int:test_attempt_id>/graph/', KnowledgeGraphWithTestResultDetailView.as_view(), name='test-attempt-graph'),
     path('tests-graph/<int:graph_id>/', TestsForGraphView.as_view(), name='tests_for_graph'),
     path('tests/<int:test_id>/questions/', QuestionsForTestView.as_view(), name='questions_for_test'),
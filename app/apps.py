@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class LearningGraphConfig(AppConfig):
+    name = 'app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
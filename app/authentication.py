@@ -1,13 +1,125 @@
+import datetime
+import threading
+import time
+
 from django.contrib.auth.backends import ModelBackend
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
 from .models import AppUser
 
+
 class AppUserBackend(ModelBackend):
-    def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = AppUser.objects.get(username=username)
-        except AppUser.DoesNotExist:
-            return None
-        
-        if user.check_password(password):
-            return user
-        return None
\ No newline at end of file
+    """
+    ModelBackend for AppUser. It is the only configured backend, so a failed login
+    costs one user lookup instead of one per backend.
+    """
+
+
+class AppTokenUser(TokenUser):
+    """
+    A user built from the claims CustomTokenObtainPairSerializer puts into the token:
+    id, user_type and the permissions granted directly or through groups.
+    """
+
+    @cached_property
+    def id(self):
+        # simplejwt stores the claim as a string
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def user_type(self):
+        return self.token.get('user_type', 'admin')
+
+    @cached_property
+    def permissions(self):
+        return frozenset(self.token.get('perms', ()))
+
+    def get_all_permissions(self, obj=None):
+        return set(self.permissions)
+
+    def has_perm(self, perm, obj=None):
+        return self.is_superuser or perm in self.permissions
+
+    def has_perms(self, perm_list, obj=None):
+        return all(self.has_perm(perm, obj) for perm in perm_list)
+
+    def has_module_perms(self, module):
+        return self.is_superuser or any(perm.startswith(f'{module}.') for perm in self.permissions)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication that never instantiates AppUser. Users are built from the
+    token claims (see SIMPLE_JWT['TOKEN_USER_CLASS']) and kept in a small
+    in-process cache for a few seconds. The revocation check on the user row therefore
+    runs at most once per token and interval, and a revocation reaches other worker
+    processes within ``cache_ttl`` seconds.
+    """
+
+    cache_ttl = 30
+    cache_size = 10_000
+
+    _users = {}
+    _lock = threading.Lock()
+
+    def get_user(self, validated_token):
+        key = validated_token.get(api_settings.JTI_CLAIM) or str(validated_token)
+        now = time.monotonic()
+
+        entry = self._users.get(key)
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        user = super().get_user(validated_token)
+        row = AppUser.objects.filter(pk=user.id).values_list('is_active', 'tokens_revoked_at').first()
+        if row is None or not row[0] or issued_before_revocation(validated_token.get('iat', 0), row[1]):
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+
+        with self._lock:
+            if len(self._users) >= self.cache_size:
+                self._users.clear()
+            self._users[key] = (user, now + self.cache_ttl)
+        return user
+
+    @classmethod
+    def forget(cls, user_id):
+        with cls._lock:
+            for key, (user, _) in list(cls._users.items()):
+                if user.id == user_id:
+                    del cls._users[key]
+
+
+def issued_before_revocation(issued_at, revoked_at):
+    return revoked_at is not None and issued_at < revoked_at.timestamp()
+
+
+def revoke_tokens(*user_ids):
+    """
+    Reject every token issued to the users before the current second. Stored on the
+    user row, so no cache eviction or worker boundary can undo it.
+    """
+    revoked_at = datetime.datetime.fromtimestamp(int(time.time()), tz=datetime.timezone.utc)
+    AppUser.objects.filter(pk__in=user_ids).update(tokens_revoked_at=revoked_at)
+    for user_id in user_ids:
+        StatelessJWTAuthentication.forget(user_id)
+
+
+def stream_user(request):
+    """
+    Token user of a plain Django (non-DRF) streaming view, or None. The token comes from
+    the Authorization header or, since EventSource cannot send headers, ``?token=``.
+    """
+    authentication = StatelessJWTAuthentication()
+    try:
+        raw_token = request.GET.get('token')
+        if raw_token:
+            return authentication.get_user(authentication.get_validated_token(raw_token))
+        result = authentication.authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        return None
+    return result[0] if result else None
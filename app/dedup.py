@@ -0,0 +1,211 @@
+"""
+Near-duplicate question detection with MinHash and locality-sensitive hashing.
+
+A question's text and answers are normalized and cut into character shingles. Its
+MinHash signature estimates the Jaccard similarity of two shingle sets. The
+signature is split into bands, and each band is hashed into a bucket. Questions that
+share a bucket become candidates, so finding duplicates never compares every pair.
+With 16 bands of 4 rows, pairs above roughly 0.5 similarity are likely to collide.
+"""
+import hashlib
+import re
+from collections import defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Question, QuestionBucket, QuestionSignature
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE = 4
+THRESHOLD = 0.8
+PRIME = (1 << 31) - 1
+
+_rng = np.random.default_rng(20240229)  # Fixed: signatures are stored and must stay comparable
+_A = _rng.integers(1, PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, PRIME, NUM_PERM, dtype=np.uint64)
+_SPACE = re.compile(r'\s+')
+
+
+def question_content(text, correct_answer, other_answers):
+    """Normalized text; answer order does not matter for duplicates."""
+    answers = sorted(str(answer) for answer in (other_answers or []))
+    content = ' | '.join([text, str(correct_answer), *answers])
+    return _SPACE.sub(' ', content.lower()).strip()
+
+
+def shingles(content):
+    if len(content) <= SHINGLE:
+        return {content}
+    return {content[i:i + SHINGLE] for i in range(len(content) - SHINGLE + 1)}
+
+
+def _hash32(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=4).digest(), 'little')
+
+
+def minhash(content):
+    values = np.fromiter((_hash32(shingle) % PRIME for shingle in shingles(content)), dtype=np.uint64)
+    # (a * x + b) mod p for all permutations at once; a, x < 2^31 so nothing overflows
+    hashed = (_A[:, None] * values[None, :] + _B[:, None]) % PRIME
+    return hashed.min(axis=1).tolist()
+
+
+def band_buckets(signature):
+    """Signed 64-bit bucket key for each band of a signature; the band is part of the key."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(repr((band, signature[band * ROWS:(band + 1) * ROWS])).encode(), digest_size=8).digest(),
+            'little', signed=True,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def _signature_rows(questions):
+    """(QuestionSignature, buckets) for (id, text, correct_answer, other_answers) rows."""
+    for question_id, text, correct_answer, other_answers in questions:
+        content = question_content(text, correct_answer, other_answers)
+        signature = minhash(content)
+        content_hash = hashlib.sha1(content.encode()).hexdigest()
+        yield (
+            QuestionSignature(question_id=question_id, content_hash=content_hash, minhash=signature),
+            [QuestionBucket(question_id=question_id, band=band, bucket=bucket)
+             for band, bucket in enumerate(band_buckets(signature))],
+        )
+
+
+def index_question(question):
+    """(Re)compute one question's signature and buckets, skipping unchanged content."""
+    content = question_content(question.text, question.correct_answer, question.other_answers)
+    content_hash = hashlib.sha1(content.encode()).hexdigest()
+    if QuestionSignature.objects.filter(question_id=question.pk, content_hash=content_hash).exists():
+        return
+    row = (question.pk, question.text, question.correct_answer, question.other_answers)
+    signature, buckets = next(_signature_rows([row]))
+    with transaction.atomic():
+        QuestionBucket.objects.filter(question_id=question.pk).delete()
+        QuestionSignature.objects.update_or_create(
+            question_id=question.pk, defaults={'content_hash': content_hash, 'minhash': signature.minhash},
+        )
+        QuestionBucket.objects.bulk_create(buckets)
+
+
+def index_missing(batch_size=1000, progress=None):
+    """Signatures for questions that have none yet, e.g. after bulk imports. Returns the count."""
+    missing = (
+        Question.objects.filter(signature__isnull=True).order_by('id')
+        .values_list('id', 'text', 'correct_answer', 'other_answers')
+    )
+    indexed = 0
+    batch = []
+    for row in missing.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            indexed += _index_batch(batch)
+            batch = []
+            if progress:
+                progress(indexed)
+    if batch:
+        indexed += _index_batch(batch)
+    return indexed
+
+
+def _index_batch(rows):
+    signatures, buckets = [], []
+    for signature, question_buckets in _signature_rows(rows):
+        signatures.append(signature)
+        buckets.extend(question_buckets)
+    with transaction.atomic():
+        QuestionSignature.objects.bulk_create(signatures, ignore_conflicts=True)
+        QuestionBucket.objects.bulk_create(buckets, batch_size=5000)
+    return len(signatures)
+
+
+def find_clusters(graph_id=None, threshold=THRESHOLD):
+    """
+    Groups of near-duplicate questions, largest first. With ``graph_id`` only clusters
+    containing a question of that graph are returned; their other members may live in
+    any graph.
+    """
+    # Only buckets holding more than one question are read back
+    shared = QuestionBucket.objects.values('bucket').annotate(size=Count('id')).filter(size__gt=1)
+    if graph_id is not None:
+        shared = shared.filter(bucket__in=QuestionBucket.objects.filter(question__node__graph_id=graph_id).values('bucket'))
+    buckets = defaultdict(list)
+    rows = QuestionBucket.objects.filter(bucket__in=shared.values('bucket')).order_by('bucket', 'question_id')
+    for bucket, question_id in rows.values_list('bucket', 'question_id').iterator(chunk_size=5000):
+        buckets[bucket].append(question_id)
+    candidates = list(buckets.values())
+    if not candidates:
+        return []
+
+    question_ids = {question_id for members in candidates for question_id in members}
+    signatures = dict(QuestionSignature.objects.filter(question_id__in=question_ids).values_list('question_id', 'minhash'))
+
+    parent = {}
+
+    def find(question_id):
+        parent.setdefault(question_id, question_id)
+        while parent[question_id] != question_id:
+            parent[question_id] = parent[parent[question_id]]
+            question_id = parent[question_id]
+        return question_id
+
+    pair_similarity = {}
+    for members in candidates:
+        # Exact copies share a signature and join at once, which keeps huge buckets of
+        # copies linear; the distinct signatures are then compared pairwise
+        copies = defaultdict(list)
+        for question_id in members:
+            copies[tuple(signatures[question_id])].append(question_id)
+        for first, *others in copies.values():
+            for other in others:
+                parent[find(other)] = find(first)
+                pair_similarity[first, other] = 1.0
+        distinct = [ids[0] for ids in copies.values()]
+        if len(distinct) < 2:
+            continue
+        matrix = np.array([signatures[question_id] for question_id in distinct])
+        for i, first in enumerate(distinct[:-1]):
+            scores = (matrix[i + 1:] == matrix[i]).sum(axis=1) / NUM_PERM
+            for offset in np.flatnonzero(scores >= threshold).tolist():
+                other = distinct[i + 1 + offset]
+                parent[find(other)] = find(first)
+                pair_similarity[first, other] = float(scores[offset])
+
+    clusters = defaultdict(set)
+    for question_id in parent:
+        clusters[find(question_id)].add(question_id)
+    root_similarity = defaultdict(lambda: 1.0)
+    for (first, _), score in pair_similarity.items():
+        root = find(first)
+        root_similarity[root] = min(root_similarity[root], score)
+
+    questions = {
+        question['id']: question
+        for question in Question.objects.filter(id__in=parent).values('id', 'text', 'node_id', 'node__graph_id')
+    }
+    result = [
+        {
+            "similarity": root_similarity[root],
+            "questions": [
+                {
+                    "id": question_id,
+                    "text": questions[question_id]['text'],
+                    "node": questions[question_id]['node_id'],
+                    "graph": questions[question_id]['node__graph_id'],
+                }
+                for question_id in sorted(members)
+            ],
+        }
+        for root, members in clusters.items()
+        if len(members) > 1
+    ]
+    if graph_id is not None:
+        result = [cluster for cluster in result if any(q["graph"] == graph_id for q in cluster["questions"])]
+    result.sort(key=lambda cluster: (-len(cluster["questions"]), cluster["questions"][0]["id"]))
+    return result
@@ -0,0 +1,140 @@
+"""
+Transitive reduction and structural comparison of prerequisite graphs.
+
+An edge p -> d is redundant when p is also an ancestor of another direct prerequisite
+of d. With the ancestor bitsets of a KnowledgeStructure, finding all such edges is one
+OR per edge. The reduction is the graph without them, and it has the same
+prerequisite closure.
+
+The diff matches two graphs' nodes by title. Typical use is an original graph against
+its "(IITA)" clone. Edges are compared directly and through their closures, because
+IITA produces transitive relations.
+"""
+from django.db import transaction
+
+from .knowledge_space import KnowledgeStructure, bits, structure_for
+from .models import GraphNode
+
+
+def redundant_edges(knowledge):
+    """(prerequisite node id, dependent node id) of every transitively implied edge."""
+    return [
+        (knowledge.node_ids[p], knowledge.node_ids[i])
+        for i in range(knowledge.size)
+        for p in bits(knowledge.redundant_prerequisites(i))
+    ]
+
+
+def reduce_edges(edges):
+    """
+    Transitive reduction of (prerequisite, dependent) pairs, in their original order.
+    Of two opposite pairs only the first is kept, as when a derived graph is written.
+    Raises ValueError when the remaining pairs contain a cycle.
+    """
+    kept = []
+    seen = set()
+    for edge in edges:
+        if edge[0] != edge[1] and edge not in seen and edge[::-1] not in seen:
+            seen.add(edge)
+            kept.append(edge)
+    node_ids = sorted({node_id for edge in kept for node_id in edge})
+    redundant = set(redundant_edges(KnowledgeStructure(node_ids, kept)))
+    return [edge for edge in kept if edge not in redundant]
+
+
+def reduce_graph(graph):
+    """Remove a graph's redundant edges; returns them. Raises ValueError on cycles."""
+    redundant = redundant_edges(structure_for(graph))
+    by_dependent = {}
+    for prerequisite_id, dependent_id in redundant:
+        by_dependent.setdefault(dependent_id, []).append(prerequisite_id)
+    with transaction.atomic():
+        # Through the related managers, so the graph's change log records the edges
+        for node in GraphNode.objects.filter(id__in=by_dependent):
+            node.prerequisite_nodes.remove(*by_dependent[node.id])
+    return redundant
+
+
+def _titles(knowledge, graph):
+    """Title -> node index; raises ValueError on duplicate titles."""
+    index = {}
+    for node_id, title in GraphNode.objects.filter(graph=graph).values_list('id', 'title'):
+        if title in index:
+            raise ValueError(f"Graph {graph.id} has more than one node titled '{title}'.")
+        index[title] = knowledge.index[node_id]
+    return index
+
+
+def _scores(common, reference_total, candidate_total):
+    precision = common / candidate_total if candidate_total else 1.0
+    recall = common / reference_total if reference_total else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def diff(reference, candidate):
+    """
+    Compare ``candidate``'s edges to ``reference``'s over the nodes with the same title.
+    Raises ValueError on duplicate titles or cyclic graphs.
+    """
+    ref, cand = structure_for(reference), structure_for(candidate)
+    ref_titles, cand_titles = _titles(ref, reference), _titles(cand, candidate)
+    common = ref_titles.keys() & cand_titles.keys()
+    title_of = {index: title for title, index in ref_titles.items()}
+
+    # Candidate bitsets translated to reference node indices, restricted to common nodes
+    to_reference = {cand_titles[title]: ref_titles[title] for title in common}
+    shared = sum(1 << ref_titles[title] for title in common)
+
+    def translate(mask):
+        translated = 0
+        for i in bits(mask):
+            if i in to_reference:
+                translated |= 1 << to_reference[i]
+        return translated
+
+    cand_prerequisites, cand_ancestors = [0] * ref.size, [0] * ref.size
+    for i, j in to_reference.items():
+        cand_prerequisites[j] = translate(cand.prerequisites[i])
+        cand_ancestors[j] = translate(cand.ancestors[i])
+
+    def edge(p, d):
+        return {"source": title_of[p], "target": title_of[d]}
+
+    added, implied, removed, indirect = [], [], [], []
+    counts = {"ref_edges": 0, "cand_edges": 0, "common_edges": 0, "ref_closure": 0, "cand_closure": 0, "common_closure": 0}
+    for title in sorted(common):
+        d = ref_titles[title]
+        ref_direct, ref_closure = ref.prerequisites[d] & shared, ref.ancestors[d] & shared
+        cand_direct, cand_closure = cand_prerequisites[d], cand_ancestors[d]
+        added.extend(edge(p, d) for p in bits(cand_direct & ~ref_closure))
+        implied.extend(edge(p, d) for p in bits(cand_direct & ref_closure & ~ref_direct))
+        removed.extend(edge(p, d) for p in bits(ref_direct & ~cand_closure))
+        indirect.extend(edge(p, d) for p in bits(ref_direct & cand_closure & ~cand_direct))
+        counts["ref_edges"] += ref_direct.bit_count()
+        counts["cand_edges"] += cand_direct.bit_count()
+        counts["common_edges"] += (ref_direct & cand_direct).bit_count()
+        counts["ref_closure"] += ref_closure.bit_count()
+        counts["cand_closure"] += cand_closure.bit_count()
+        counts["common_closure"] += (ref_closure & cand_closure).bit_count()
+
+    return {
+        "reference": reference.id,
+        "candidate": candidate.id,
+        "matched_nodes": len(common),
+        "unmatched": {
+            "reference": sorted(ref_titles.keys() - common),
+            "candidate": sorted(cand_titles.keys() - common),
+        },
+        # added: not implied by the reference at all; implied: transitive shortcuts of
+        # reference paths; removed: no longer implied; indirect: now only implied
+        "edges": {"added": added, "implied": implied, "removed": removed, "indirect": indirect},
+        "metrics": {
+            "edges": _scores(counts["common_edges"], counts["ref_edges"], counts["cand_edges"]),
+            "closure": _scores(counts["common_closure"], counts["ref_closure"], counts["cand_closure"]),
+        },
+        "redundant_edges": {
+            "reference": len(redundant_edges(ref)),
+            "candidate": len(redundant_edges(cand)),
+        },
+    }
@@ -0,0 +1,233 @@
+"""
+Bulk student enrollment from CSV or JSONL rosters.
+
+``enroll`` accepts every user type and creates the groups a roster names, as the
+enroll_students command needs. Callers acting for a user pass ``user_types`` and
+``groups`` to limit rows to what that user may grant.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from .models import AppUser
+from .workers import setup_django
+
+ROSTER_FORMATS = ('csv', 'jsonl')
+USER_TYPES = {choice for choice, _ in AppUser.USER_TYPE_CHOICES}
+# Smaller batches are hashed in-process; spawning the pool would cost more than it saves
+MIN_POOL_PASSWORDS = 100
+username_validator = UnicodeUsernameValidator()
+
+
+def read_roster(fileobj, fmt):
+    """Yield roster rows as dicts from a text or binary file object."""
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = io.TextIOWrapper(fileobj, encoding='utf-8-sig')
+    if fmt == 'csv':
+        yield from csv.DictReader(fileobj)
+    elif fmt == 'jsonl':
+        for line in fileobj:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                # Reported against its row by validate_row()
+                yield f'Invalid JSON: {e}'
+    else:
+        raise ValueError(f"Unsupported roster format {fmt!r}, expected one of {', '.join(ROSTER_FORMATS)}.")
+
+
+def roster_format(filename):
+    extension = os.path.splitext(filename)[1].lstrip('.').lower()
+    return {'json': 'jsonl', 'ndjson': 'jsonl'}.get(extension, extension)
+
+
+class HashPool:
+    """
+    Process pool for hashing passwords in parallel, whatever hasher PASSWORD_HASHERS
+    selects. The workers are only spawned for the first batch of at least
+    MIN_POOL_PASSWORDS passwords, so small rosters never start processes.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or getattr(settings, 'ENROLLMENT_HASH_WORKERS', None) or os.cpu_count() or 1
+        self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def hash(self, passwords):
+        if self.workers == 1 or len(passwords) < MIN_POOL_PASSWORDS:
+            return [make_password(password) for password in passwords]
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context('spawn'), initializer=setup_django
+            )
+        return list(self.executor.map(make_password, passwords, chunksize=32))
+
+
+def hash_passwords(passwords, pool=None):
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    return pool.hash(passwords)
+
+
+def validate_row(row, user_types=USER_TYPES, groups=None):
+    """
+    Return (cleaned row, errors) for one roster row. Only ``user_types`` are accepted,
+    and only the ``groups`` names unless ``groups`` is None.
+    """
+    if not isinstance(row, dict):
+        return {'username': ''}, {'row': row if isinstance(row, str) else 'Expected an object.'}
+
+    errors = {}
+    cleaned = {
+        'username': str(row.get('username') or '').strip(),
+        'password': str(row.get('password') or ''),
+        'email': str(row.get('email') or '').strip(),
+        'first_name': str(row.get('first_name') or '').strip(),
+        'last_name': str(row.get('last_name') or '').strip(),
+        'user_type': str(row.get('user_type') or 'student').strip(),
+    }
+    names = row.get('groups') or []
+    if isinstance(names, str):
+        names = names.split(';')
+    cleaned['groups'] = [name.strip() for name in names if name and name.strip()]
+
+    if not cleaned['username']:
+        errors['username'] = 'This field is required.'
+    else:
+        try:
+            username_validator(cleaned['username'])
+        except ValidationError as e:
+            errors['username'] = ' '.join(e.messages)
+    if not cleaned['password']:
+        errors['password'] = 'This field is required.'
+    if cleaned['email']:
+        try:
+            validate_email(cleaned['email'])
+        except ValidationError as e:
+            errors['email'] = ' '.join(e.messages)
+    if cleaned['user_type'] not in USER_TYPES:
+        errors['user_type'] = f"\"{cleaned['user_type']}\" is not a valid choice."
+    elif cleaned['user_type'] not in user_types:
+        errors['user_type'] = f"You cannot enroll users of type \"{cleaned['user_type']}\"."
+    if groups is not None:
+        forbidden = sorted(set(cleaned['groups']) - set(groups))
+        if forbidden:
+            errors['groups'] = f"You cannot add users to: {', '.join(forbidden)}."
+    return cleaned, errors
+
+
+def enroll(rows, batch_size=1000, workers=None, progress=None, user_types=USER_TYPES, groups=None):
+    """
+    Create users from roster rows in batches. Invalid rows are reported with their
+    1-based row number and skipped; they never abort the rest of the roster. Rows
+    with a user type outside ``user_types``, or groups outside ``groups`` when it is
+    given, are invalid; with ``groups=None`` missing groups are created.
+    """
+    report = {'total': 0, 'created': 0, 'errors': []}
+    allowed = {'user_types': user_types, 'groups': groups}
+    with HashPool(workers) as pool:
+        batch = []
+        for number, row in enumerate(rows, start=1):
+            report['total'] += 1
+            batch.append((number, row))
+            if len(batch) >= batch_size:
+                _enroll_batch(batch, report, pool, allowed)
+                batch = []
+                if progress:
+                    progress(report)
+        if batch:
+            _enroll_batch(batch, report, pool, allowed)
+            if progress:
+                progress(report)
+    report['errors'].sort(key=lambda error: error['row'])
+    return report
+
+
+def _enroll_batch(batch, report, pool, allowed):
+    valid = []
+    seen = set()
+    for number, row in batch:
+        cleaned, errors = validate_row(row, **allowed)
+        if not errors and cleaned['username'] in seen:
+            errors['username'] = 'Duplicate username in roster.'
+        if errors:
+            report['errors'].append({'row': number, 'username': cleaned['username'], 'errors': errors})
+            continue
+        seen.add(cleaned['username'])
+        valid.append((number, cleaned))
+
+    existing = set(AppUser.objects.filter(username__in=seen).values_list('username', flat=True))
+    for number, cleaned in valid:
+        if cleaned['username'] in existing:
+            report['errors'].append({
+                'row': number, 'username': cleaned['username'],
+                'errors': {'username': 'A user with that username already exists.'},
+            })
+    valid = [(number, cleaned) for number, cleaned in valid if cleaned['username'] not in existing]
+    if not valid:
+        return
+
+    hashes = hash_passwords([cleaned['password'] for _, cleaned in valid], pool)
+    users = [
+        AppUser(
+            username=cleaned['username'], password=password_hash, email=cleaned['email'],
+            first_name=cleaned['first_name'], last_name=cleaned['last_name'], user_type=cleaned['user_type'],
+        )
+        for (_, cleaned), password_hash in zip(valid, hashes)
+    ]
+
+    try:
+        with transaction.atomic():
+            users = AppUser.objects.bulk_create(users)
+            _assign_groups(users, [cleaned['groups'] for _, cleaned in valid])
+        report['created'] += len(users)
+    except IntegrityError:
+        # Someone registered one of these usernames meanwhile: fall back to row by row
+        for (number, cleaned), user in zip(valid, users):
+            try:
+                with transaction.atomic():
+                    user.pk = None
+                    user.save()
+                    _assign_groups([user], [cleaned['groups']])
+                report['created'] += 1
+            except IntegrityError:
+                report['errors'].append({
+                    'row': number, 'username': cleaned['username'],
+                    'errors': {'username': 'A user with that username already exists.'},
+                })
+
+
+def _assign_groups(users, group_names):
+    names = {name for names in group_names for name in names}
+    if not names:
+        return
+    groups = {group.name: group for group in Group.objects.filter(name__in=names)}
+    missing = names - groups.keys()
+    if missing:
+        Group.objects.bulk_create([Group(name=name) for name in missing], ignore_conflicts=True)
+        groups = {group.name: group for group in Group.objects.filter(name__in=names)}
+    Membership = AppUser.groups.through
+    Membership.objects.bulk_create(
+        [Membership(appuser_id=user.pk, group_id=groups[name].pk) for user, names in zip(users, group_names) for name in names],
+        ignore_conflicts=True,
+    )
@@ -0,0 +1,244 @@
+"""
+Streaming export of test attempts for research, one row per answered question. An
+attempt without answers still gets one row, with empty question columns, so that
+every attempt archived from the database can be read back.
+
+Attempts are read in id order through ``QuerySet.iterator``, which uses a server-side
+cursor on PostgreSQL. Question-to-node mappings are resolved per chunk. Memory use
+therefore depends on the chunk size, not on the number of attempts, whether the rows
+go to a ``StreamingHttpResponse`` or to a file. Under ASGI the response needs
+``async_chunks``: Django would otherwise read a synchronous iterator to the end
+before sending the first byte. Archived attempts (see
+app/partitions.py) are read back from their Parquet files, ahead of the attempts
+still in the database.
+"""
+import csv
+import datetime
+from itertools import chain
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import AttemptArchive, Question, TestAttempt
+
+EXPORT_FORMATS = ('csv', 'parquet')
+CONTENT_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+COLUMNS = (
+    'attempt_id', 'test_id', 'graph_id', 'student_id', 'submitted_at', 'score',
+    'question_id', 'node_id', 'node_title', 'correct', 'response',
+)
+CHUNK_SIZE = 2000
+
+
+def load_pyarrow():
+    """
+    pyarrow with its compute and parquet modules, or None when it is not installed.
+    Imported on first use, as it would add to the start-up time and memory of every
+    worker.
+    """
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:  # Only needed for the parquet format and archived attempts
+        return None
+    return pyarrow
+
+
+def parse_bound(value):
+    """Aware datetime from an ISO date or datetime; naive values are in the current time zone."""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date {value!r}, expected YYYY-MM-DD or an ISO 8601 datetime.")
+        parsed = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def attempts_queryset(test_id=None, graph_id=None, since=None, until=None):
+    """Attempts in scope; ``since`` is inclusive and ``until`` exclusive."""
+    attempts = TestAttempt.objects.all()
+    if test_id is not None:
+        attempts = attempts.filter(test_id=test_id)
+    if graph_id is not None:
+        attempts = attempts.filter(test__graph_id=graph_id)
+    if since is not None:
+        attempts = attempts.filter(submitted_at__gte=since)
+    if until is not None:
+        attempts = attempts.filter(submitted_at__lt=until)
+    return attempts
+
+
+def export_rows(attempts, chunk_size=CHUNK_SIZE):
+    """Yield lists of row tuples in COLUMNS order, one list per chunk of attempts."""
+    rows = (
+        attempts.order_by('id')
+        .values_list('id', 'test_id', 'test__graph_id', 'student_id', 'submitted_at', 'score', 'answers', 'responses')
+        .iterator(chunk_size=chunk_size)
+    )
+    nodes = {}
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield _expand(chunk, nodes)
+            chunk = []
+    if chunk:
+        yield _expand(chunk, nodes)
+
+
+def _expand(chunk, nodes):
+    missing = {int(question_id) for *_, answers, _ in chunk for question_id in answers} - nodes.keys()
+    if missing:
+        nodes.update(
+            (question_id, (node_id, title))
+            for question_id, node_id, title in Question.objects.filter(id__in=missing)
+            .values_list('id', 'node_id', 'node__title')
+        )
+    rows = []
+    for attempt_id, test_id, graph_id, student_id, submitted_at, score, answers, responses in chunk:
+        if not answers:
+            rows.append((attempt_id, test_id, graph_id, student_id, submitted_at, score, None, None, None, None, None))
+            continue
+        responses = responses or {}
+        for question_id, correct in answers.items():
+            # Questions deleted since the attempt keep their row without a node
+            node_id, node_title = nodes.get(int(question_id), (None, None))
+            rows.append((
+                attempt_id, test_id, graph_id, student_id, submitted_at, score,
+                int(question_id), node_id, node_title, int(correct), responses.get(question_id),
+            ))
+    return rows
+
+
+class _Buffer:
+    """File-like object that hands back whatever was written since the last ``take``."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+class _TextWriter:
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def write(self, text):
+        return self.buffer.write(text.encode())
+
+
+def csv_chunks(chunks):
+    buffer = _Buffer()
+    writer = csv.writer(_TextWriter(buffer))
+    writer.writerow(COLUMNS)
+    yield buffer.take()
+    for rows in chunks:
+        writer.writerows(
+            (*row[:4], row[4].isoformat() if row[4] else '', *row[5:]) for row in rows
+        )
+        yield buffer.take()
+
+
+def parquet_chunks(chunks):
+    """One row group per chunk of attempts; the footer is written last."""
+    pyarrow = load_pyarrow()
+    schema = pyarrow.schema([
+        ('attempt_id', pyarrow.int64()), ('test_id', pyarrow.int64()), ('graph_id', pyarrow.int64()),
+        ('student_id', pyarrow.int64()), ('submitted_at', pyarrow.timestamp('us', tz='UTC')),
+        ('score', pyarrow.float64()), ('question_id', pyarrow.int64()), ('node_id', pyarrow.int64()),
+        ('node_title', pyarrow.string()), ('correct', pyarrow.int8()), ('response', pyarrow.string()),
+    ])
+    buffer = _Buffer()
+    with pyarrow.parquet.ParquetWriter(buffer, schema, compression='zstd') as writer:
+        for rows in chunks:
+            if rows:
+                columns = list(zip(*rows))
+                writer.write_table(pyarrow.Table.from_arrays(
+                    [pyarrow.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema,
+                ))
+                yield buffer.take()
+    yield buffer.take()
+
+
+def archived_rows(archives, test_id=None, graph_id=None, since=None, until=None, chunk_size=CHUNK_SIZE):
+    """Like ``export_rows``, for the attempts in scope stored in AttemptArchive files."""
+    pyarrow = load_pyarrow()
+    for archive in archives:
+        parquet = pyarrow.parquet.ParquetFile(archive.path)
+        for batch in parquet.iter_batches(batch_size=chunk_size * 10):
+            mask = pyarrow.array([True] * batch.num_rows)
+            for column, operator, value in (
+                ('test_id', 'equal', test_id), ('graph_id', 'equal', graph_id),
+                ('submitted_at', 'greater_equal', since), ('submitted_at', 'less', until),
+            ):
+                if value is not None:
+                    mask = pyarrow.compute.and_(mask, getattr(pyarrow.compute, operator)(batch.column(column), value))
+            batch = batch.filter(mask)
+            if batch.num_rows:
+                yield list(zip(*(column.to_pylist() for column in batch.columns)))
+
+
+def encode(chunks, fmt):
+    """Yield chunks of export rows encoded as ``fmt`` bytes."""
+    if fmt == 'csv':
+        return csv_chunks(chunks)
+    if fmt == 'parquet':
+        if load_pyarrow() is None:
+            raise ValueError("The parquet format requires the pyarrow package.")
+        return parquet_chunks(chunks)
+    raise ValueError(f"Unsupported export format {fmt!r}, expected one of {', '.join(EXPORT_FORMATS)}.")
+
+
+async def async_chunks(chunks):
+    """
+    Iterate ``chunks`` from async code one chunk at a time. Every chunk is produced
+    on the same thread, which keeps the database cursor on its connection.
+    """
+    chunks = iter(chunks)
+    done = object()
+    while True:
+        chunk = await sync_to_async(next)(chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def export(fmt, test_id=None, graph_id=None, since=None, until=None, chunk_size=CHUNK_SIZE):
+    """Yield the encoded export of the attempts in scope, archived ones first, as byte chunks."""
+    archives = AttemptArchive.objects.all()
+    if since is not None:
+        archives = archives.filter(until__gt=since)
+    if until is not None:
+        archives = archives.filter(since__lt=until)
+    archives = list(archives)
+    if archives and load_pyarrow() is None:
+        raise ValueError("Reading archived attempts requires the pyarrow package.")
+    attempts = attempts_queryset(test_id, graph_id, since, until)
+    return encode(chain(
+        archived_rows(archives, test_id, graph_id, since, until, chunk_size),
+        export_rows(attempts, chunk_size),
+    ), fmt)
@@ -0,0 +1,61 @@
+"""
+Idempotency keys for test submissions.
+
+A client sends an ``Idempotency-Key`` header (or ``idempotency_key`` in the body) with
+a submission, and reuses it when it retries. The first submission stores its response
+in a SubmissionReceipt, which is unique per student and key. Later submissions with
+the key get that response back, with no scoring and no new attempt. Retries usually
+arrive within seconds, so receipts are also cached for a few minutes and most
+replays never reach the database.
+
+If two submissions with the same key race, both score an attempt. The unique
+constraint lets only one of them commit. The other rolls back its attempt and replays
+the response of the one that committed.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import SubmissionReceipt
+
+HEADER = 'Idempotency-Key'
+MAX_LENGTH = 255
+RECEIPT_TIMEOUT = 10 * 60
+
+
+def submission_key(request):
+    """The request's idempotency key, or None. Raises ValueError if the key is malformed."""
+    key = request.headers.get(HEADER) or request.data.get('idempotency_key')
+    if key is None:
+        return None
+    if not isinstance(key, str) or not key.strip() or len(key.strip()) > MAX_LENGTH:
+        raise ValueError(f"Idempotency key must be a non-empty string of at most {MAX_LENGTH} characters.")
+    return key.strip()
+
+
+def _cache_key(student_id, key):
+    # Keys are client-chosen; hashing keeps them valid for every cache backend
+    return f'submission-receipt:{student_id}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def find(student_id, key):
+    """(test id, response) of the student's earlier submission with ``key``, or None."""
+    receipt = cache.get(_cache_key(student_id, key))
+    if receipt is not None:
+        return receipt
+    receipt = SubmissionReceipt.objects.filter(student_id=student_id, key=key).values_list('test_id', 'response').first()
+    if receipt is not None:
+        cache.set(_cache_key(student_id, key), receipt, RECEIPT_TIMEOUT)
+    return receipt
+
+
+def record(student_id, key, test_id, attempt_id, response):
+    """
+    Store the receipt in the submission's transaction. Raises IntegrityError when the
+    key was already used, once the transaction holding that key has committed.
+    """
+    SubmissionReceipt.objects.create(
+        student_id=student_id, key=key, test_id=test_id, attempt_id=attempt_id, response=response,
+    )
+    transaction.on_commit(lambda: cache.set(_cache_key(student_id, key), (test_id, response), RECEIPT_TIMEOUT))
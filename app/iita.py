@@ -0,0 +1,260 @@
+"""
+Inductive item tree analysis (minimized corrected IITA) from sufficient statistics.
+
+IITA only looks at the number of attempts ``n``, how often each item was solved, and
+the counterexample counts ``b[i, j]``: attempts that failed item ``i`` but solved
+``j``, which contradict "``i`` is a prerequisite of ``j``". Those are running sums, so
+they are stored per test in IITAStatistics and new attempts are added in
+O(items^2) each, instead of rebuilding the attempts matrix for every estimate.
+
+``bootstrap`` estimates how stable each implication is by rerunning IITA on
+resamples of the attempts. The matrix is placed in shared memory once, and the
+spawned workers attach to it instead of receiving a pickled copy per task. Workers
+read the shared 0/1 matrix in place and convert only ``ROW_BLOCK`` attempts at a
+time, so none of them holds a float copy of the whole matrix.
+
+Items are the nodes of the test's graph. A node counts as solved when any of its
+questions was answered correctly, as in GenerateGraphFromIITA. Adaptive attempts skip
+the questions the graph already decides, so their nodes come from the mastery the
+session inferred (TestAttempt.inferred_nodes) instead.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .models import IITAStatistics, Question, TestAttempt
+from .workers import setup_django
+
+BATCH_SIZE = 2000
+# Fewer resamples per worker than this do not pay for spawning the worker
+MIN_RESAMPLES_PER_WORKER = 8
+# Thresholds tried by the inductive generation; more distinct counts are subsampled
+MAX_CANDIDATES = 200
+# Upper bound on bootstrap resamples; each one reruns IITA while the request waits
+MAX_RESAMPLES = 200
+# Attempts converted to floats at a time by the weighted statistics of a resample
+ROW_BLOCK = 4096
+
+
+def node_matrix(attempt_rows, question_nodes, node_index):
+    """
+    Attempts x nodes 0/1 matrix from (``{question_id: 0/1}`` answers, inferred nodes)
+    rows; inferred nodes, when present, replace the answers.
+    """
+    matrix = np.zeros((len(attempt_rows), len(node_index)), dtype=np.uint8)
+    for row, (answers, inferred_nodes) in enumerate(attempt_rows):
+        if inferred_nodes is not None:
+            for node_id, mastered in inferred_nodes.items():
+                column = node_index.get(int(node_id))
+                if mastered and column is not None:
+                    matrix[row, column] = 1
+            continue
+        for question_id, correct in answers.items():
+            column = node_index.get(question_nodes.get(question_id))
+            if correct and column is not None:
+                matrix[row, column] = 1
+    return matrix
+
+
+def sufficient_statistics(matrix):
+    """(attempts, solved counts, counterexample counts) of a 0/1 matrix."""
+    matrix = matrix.astype(np.int64)
+    return len(matrix), matrix.sum(axis=0), (1 - matrix).T @ matrix
+
+
+def attempts_matrix(test, nodes):
+    """Attempts x nodes 0/1 matrix of every attempt of ``test``, columns ordered as ``nodes``."""
+    question_nodes = _question_nodes(test.graph_id)
+    node_index = {node_id: idx for idx, node_id in enumerate(nodes)}
+    rows = TestAttempt.objects.filter(test=test).order_by('id').values_list('answers', 'inferred_nodes')
+    return node_matrix(list(rows.iterator(chunk_size=BATCH_SIZE)), question_nodes, node_index)
+
+
+def _question_nodes(graph_id):
+    return {
+        str(question_id): node_id
+        for question_id, node_id in Question.objects.filter(node__graph_id=graph_id).values_list('id', 'node_id')
+    }
+
+
+def refresh(test):
+    """Fold attempts submitted since the last refresh into the test's IITAStatistics."""
+    nodes = list(test.graph.nodes.order_by('id').values_list('id', flat=True))
+    with transaction.atomic():
+        stats, _ = IITAStatistics.objects.select_for_update().get_or_create(test=test)
+        # A changed node set or deleted attempts cannot be subtracted out: start over
+        if stats.nodes != nodes or (
+            stats.attempts and TestAttempt.objects.filter(test=test, id__lte=stats.last_attempt_id).count() != stats.attempts
+        ):
+            stats.nodes, stats.attempts, stats.last_attempt_id = nodes, 0, 0
+            stats.solved = [0] * len(nodes)
+            stats.counterexamples = [[0] * len(nodes) for _ in nodes]
+
+        question_nodes = _question_nodes(test.graph_id)
+        node_index = {node_id: idx for idx, node_id in enumerate(nodes)}
+        solved = np.array(stats.solved, dtype=np.int64)
+        counterexamples = np.array(stats.counterexamples, dtype=np.int64).reshape(len(nodes), len(nodes))
+
+        new = (
+            TestAttempt.objects.filter(test=test, id__gt=stats.last_attempt_id).order_by('id')
+            .values_list('id', 'answers', 'inferred_nodes')
+        )
+        batch = []
+        for attempt_id, answers, inferred_nodes in new.iterator(chunk_size=BATCH_SIZE):
+            batch.append((answers, inferred_nodes))
+            stats.last_attempt_id = attempt_id
+            if len(batch) >= BATCH_SIZE:
+                n, s, b = sufficient_statistics(node_matrix(batch, question_nodes, node_index))
+                stats.attempts, solved, counterexamples = stats.attempts + n, solved + s, counterexamples + b
+                batch = []
+        if batch:
+            n, s, b = sufficient_statistics(node_matrix(batch, question_nodes, node_index))
+            stats.attempts, solved, counterexamples = stats.attempts + n, solved + s, counterexamples + b
+
+        stats.solved = solved.tolist()
+        stats.counterexamples = counterexamples.tolist()
+        stats.save()
+    return stats
+
+
+def _candidate_relations(b):
+    """
+    Inductively generated quasi-orders: for growing thresholds L the pairs with at most
+    L counterexamples are added, then new pairs breaking transitivity are dropped.
+    """
+    m = len(b)
+    off_diagonal = ~np.eye(m, dtype=bool)
+    thresholds = np.unique(b[off_diagonal]) if m > 1 else np.array([0])
+    if len(thresholds) > MAX_CANDIDATES:
+        thresholds = thresholds[np.linspace(0, len(thresholds) - 1, MAX_CANDIDATES).astype(int)]
+
+    relation = np.eye(m, dtype=bool)
+    relations = []
+    for threshold in thresholds:
+        added = (b <= threshold) & ~relation
+        relation = relation | added
+        while added.any():
+            as_int = relation.astype(np.int64)
+            missing = (~relation).astype(np.int64)
+            # (i, j) with j -> k but not i -> k, or k -> i but not k -> j
+            violating = ((missing @ as_int.T) > 0) | ((as_int.T @ missing) > 0)
+            drop = added & violating
+            if not drop.any():
+                break
+            relation &= ~drop
+            added &= ~drop
+        relations.append(relation.copy())
+    return relations
+
+
+def _fit(relation, n, p, b):
+    """Minimized corrected IITA: error rate gamma minimizing the fit, and the fit itself."""
+    m = len(p)
+    off_diagonal = ~np.eye(m, dtype=bool)
+    implied = relation & off_diagonal
+    reverse_only = ~relation & relation.T & off_diagonal
+    p_i, p_j = p[:, None], p[None, :]
+
+    x1 = (-2 * b * p_i * n + 2 * p_i * p_j * n ** 2 - 2 * p_i ** 2 * n ** 2)[reverse_only].sum()
+    x2 = (-2 * b * p_j * n)[implied].sum()
+    x3 = (2 * p_i ** 2 * n ** 2 * np.ones_like(b))[reverse_only].sum()
+    x4 = (2 * p_j ** 2 * n ** 2 * np.ones_like(b))[implied].sum()
+    gamma = -(x1 + x2) / (x3 + x4) if x3 + x4 else 0.0
+
+    expected = (1 - p_i) * p_j * n * np.ones_like(b)
+    expected = np.where(implied, gamma * p_j * n, expected)
+    expected = np.where(reverse_only, (p_j - p_i + gamma * p_i) * n, expected)
+    fit = ((b - expected) ** 2)[off_diagonal].sum() / max(m * (m - 1), 1)
+    return gamma, fit
+
+
+def implications(n, solved, counterexamples):
+    """
+    Best-fitting quasi-order as (prerequisite index, dependent index) pairs, plus its
+    error rate and fit. Pairs in both directions mean the two items are equivalent.
+    """
+    b = np.asarray(counterexamples, dtype=np.float64)
+    if not n or not len(b):
+        return [], 0.0, 0.0
+    p = np.asarray(solved, dtype=np.float64) / n
+
+    best = None
+    for relation in _candidate_relations(b):
+        gamma, fit = _fit(relation, n, p, b)
+        if best is None or fit < best[2]:
+            best = (relation, gamma, fit)
+    relation, gamma, fit = best
+    np.fill_diagonal(relation, False)
+    return [tuple(pair) for pair in np.argwhere(relation).tolist()], float(gamma), float(fit)
+
+
+def _weighted_statistics(matrix, weights):
+    """Solved and counterexample counts of a 0/1 matrix with per-attempt weights."""
+    m = matrix.shape[1]
+    solved = np.zeros(m)
+    counterexamples = np.zeros((m, m))
+    for start in range(0, len(matrix), ROW_BLOCK):
+        rows = matrix[start:start + ROW_BLOCK].astype(np.float64)
+        row_weights = weights[start:start + ROW_BLOCK]
+        solved += row_weights @ rows
+        counterexamples += (1 - rows).T @ (rows * row_weights[:, None])
+    return solved, counterexamples
+
+
+def _resample_support(matrix, seed_sequences):
+    """How often each implication appears across one bootstrap resample per seed."""
+    n, m = matrix.shape
+    support = np.zeros((m, m), dtype=np.int64)
+    for seed_sequence in seed_sequences:
+        # Resampling as per-attempt weights avoids materializing the resampled matrix
+        weights = np.bincount(np.random.default_rng(seed_sequence).integers(0, n, n), minlength=n).astype(np.float64)
+        pairs, _, _ = implications(n, *_weighted_statistics(matrix, weights))
+        for prereq_idx, target_idx in pairs:
+            support[prereq_idx, target_idx] += 1
+    return support
+
+
+def _shared_support(name, shape, seed_sequences):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.uint8, buffer=block.buf)
+        support = _resample_support(matrix, seed_sequences)
+        # The view must be gone before the block can be closed
+        del matrix
+    finally:
+        block.close()
+    return support
+
+
+def bootstrap(matrix, resamples, workers=None, seed=None):
+    """
+    Support of every implication over ``resamples`` bootstrap resamples of the attempts,
+    as an items x items matrix of frequencies in [0, 1]. Resamples are split evenly across
+    ``workers`` processes (IITA_BOOTSTRAP_WORKERS or the CPU count). ``resamples`` is
+    capped at MAX_RESAMPLES.
+    """
+    resamples = min(resamples, MAX_RESAMPLES)
+    matrix = np.ascontiguousarray(matrix, dtype=np.uint8)
+    seed_sequences = np.random.SeedSequence(seed).spawn(resamples)
+    workers = workers or getattr(settings, 'IITA_BOOTSTRAP_WORKERS', None) or os.cpu_count() or 1
+    workers = min(workers, resamples // MIN_RESAMPLES_PER_WORKER)
+    if workers <= 1 or not matrix.size:
+        return _resample_support(matrix, seed_sequences) / resamples
+
+    block = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    try:
+        np.ndarray(matrix.shape, dtype=np.uint8, buffer=block.buf)[:] = matrix
+        chunks = [seed_sequences[worker::workers] for worker in range(workers)]
+        with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'), initializer=setup_django
+        ) as pool:
+            support = sum(pool.map(_shared_support, [block.name] * workers, [matrix.shape] * workers, chunks))
+    finally:
+        block.close()
+        block.unlink()
+    return support / resamples
@@ -0,0 +1,167 @@
+"""
+Classical item analysis of a test: difficulty (p-value), point-biserial
+discrimination, corrected item-total correlation, Cronbach's alpha (overall and with
+each item deleted) and distractor statistics.
+
+Everything is derived from running sums over the attempts x items 0/1 matrix X with
+total scores y: per-item sums of X and of X * y, plus the sums of y and y^2. New
+attempts are folded in with one matrix product per batch, so a refresh only reads the
+attempts submitted since the last one. Only attempts answering every item of the test
+are counted; partial (adaptive) attempts would bias the totals.
+"""
+import math
+
+import numpy as np
+from django.db import transaction
+
+from .models import ItemStatistics, Question, TestAttempt
+
+BATCH_SIZE = 2000
+
+
+def _empty_sums(items):
+    return {
+        'items': items,
+        'x': [0.0] * len(items),
+        'xy': [0.0] * len(items),
+        'y': 0.0,
+        'yy': 0.0,
+        'excluded': 0,
+        'options': {item: {} for item in items},
+    }
+
+
+def accumulate(sums, rows):
+    """Fold (answers, responses) rows into ``sums``. Returns the number of attempts counted."""
+    items = sums['items']
+    matrix = np.array([[answers.get(item, -1) for item in items] for answers, _ in rows], dtype=np.float64)
+    matrix = matrix.reshape(len(rows), len(items))
+    complete = (matrix >= 0).all(axis=1)
+    sums['excluded'] += int((~complete).sum())
+    matrix = matrix[complete]
+    if not len(matrix):
+        return 0
+
+    totals = matrix.sum(axis=1)
+    sums['x'] = (np.array(sums['x']) + matrix.sum(axis=0)).tolist()
+    sums['xy'] = (np.array(sums['xy']) + matrix.T @ totals).tolist()
+    sums['y'] += float(totals.sum())
+    sums['yy'] += float(totals @ totals)
+
+    options = sums['options']
+    complete_rows = (row for row, keep in zip(rows, complete) if keep)
+    for (_, responses), total in zip(complete_rows, totals.tolist()):
+        for item in items:
+            response = responses.get(item)
+            if response is not None:
+                count = options[item].setdefault(str(response), [0, 0.0])
+                count[0] += 1
+                count[1] += total
+    return len(matrix)
+
+
+def refresh(test):
+    """Bring the running sums of ``test`` up to date and return its ItemStatistics."""
+    items = [str(question_id) for question_id in test.questions.order_by('testquestion__order').values_list('id', flat=True)]
+    with transaction.atomic():
+        stats, _ = ItemStatistics.objects.select_for_update().get_or_create(test=test)
+        counted = stats.attempts + stats.sums.get('excluded', 0)
+        # Changed items or deleted attempts cannot be subtracted out: start over
+        if stats.sums.get('items') != items or (
+            counted and TestAttempt.objects.filter(test=test, id__lte=stats.last_attempt_id).count() != counted
+        ):
+            stats.sums, stats.attempts, stats.last_attempt_id = _empty_sums(items), 0, 0
+
+        new = (
+            TestAttempt.objects.filter(test=test, id__gt=stats.last_attempt_id).order_by('id')
+            .values_list('id', 'answers', 'responses')
+        )
+        batch = []
+        for attempt_id, answers, responses in new.iterator(chunk_size=BATCH_SIZE):
+            batch.append((answers, responses or {}))
+            stats.last_attempt_id = attempt_id
+            if len(batch) >= BATCH_SIZE:
+                stats.attempts += accumulate(stats.sums, batch)
+                batch = []
+        if batch:
+            stats.attempts += accumulate(stats.sums, batch)
+        stats.save()
+    return stats
+
+
+def _number(value):
+    value = float(value)
+    return round(value, 4) if math.isfinite(value) else None
+
+
+def analyze(stats):
+    """Item statistics from the running sums of an ItemStatistics row."""
+    sums, n = stats.sums, stats.attempts
+    items = sums.get('items', [])
+    k = len(items)
+    result = {"test": stats.test_id, "attempts": n, "excluded_attempts": sums.get('excluded', 0), "items": []}
+    if not n or not k:
+        result.update(mean_score=None, score_variance=None, cronbach_alpha=None)
+        return result
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.array(sums['x']) / n
+        item_variance = p * (1 - p)
+        mean_score = sums['y'] / n
+        score_variance = sums['yy'] / n - mean_score ** 2
+        covariance = np.array(sums['xy']) / n - p * mean_score
+        point_biserial = covariance / np.sqrt(item_variance * score_variance)
+        # Correlation with the rest score, so the item does not correlate with itself
+        rest_variance = score_variance + item_variance - 2 * covariance
+        corrected = (covariance - item_variance) / np.sqrt(item_variance * rest_variance)
+        alpha = k / (k - 1) * (1 - item_variance.sum() / score_variance) if k > 1 else math.nan
+        alpha_if_deleted = (
+            (k - 1) / (k - 2) * (1 - (item_variance.sum() - item_variance) / rest_variance)
+            if k > 2 else np.full(k, math.nan)
+        )
+
+    questions = {
+        str(question_id): (text, correct_answer, other_answers)
+        for question_id, text, correct_answer, other_answers in Question.objects.filter(id__in=items)
+        .values_list('id', 'text', 'correct_answer', 'other_answers')
+    }
+    score_sd = math.sqrt(score_variance) if score_variance > 0 else 0.0
+    for j, item in enumerate(items):
+        text, correct_answer, other_answers = questions.get(item, (None, None, []))
+        result["items"].append({
+            "question": int(item),
+            "text": text,
+            "p_value": _number(p[j]),
+            "point_biserial": _number(point_biserial[j]),
+            "corrected_item_total": _number(corrected[j]),
+            "alpha_if_deleted": _number(alpha_if_deleted[j]),
+            "distractors": _distractors(sums['options'][item], n, mean_score, score_sd, correct_answer, other_answers),
+        })
+    result.update(
+        mean_score=_number(mean_score),
+        score_variance=_number(score_variance),
+        cronbach_alpha=_number(alpha),
+    )
+    return result
+
+
+def _distractors(options, n, mean_score, score_sd, correct_answer, other_answers):
+    """Choice rate, mean total score and discrimination of every answer option."""
+    answers = [str(answer) for answer in [correct_answer, *(other_answers or [])] if answer is not None]
+    answers.extend(answer for answer in options if answer not in answers)
+    distractors = []
+    for answer in answers:
+        count, total = options.get(answer, (0, 0.0))
+        proportion = count / n
+        discrimination = None
+        if count and 0 < proportion < 1 and score_sd:
+            discrimination = (total / count - mean_score) / score_sd * math.sqrt(proportion / (1 - proportion))
+        distractors.append({
+            "answer": answer,
+            "correct": answer == str(correct_answer),
+            "count": count,
+            "proportion": _number(proportion),
+            "mean_score": _number(total / count) if count else None,
+            "point_biserial": _number(discrimination) if discrimination is not None else None,
+        })
+    return distractors
@@ -0,0 +1,163 @@
+"""
+Knowledge space of a graph.
+
+The prerequisite edges define a surmise relation: a student who has mastered a node
+has mastered all of its prerequisites. The feasible knowledge states are exactly the
+sets of nodes closed under that relation. States are Python integers used as bitsets,
+bit ``i`` standing for the ``i``-th node of the graph ordered by id.
+"""
+import random
+from functools import lru_cache
+
+from .models import GraphNode
+
+
+def bits(mask):
+    """Indices of the set bits of ``mask``, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class KnowledgeStructure:
+    def __init__(self, node_ids, edges):
+        """``edges`` are (prerequisite node id, dependent node id) pairs."""
+        self.node_ids = list(node_ids)
+        self.index = {node_id: idx for idx, node_id in enumerate(self.node_ids)}
+        self.size = len(self.node_ids)
+        self.full = (1 << self.size) - 1
+
+        self.prerequisites = [0] * self.size
+        self.dependents = [0] * self.size
+        for prerequisite, dependent in edges:
+            p, d = self.index[prerequisite], self.index[dependent]
+            self.prerequisites[d] |= 1 << p
+            self.dependents[p] |= 1 << d
+
+        self.order = self._topological_order()
+        self.ancestors = [0] * self.size
+        for i in self.order:
+            for p in bits(self.prerequisites[i]):
+                self.ancestors[i] |= self.ancestors[p] | (1 << p)
+        self.descendants = [0] * self.size
+        for i in reversed(self.order):
+            for d in bits(self.dependents[i]):
+                self.descendants[i] |= self.descendants[d] | (1 << d)
+
+    def _topological_order(self):
+        indegree = [prerequisites.bit_count() for prerequisites in self.prerequisites]
+        ready = [i for i in range(self.size) if not indegree[i]]
+        order = []
+        while ready:
+            i = ready.pop()
+            order.append(i)
+            for d in bits(self.dependents[i]):
+                indegree[d] -= 1
+                if not indegree[d]:
+                    ready.append(d)
+        if len(order) != self.size:
+            raise ValueError("The prerequisite relation contains a cycle.")
+        return order
+
+    def mask(self, node_ids):
+        """Bitset of the given node ids; unknown ids raise KeyError."""
+        mask = 0
+        for node_id in node_ids:
+            mask |= 1 << self.index[node_id]
+        return mask
+
+    def node_set(self, state):
+        return [self.node_ids[i] for i in bits(state)]
+
+    def is_feasible(self, state):
+        return all(not self.prerequisites[i] & ~state for i in bits(state))
+
+    def closure(self, state):
+        """Smallest feasible state containing ``state``."""
+        closed = state
+        for i in bits(state):
+            closed |= self.ancestors[i]
+        return closed
+
+    def redundant_prerequisites(self, i):
+        """Direct prerequisites of node ``i`` already implied through another one of them."""
+        implied = 0
+        for p in bits(self.prerequisites[i]):
+            implied |= self.ancestors[p]
+        return self.prerequisites[i] & implied
+
+    def inner_fringe(self, state):
+        """Nodes of ``state`` that can be removed while staying feasible."""
+        return sum(1 << i for i in bits(state) if not self.dependents[i] & state)
+
+    def outer_fringe(self, state):
+        """Nodes outside ``state`` whose prerequisites are all in it."""
+        return sum(1 << i for i in bits(self.full & ~state) if not self.prerequisites[i] & ~state)
+
+    def states(self):
+        """
+        Stream every feasible state. Nodes are decided in topological order and a node
+        can only be added once its prerequisites are in, so each state is produced exactly
+        once and memory stays proportional to the number of nodes.
+        """
+        order, prerequisites = self.order, self.prerequisites
+        stack = [(0, 0)]
+        while stack:
+            position, state = stack.pop()
+            while position < self.size and prerequisites[order[position]] & ~state:
+                position += 1
+            if position == self.size:
+                yield state
+                continue
+            stack.append((position + 1, state))
+            stack.append((position + 1, state | (1 << order[position])))
+
+    def count_states(self, limit=None):
+        """Number of feasible states, stopping at ``limit``. Returns (count, complete)."""
+        count = 0
+        for _ in self.states():
+            count += 1
+            if limit is not None and count >= limit:
+                return count, False
+        return count, True
+
+    def sample(self, count, seed=None, steps=None):
+        """
+        Draw feasible states approximately uniformly with a random walk that adds an
+        outer-fringe node or drops an inner-fringe node. The walk is symmetric, so its
+        stationary distribution is uniform over the knowledge space.
+        """
+        if not self.size:
+            return [0] * count
+        rng = random.Random(seed)
+        steps = steps or 4 * self.size
+        state = 0
+        samples = []
+        for _ in range(count):
+            for _ in range(steps):
+                i = rng.randrange(self.size)
+                bit = 1 << i
+                if rng.random() < 0.5:
+                    continue
+                if state & bit:
+                    if not self.dependents[i] & state:
+                        state ^= bit
+                elif not self.prerequisites[i] & ~state:
+                    state |= bit
+            samples.append(state)
+        return samples
+
+
+def structure_for(graph):
+    """Cached KnowledgeStructure of a graph; any change to the graph bumps its version."""
+    return _load_structure(graph.id, graph.version)
+
+
+@lru_cache(maxsize=64)
+def _load_structure(graph_id, version):
+    node_ids = GraphNode.objects.filter(graph_id=graph_id).order_by('id').values_list('id', flat=True)
+    edges = GraphNode.dependent_nodes.through.objects.filter(
+        from_graphnode__graph_id=graph_id, to_graphnode__graph_id=graph_id
+    ).values_list('from_graphnode_id', 'to_graphnode_id')
+    return KnowledgeStructure(node_ids, edges)
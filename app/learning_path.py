@@ -0,0 +1,115 @@
+"""
+Study paths: which unmastered nodes a student has to learn, and in which order, to
+reach a set of target nodes.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.db.models import Max
+
+from .knowledge_space import structure_for
+from .models import GraphNode, Question, TestAttempt
+
+PATH_TIMEOUT = 24 * 60 * 60
+
+
+@lru_cache(maxsize=64)
+def _graph_index(graph_id, version):
+    """Question -> node and node -> title lookups of a graph version."""
+    question_nodes = dict(Question.objects.filter(node__graph_id=graph_id).values_list('id', 'node_id'))
+    titles = dict(GraphNode.objects.filter(graph_id=graph_id).values_list('id', 'title'))
+    return question_nodes, titles
+
+
+def mastery(knowledge, question_nodes, answers):
+    """
+    Mastered-node bitset from ``{question_id: 0/1}`` answers. A node counts as mastered
+    when every answered question on it is correct; prerequisites of mastered nodes are
+    inferred mastered unless the student failed them.
+    """
+    passed = failed = 0
+    for question_id, correct in answers.items():
+        node_index = knowledge.index.get(question_nodes.get(int(question_id)))
+        if node_index is None:
+            continue
+        if correct:
+            passed |= 1 << node_index
+        else:
+            failed |= 1 << node_index
+    passed &= ~failed
+    return passed | (knowledge.closure(passed) & ~failed)
+
+
+def study_path(knowledge, titles, mastered, targets):
+    """Unmastered nodes needed for ``targets``, in one pass over the topological order."""
+    needed = knowledge.closure(targets) & ~mastered
+    return {
+        "mastered": knowledge.node_set(mastered),
+        "path": [
+            {
+                "id": knowledge.node_ids[i],
+                "title": titles[knowledge.node_ids[i]],
+                "prerequisites": knowledge.node_set(knowledge.prerequisites[i] & needed),
+            }
+            for i in knowledge.order
+            if needed >> i & 1
+        ],
+    }
+
+
+def _targets_key(targets):
+    return hashlib.sha1(str(targets).encode()).hexdigest()[:16]
+
+
+def path_for_attempt(attempt, target_ids=None):
+    graph = attempt.test.graph
+    knowledge = structure_for(graph)
+    targets = knowledge.mask(target_ids) if target_ids else knowledge.full
+    key = f'learning-path:attempt:{attempt.id}:{graph.version}:{_targets_key(targets)}'
+    result = cache.get(key)
+    if result is None:
+        question_nodes, titles = _graph_index(graph.id, graph.version)
+        result = study_path(knowledge, titles, mastery(knowledge, question_nodes, attempt.answers), targets)
+        cache.set(key, result, PATH_TIMEOUT)
+    return result
+
+
+def paths_for_students(graph, student_ids, target_ids=None):
+    """
+    Paths for many students at once, aggregating each student's latest answer per
+    question over every test on the graph. Cached per student, graph version and latest
+    attempt, so only students with new attempts are recomputed.
+    """
+    knowledge = structure_for(graph)
+    targets = knowledge.mask(target_ids) if target_ids else knowledge.full
+    targets_key = _targets_key(targets)
+
+    latest = dict(
+        TestAttempt.objects.filter(test__graph=graph, student_id__in=student_ids)
+        .values('student_id').annotate(latest=Max('id')).values_list('student_id', 'latest')
+    )
+    keys = {
+        student_id: f'learning-path:student:{student_id}:{graph.id}:{graph.version}:{latest.get(student_id)}:{targets_key}'
+        for student_id in student_ids
+    }
+    cached = cache.get_many(keys.values())
+    results = {student_id: cached[key] for student_id, key in keys.items() if key in cached}
+
+    missing = [student_id for student_id in student_ids if student_id not in results]
+    if missing:
+        question_nodes, titles = _graph_index(graph.id, graph.version)
+        answers = {student_id: {} for student_id in missing}
+        attempts = (
+            TestAttempt.objects.filter(test__graph=graph, student_id__in=missing)
+            .order_by('id').values_list('student_id', 'answers')
+        )
+        for student_id, attempt_answers in attempts.iterator():
+            answers[student_id].update(attempt_answers)
+        fresh = {
+            student_id: study_path(knowledge, titles, mastery(knowledge, question_nodes, answers[student_id]), targets)
+            for student_id in missing
+        }
+        cache.set_many({keys[student_id]: result for student_id, result in fresh.items()}, PATH_TIMEOUT)
+        results.update(fresh)
+    return results
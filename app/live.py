@@ -0,0 +1,155 @@
+"""
+Live test results over server-sent events.
+
+TestAttemptView publishes each attempt once its transaction commits. The event holds
+the attempt's score and the test's running summary (attempt count, mean score and a
+10-point score distribution), so a dashboard never needs to re-read the attempts.
+Events fan out through an in-process hub to the SSE streams of this worker.
+
+On PostgreSQL, publishing goes through NOTIFY. Each worker with subscribers runs one
+LISTEN thread that feeds its hub, so an attempt submitted to any worker, WSGI or
+ASGI, reaches every stream. Other databases only fan out within the process.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.db import connection, connections
+from django.db.models import Avg, Count, Q
+
+from .models import TestAttempt
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'test_results'
+BINS = 10
+# Events buffered per stream; a slower client skips the oldest ones, later events
+# carry the full summary anyway
+QUEUE_SIZE = 100
+HEARTBEAT = 15
+
+
+def results_summary(test_id):
+    """Attempt count, mean score and score distribution in 10-point bins, in one query."""
+    width = 100 / BINS
+    aggregates = {
+        f'bin{index}': Count('id', filter=Q(score__gte=index * width) & (
+            Q(score__lt=(index + 1) * width) if index < BINS - 1 else Q(score__lte=100)
+        ))
+        for index in range(BINS)
+    }
+    row = TestAttempt.objects.filter(test_id=test_id).aggregate(
+        attempts=Count('id'), mean_score=Avg('score'), **aggregates,
+    )
+    return {
+        "attempts": row['attempts'],
+        "mean_score": round(row['mean_score'], 2) if row['mean_score'] is not None else None,
+        "distribution": [row[f'bin{index}'] for index in range(BINS)],
+    }
+
+
+class Hub:
+    """Per-test subscriber queues of the streams served by this process."""
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, test_id):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self.lock:
+            self.subscribers[test_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, test_id, queue):
+        with self.lock:
+            self.subscribers[test_id] = {entry for entry in self.subscribers[test_id] if entry[1] is not queue}
+            if not self.subscribers[test_id]:
+                del self.subscribers[test_id]
+
+    def dispatch(self, test_id, event):
+        """Hand ``event`` to every stream of the test; safe to call from any thread."""
+        with self.lock:
+            subscribers = list(self.subscribers.get(test_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:  # The stream's event loop has closed
+                self.unsubscribe(test_id, queue)
+
+
+def _offer(queue, event):
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+hub = Hub()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def publish(test_attempt):
+    """Announce a committed attempt to every live stream of its test."""
+    event = {
+        "attempt": test_attempt.id,
+        "student": test_attempt.student_id,
+        "score": test_attempt.score,
+        "summary": results_summary(test_attempt.test_id),
+    }
+    if connection.vendor == 'postgresql':
+        # Delivered back to this process by its own listener, like to every other worker
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, json.dumps({"test": test_attempt.test_id, **event})])
+    else:
+        hub.dispatch(test_attempt.test_id, event)
+
+
+def ensure_listener():
+    """Start this process's LISTEN thread on PostgreSQL, once."""
+    global _listener
+    if connection.vendor != 'postgresql':
+        return
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, name='live-results-listener', daemon=True)
+            _listener.start()
+
+
+def _listen():
+    delay = 1
+    while True:
+        wrapper = connections.create_connection('default')
+        raw = None
+        try:
+            raw = wrapper.get_new_connection(wrapper.get_connection_params())
+            raw.autocommit = True
+            with raw.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            delay = 1
+            while True:
+                if select.select([raw], [], [], HEARTBEAT) == ([], [], []):
+                    continue
+                raw.poll()
+                while raw.notifies:
+                    payload = json.loads(raw.notifies.pop(0).payload)
+                    hub.dispatch(payload.pop("test"), payload)
+        except Exception:
+            logger.exception("Live results listener lost its connection; reconnecting in %ss", delay)
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+        finally:
+            if raw is not None:
+                raw.close()
+
+
+def sse(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
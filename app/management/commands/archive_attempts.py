@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app.export import parse_bound
+from app.partitions import MONTHS_AHEAD, add_months, archive, earliest_attempt, ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly attempt partitions and, with --until, archive the attempts "
+        "of a closed term to a Parquet file that exports keep reading."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--until', help='Archive attempts submitted before this ISO date or datetime.')
+        parser.add_argument('--since', help='Start of the archived range; defaults to the earliest attempt.')
+        parser.add_argument('--dir', default=None, help='Archive directory; defaults to ATTEMPT_ARCHIVE_DIR.')
+        parser.add_argument('--ahead', type=int, default=MONTHS_AHEAD, help='Months of partitions to create ahead.')
+
+    def handle(self, *args, **options):
+        if is_partitioned():
+            now = timezone.now()
+            created = ensure_partitions(now, add_months(now, options['ahead']))
+            self.stderr.write(f"Created partition(s): {', '.join(created)}" if created else 'Partitions are up to date.')
+
+        if not options['until']:
+            return
+        try:
+            until = parse_bound(options['until'])
+            since = parse_bound(options['since']) if options['since'] else earliest_attempt()
+            if since is None or since >= until:
+                self.stderr.write('Nothing to archive.')
+                return
+            result = archive(since, until, options['dir'])
+        except (ValueError, RuntimeError) as e:
+            raise CommandError(e)
+        if result is None:
+            self.stderr.write('Nothing to archive.')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {result.attempts} attempt(s) ({result.rows} rows, {result.size} bytes) to {result.path}.'
+        ))
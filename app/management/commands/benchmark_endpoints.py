@@ -0,0 +1,218 @@
+import json
+import logging
+import statistics
+import time
+from datetime import datetime, timezone
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from app.api.urls import urlpatterns
+from app.models import TestAttempt
+from app.qti_generator import generate_qti
+from app.synthetic import PASSWORD, generate_dataset
+
+TIERS = {
+    'small': {'nodes': 20, 'questions_per_node': 2, 'students': 20},
+    'medium': {'nodes': 100, 'questions_per_node': 3, 'students': 200},
+    'large': {'nodes': 500, 'questions_per_node': 3, 'students': 1000},
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def endpoint_cases(data):
+    """(label, url name, method, url kwargs, body, user) for every route in app/api/urls.py."""
+    teacher = data['teacher']
+    graph = data['graphs'][0]
+    test = data['tests'][0]
+    attempt = TestAttempt.objects.filter(test=test).select_related('student').last()
+    student = attempt.student
+    nodes = list(graph.nodes.order_by('id'))
+    node = nodes[-1]
+    question = node.questions.first()
+    test_questions = list(test.questions.all())
+
+    return [
+        ('register', 'user-register', 'post', {}, {
+            'username': 'benchmark-user', 'password': PASSWORD, 'email': 'benchmark@example.com',
+            'first_name': 'Bench', 'last_name': 'Mark', 'user_type': 'student',
+        }, None),
+        ('bulk enroll', 'bulk-enroll', 'post', {}, {
+            'students': [{'username': f'benchmark-bulk-{i}', 'password': PASSWORD} for i in range(10)],
+        }, teacher),
+        ('login', 'token_obtain_pair', 'post', {}, {'username': teacher.username, 'password': PASSWORD}, None),
+        ('token refresh', 'token_refresh', 'post', {}, {'refresh': str(RefreshToken.for_user(teacher))}, None),
+        ('list graphs', 'graphs', 'get', {}, None, teacher),
+        ('create graph', 'graphs', 'post', {}, {'title': 'Benchmark graph'}, teacher),
+        ('first question', 'first-question', 'get', {}, None, student),
+        ('list nodes', 'nodes', 'get', {}, None, teacher),
+        ('create node', 'nodes', 'post', {}, {'graph': graph.id, 'title': 'Benchmark node'}, teacher),
+        ('update node', 'update-node', 'patch', {'pk': node.id}, {'title': 'Renamed node'}, teacher),
+        ('delete node', 'delete-node', 'delete', {'pk': node.id}, None, teacher),
+        ('update node prerequisites', 'update-node-with-prerequisites', 'patch', {'pk': node.id},
+         {'prerequisite_node_ids': [n.id for n in nodes[:3]]}, teacher),
+        ('list questions', 'questions', 'get', {}, None, teacher),
+        ('create question', 'questions', 'post', {}, {
+            'node': node.id, 'text': 'Benchmark question', 'correct_answer': 'yes', 'other_answers': ['no'],
+        }, teacher),
+        ('update question', 'update-question', 'patch', {'pk': question.id}, {'text': 'Edited question'}, teacher),
+        ('delete question', 'delete-question', 'delete', {'pk': question.id}, None, teacher),
+        ('teacher only', 'teacher-only-view', 'get', {}, None, teacher),
+        ('graph detail', 'knowledge-graph-detail', 'get', {'pk': graph.id}, None, teacher),
+        ('graph detail with layout', 'knowledge-graph-detail', 'get', {'pk': graph.id}, {'layout': 'precomputed'}, teacher),
+        ('graph changes', 'knowledge-graph-changes', 'get', {'pk': graph.id}, {'since': 0}, teacher),
+        ('redundant edges', 'knowledge-graph-reduction', 'get', {'pk': graph.id}, None, teacher),
+        ('graph diff', 'knowledge-graph-diff', 'get', {'pk': graph.id, 'other_pk': graph.id}, None, teacher),
+        ('list tests', 'test-list', 'get', {}, None, teacher),
+        ('list tests with graph', 'test-list-graph', 'get', {}, None, teacher),
+        ('start attempt', 'test_attempt', 'get', {'test_id': test.id}, None, student),
+        ('submit attempt', 'test_attempt', 'post', {'test_id': test.id},
+         {'answers': {str(q.id): q.correct_answer for q in test_questions}}, student),
+        ('replay submission', 'test_attempt', 'post', {'test_id': test.id}, {
+            'answers': {str(q.id): q.correct_answer for q in test_questions}, 'idempotency_key': 'benchmark',
+        }, student),
+        ('start adaptive session', 'adaptive-start', 'post', {'test_id': test.id}, None, student),
+        ('create test', 'create_test', 'post', {}, {
+            'graph_id': graph.id, 'question_ids': [q.id for q in test_questions],
+        }, teacher),
+        ('assemble test', 'create_test', 'post', {}, {'graph_id': graph.id, 'length': 20, 'seed': 0}, teacher),
+        ('test attempts', 'test-attempts', 'get', {'test_id': test.id}, None, teacher),
+        ('test results', 'test-results', 'get', {'test_id': test.id}, None, teacher),
+        ('item statistics', 'item-statistics', 'get', {'test_id': test.id}, None, teacher),
+        ('attempt export', 'attempt-export', 'get', {}, {'test': test.id}, teacher),
+        ('iita', 'generate_graph', 'post', {'test_id': test.id}, None, teacher),
+        ('iita bootstrap', 'generate_graph', 'post', {'test_id': test.id}, {'bootstrap': 50}, teacher),
+        ('attempt graph', 'test-attempt-graph', 'get', {'test_attempt_id': attempt.id}, None, teacher),
+        ('learning path', 'learning-path', 'get', {}, {'attempt_id': attempt.id}, teacher),
+        ('search', 'search', 'get', {}, {'q': node.title, 'graph_id': graph.id}, teacher),
+        ('duplicate questions', 'duplicate-questions', 'get', {}, {'graph_id': graph.id}, teacher),
+        ('import qti', 'qti-import', 'post', {}, {
+            'package': SimpleUploadedFile('benchmark.xml', generate_qti(test.id)), 'graph_id': graph.id, 'node_id': node.id,
+        }, teacher),
+        ('tests for graph', 'tests_for_graph', 'get', {'graph_id': graph.id}, None, teacher),
+        ('questions for test', 'questions_for_test', 'get', {'test_id': test.id}, None, teacher),
+        ('download qti', 'download_qti', 'get', {'test_id': test.id}, None, teacher),
+    ]
+
+
+def summarize(timings, queries, status_code):
+    ordered = sorted(timings)
+    return {
+        'status': status_code,
+        'queries': queries,
+        'min_ms': round(ordered[0], 3),
+        'median_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+
+
+class Command(BaseCommand):
+    help = "Time every API endpoint plus IITA and QTI generation across synthetic data scale tiers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tiers', default='small,medium', help=f"Comma-separated tiers from: {', '.join(TIERS)}.")
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per endpoint.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--compare', help='Previous JSON report to compare median timings against.')
+
+    def handle(self, *args, **options):
+        tiers = [tier.strip() for tier in options['tiers'].split(',') if tier.strip()]
+        unknown = [tier for tier in tiers if tier not in TIERS]
+        if unknown:
+            raise CommandError(f"Unknown tier(s): {', '.join(unknown)}")
+
+        # View-level debug logging would dominate the timings
+        logging.disable(logging.INFO)
+        try:
+            report = {
+                'created': datetime.now(timezone.utc).isoformat(),
+                'repeat': options['repeat'],
+                'tiers': {tier: self.run_tier(tier, options) for tier in tiers},
+            }
+        finally:
+            logging.disable(logging.NOTSET)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), report)
+
+    def run_tier(self, tier, options):
+        result = {}
+        try:
+            with transaction.atomic():
+                data = generate_dataset(seed=options['seed'], prefix=f'bench-{tier}', **TIERS[tier])
+                result['dataset'] = dict(TIERS[tier], attempts=data['attempts'])
+                result['endpoints'] = self.run_endpoints(data, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+        return result
+
+    def run_endpoints(self, data, repeat):
+        cases = endpoint_cases(data)
+        covered = {case[1] for case in cases}
+        for pattern in urlpatterns:
+            if pattern.name not in covered:
+                self.stderr.write(f'No benchmark case for route {pattern.name!r}')
+
+        results = {}
+        for label, name, method, kwargs, body, user in cases:
+            url = reverse(name, kwargs=kwargs)
+            timings = []
+            for _ in range(repeat):
+                client = APIClient()
+                if user is not None:
+                    client.force_authenticate(user=user)
+                uploads = [value for value in (body or {}).values() if hasattr(value, 'seek')]
+                for upload in uploads:
+                    upload.seek(0)
+                # Every run starts from the same data, so mutating endpoints are rolled back
+                with transaction.atomic():
+                    with CaptureQueriesContext(connection) as context:
+                        start = time.perf_counter()
+                        response = getattr(client, method)(url, body, format='multipart' if uploads else 'json')
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    transaction.set_rollback(True)
+            results[label] = dict(summarize(timings, len(context.captured_queries), response.status_code),
+                                  method=method.upper(), route=name)
+            self.stderr.write(f"{label}: {results[label]['median_ms']} ms")
+
+        test_id = data['tests'][0].id
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                generate_qti(test_id)
+                timings.append((time.perf_counter() - start) * 1000)
+        results['generate_qti'] = summarize(timings, len(context.captured_queries), None)
+        return results
+
+    def compare(self, baseline, report):
+        for tier, current in report['tiers'].items():
+            previous = baseline.get('tiers', {}).get(tier, {}).get('endpoints', {})
+            for label, stats in current.get('endpoints', {}).items():
+                if label not in previous:
+                    continue
+                before, after = previous[label]['median_ms'], stats['median_ms']
+                change = (after - before) / before * 100 if before else 0.0
+                self.stdout.write(f'[{tier}] {label}: {before} ms -> {after} ms ({change:+.1f}%)')
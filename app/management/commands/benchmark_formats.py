@@ -0,0 +1,81 @@
+import json
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.management.commands.benchmark_endpoints import TIERS, Rollback, summarize
+from app.models import TestAttempt
+from app.renderers import GRAPH_RENDERERS
+from app.synthetic import generate_dataset
+
+ENCODINGS = ('identity', 'gzip', 'br')
+
+
+def format_cases(data):
+    """(label, url name, url kwargs, query params) for the endpoints with compact formats."""
+    graph = data['graphs'][0]
+    attempt = TestAttempt.objects.filter(test=data['tests'][0]).last()
+    return [
+        ('graph detail', 'knowledge-graph-detail', {'pk': graph.id}, {}),
+        ('graph detail without questions', 'knowledge-graph-detail', {'pk': graph.id}, {'include': ''}),
+        ('attempt graph', 'test-attempt-graph', {'test_attempt_id': attempt.id}, {}),
+        ('test attempts', 'test-attempts', {'test_id': data['tests'][0].id}, {}),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare response size and latency of the graph and attempts endpoints per format and content encoding."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tiers', default='small,medium', help=f"Comma-separated tiers from: {', '.join(TIERS)}.")
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per combination.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        tiers = [tier.strip() for tier in options['tiers'].split(',') if tier.strip()]
+        unknown = [tier for tier in tiers if tier not in TIERS]
+        if unknown:
+            raise CommandError(f"Unknown tier(s): {', '.join(unknown)}")
+
+        logging.disable(logging.INFO)
+        try:
+            report = {tier: self.run_tier(tier, options) for tier in tiers}
+        finally:
+            logging.disable(logging.NOTSET)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_tier(self, tier, options):
+        result = {}
+        try:
+            with transaction.atomic():
+                data = generate_dataset(seed=options['seed'], prefix=f'formats-{tier}', **TIERS[tier])
+                for label, name, kwargs, params in format_cases(data):
+                    result[label] = self.run_case(data['teacher'], reverse(name, kwargs=kwargs), params, options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+        return result
+
+    def run_case(self, user, url, params, repeat):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        results = {}
+        for renderer in GRAPH_RENDERERS:
+            if renderer.format == 'api':
+                continue
+            for encoding in ENCODINGS:
+                timings = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    response = client.get(url, params, HTTP_ACCEPT=renderer.media_type, HTTP_ACCEPT_ENCODING=encoding)
+                    timings.append((time.perf_counter() - start) * 1000)
+                stats = summarize(timings, None, response.status_code)
+                stats['bytes'] = len(response.content)
+                stats['encoding'] = response.get('Content-Encoding', 'identity')
+                results[f'{renderer.format}/{encoding}'] = stats
+                self.stderr.write(f"{url} {renderer.format}/{encoding}: {stats['bytes']} bytes, {stats['median_ms']} ms")
+        return results
@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules that should only load when a request needs them
+LAZY_MODULES = ('pandas', 'learning_spaces', 'numpy', 'pyarrow')
+
+# Runs in a fresh interpreter: load the application and its URLconf like a worker
+# does before serving its first request, then report time, memory and lazy modules
+WORKER = """
+import json, os, sys, time
+start = time.perf_counter()
+from app.{entry} import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = (time.perf_counter() - start) * 1000
+with open('/proc/self/status') as status:
+    rss = next((int(line.split()[1]) for line in status if line.startswith('VmRSS:')), None)
+print(json.dumps({{
+    'startup_ms': round(elapsed, 1),
+    'rss_kb': rss,
+    'loaded': [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """Import time in microseconds per top-level package from an ``-X importtime`` log."""
+    packages = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        # Self times add up without double counting nested imports
+        packages[module.strip().split('.')[0]] += int(self_us)
+    return sorted(packages.items(), key=lambda item: -item[1])
+
+
+class Command(BaseCommand):
+    help = "Measure worker cold start: import time per package and RSS per worker process."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entry', choices=('wsgi', 'asgi'), default='wsgi', help='Application module to load.')
+        parser.add_argument('--workers', type=int, default=3, help='Worker processes to start.')
+        parser.add_argument('--top', type=int, default=15, help='Slowest packages to report.')
+        parser.add_argument('--max-startup-ms', type=float, default=None, help='Fail when the median start-up exceeds this.')
+        parser.add_argument('--max-rss-mb', type=float, default=None, help='Fail when any worker exceeds this RSS.')
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get('PYTHONPATH')])))
+        script = WORKER.format(entry=options['entry'], lazy=LAZY_MODULES)
+        command = [sys.executable, '-X', 'importtime', '-c', script]
+        # Started together, as a process manager starts its workers
+        processes = [
+            subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            for _ in range(options['workers'])
+        ]
+
+        workers = []
+        imports = None
+        for process in processes:
+            stdout, stderr = process.communicate()
+            if process.returncode:
+                raise CommandError(f"Worker failed to start:\n{stderr[-2000:]}")
+            workers.append(json.loads(stdout.strip().splitlines()[-1]))
+            if imports is None:
+                imports = parse_importtime(stderr)
+
+        startup = sorted(worker['startup_ms'] for worker in workers)
+        report = {
+            'entry': options['entry'],
+            'workers': workers,
+            'median_startup_ms': startup[len(startup) // 2],
+            'max_rss_mb': round(max(worker['rss_kb'] or 0 for worker in workers) / 1024, 1),
+            'lazy_modules_loaded': sorted({name for worker in workers for name in worker['loaded']}),
+            'import_ms': round(sum(us for _, us in imports) / 1000, 1),
+            'slowest_packages': [
+                {'package': package, 'import_ms': round(us / 1000, 1)} for package, us in imports[:options['top']]
+            ],
+        }
+        self.stdout.write(json.dumps(report, indent=2))
+
+        failures = []
+        if report['lazy_modules_loaded']:
+            failures.append(f"loaded at start-up: {', '.join(report['lazy_modules_loaded'])}")
+        if options['max_startup_ms'] is not None and report['median_startup_ms'] > options['max_startup_ms']:
+            failures.append(f"median start-up {report['median_startup_ms']} ms > {options['max_startup_ms']} ms")
+        if options['max_rss_mb'] is not None and report['max_rss_mb'] > options['max_rss_mb']:
+            failures.append(f"RSS {report['max_rss_mb']} MB > {options['max_rss_mb']} MB")
+        if failures:
+            raise CommandError('; '.join(failures))
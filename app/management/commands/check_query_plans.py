@@ -0,0 +1,117 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.models import TestAttempt
+from app.synthetic import generate_dataset
+
+# (url name, kwargs builder, maximum number of queries)
+HOT_ENDPOINTS = [
+    ('knowledge-graph-detail', lambda data: {'pk': data['graph'].id}, 5),
+    ('tests_for_graph', lambda data: {'graph_id': data['graph'].id}, 1),
+    ('test_attempt', lambda data: {'test_id': data['test'].id}, 2),
+    ('test-attempts', lambda data: {'test_id': data['test'].id}, 3),
+    ('test-results', lambda data: {'test_id': data['test'].id}, 2),
+    ('questions_for_test', lambda data: {'test_id': data['test'].id}, 2),
+    ('test-attempt-graph', lambda data: {'test_attempt_id': data['attempt'].id}, 6),
+]
+
+# \b keeps (\w+) from dropping its last character to dodge the USING lookahead
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)\b(?! USING)')
+
+
+class Rollback(Exception):
+    pass
+
+
+def seed(prefix, nodes, questions_per_node, students):
+    """Generate one synthetic graph and test, returning the objects the hot endpoints are requested for."""
+    data = generate_dataset(
+        prefix=prefix, nodes=nodes, density=0.2, questions_per_node=questions_per_node, students=students
+    )
+    test = data['tests'][0]
+    attempt = TestAttempt.objects.filter(test=test).select_related('student').last()
+    return {'graph': data['graphs'][0], 'test': test, 'attempt': attempt, 'student': attempt.student}
+
+
+def sequential_scans(sql):
+    """Return the tables the database would read with a full scan to answer ``sql``."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scans = []
+            stack = [plan[0]['Plan']]
+            while stack:
+                node = stack.pop()
+                if node['Node Type'] == 'Seq Scan':
+                    scans.append(node['Relation Name'])
+                stack.extend(node.get('Plans', []))
+            return scans
+
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [match.group(1) for row in cursor.fetchall() if (match := SQLITE_SCAN.match(row[-1]))]
+
+
+class Command(BaseCommand):
+    help = "Run EXPLAIN on the hot endpoint queries against a seeded database and fail on sequential scans or unexpected query counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=20, help='Nodes in the larger seeded graph.')
+        parser.add_argument('--students', type=int, default=20, help='Attempts in the larger seeded test.')
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            with transaction.atomic():
+                small = seed('qp-small', 2, 1, 2)
+                large = seed('qp-large', options['nodes'], 2, options['students'])
+                failures = self.check_endpoints(small, large)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f'{len(failures)} query plan check(s) failed.')
+        self.stdout.write(self.style.SUCCESS('All hot endpoint queries use indexes and have a constant query count.'))
+
+    def check_endpoints(self, small, large):
+        failures = []
+        for name, kwargs, budget in HOT_ENDPOINTS:
+            small_queries = self.capture(name, kwargs(small), small['student'])
+            large_queries = self.capture(name, kwargs(large), large['student'])
+
+            if len(small_queries) != len(large_queries):
+                failures.append(
+                    f'{name}: query count grows with data ({len(small_queries)} -> {len(large_queries)} queries)'
+                )
+            if len(large_queries) > budget:
+                failures.append(f'{name}: {len(large_queries)} queries, expected at most {budget}')
+
+            for sql in large_queries:
+                if not sql.lstrip().upper().startswith('SELECT') or ' WHERE ' not in sql:
+                    continue
+                for table in sequential_scans(sql):
+                    failures.append(f'{name}: sequential scan on {table} in {sql}')
+
+            self.stdout.write(f'{name}: {len(large_queries)} queries')
+        return failures
+
+    def capture(self, name, kwargs, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(reverse(name, kwargs=kwargs))
+        if response.status_code != 200:
+            raise CommandError(f'{name} returned HTTP {response.status_code}')
+        return [query['sql'] for query in context.captured_queries]
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.enrollment import ROSTER_FORMATS, enroll, read_roster, roster_format
+
+
+class Command(BaseCommand):
+    help = "Enroll users from a CSV or JSONL roster (username, password, email, first_name, last_name, user_type, groups)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help='Path to the roster file.')
+        parser.add_argument('--format', choices=ROSTER_FORMATS, help='Roster format (default: from the file extension).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes.')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or roster_format(options['roster'])
+        if fmt not in ROSTER_FORMATS:
+            raise CommandError(f"Cannot tell the roster format of {options['roster']}; pass --format.")
+
+        def progress(report):
+            self.stdout.write(f"{report['total']} rows read, {report['created']} created, {len(report['errors'])} errors")
+
+        with open(options['roster'], encoding='utf-8-sig', newline='') as f:
+            report = enroll(
+                read_roster(f, fmt), batch_size=options['batch_size'], workers=options['workers'], progress=progress
+            )
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']} ({error['username'] or 'no username'}): {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(f"Enrolled {report['created']} of {report['total']} users."))
@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.export import CHUNK_SIZE, EXPORT_FORMATS, export, parse_bound
+
+
+class Command(BaseCommand):
+    help = "Export attempts with per-question correctness and node mapping as CSV or Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="Output file, or '-' for stdout.")
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default=None,
+                            help='Defaults to the output file extension, else csv.')
+        parser.add_argument('--test', type=int, help='Only attempts of this test.')
+        parser.add_argument('--graph', type=int, help='Only attempts of tests on this graph.')
+        parser.add_argument('--since', help='Submitted on or after this ISO date or datetime.')
+        parser.add_argument('--until', help='Submitted before this ISO date or datetime.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Attempts read per round trip.')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        fmt = options['format'] or ('parquet' if output.endswith('.parquet') else 'csv')
+        try:
+            bounds = {key: parse_bound(options[key]) for key in ('since', 'until') if options[key]}
+            chunks = export(fmt, options['test'], options['graph'], chunk_size=options['chunk_size'], **bounds)
+        except ValueError as e:
+            raise CommandError(e)
+
+        written = 0
+        stream = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+        finally:
+            if stream is not sys.stdout.buffer:
+                stream.close()
+        self.stderr.write(self.style.SUCCESS(f'Wrote {written} bytes of {fmt}.'))
@@ -0,0 +1,34 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import Test
+from app.qti_generator import DEFAULT_SEED, generate_qti_many
+
+
+class Command(BaseCommand):
+    help = "Write the IMS QTI files of many tests, rendering each shared question once."
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Output directory; one test_<id>_qti.xml per test.')
+        parser.add_argument('--test', type=int, action='append', dest='tests', help='Export this test (repeatable).')
+        parser.add_argument('--graph', type=int, help='Export every test on this graph.')
+        parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Answer shuffle seed.')
+
+    def handle(self, *args, **options):
+        tests = Test.objects.all()
+        if options['tests']:
+            tests = tests.filter(id__in=options['tests'])
+        if options['graph'] is not None:
+            tests = tests.filter(graph_id=options['graph'])
+        test_ids = list(tests.order_by('id').values_list('id', flat=True))
+        if not test_ids:
+            raise CommandError('No tests match.')
+
+        os.makedirs(options['directory'], exist_ok=True)
+        written = 0
+        for test_id, document in generate_qti_many(test_ids, options['seed']).items():
+            with open(os.path.join(options['directory'], f'test_{test_id}_qti.xml'), 'wb') as f:
+                f.write(document)
+            written += len(document)
+        self.stderr.write(self.style.SUCCESS(f'Wrote {len(test_ids)} test(s), {written} bytes.'))
@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from app.dedup import THRESHOLD, find_clusters, index_missing
+
+
+class Command(BaseCommand):
+    help = "Sign questions that have no MinHash signature yet, then report clusters of near-duplicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--graph', type=int, help='Only clusters containing a question of this graph.')
+        parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                            help='Minimum estimated Jaccard similarity of two duplicates.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--json', action='store_true', help='Print the clusters as JSON.')
+
+    def handle(self, *args, **options):
+        indexed = index_missing(
+            batch_size=options['batch_size'],
+            progress=lambda count: self.stderr.write(f'{count} questions signed'),
+        )
+        if indexed:
+            self.stderr.write(self.style.SUCCESS(f'Signed {indexed} new question(s).'))
+
+        clusters = find_clusters(options['graph'], options['threshold'])
+        if options['json']:
+            self.stdout.write(json.dumps(clusters, indent=2))
+            return
+        for cluster in clusters:
+            self.stdout.write(f"{len(cluster['questions'])} questions, similarity >= {cluster['similarity']:.2f}")
+            for question in cluster['questions']:
+                self.stdout.write(f"  #{question['id']} (graph {question['graph']}): {question['text']}")
+        self.stdout.write(self.style.SUCCESS(f'{len(clusters)} duplicate cluster(s).'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from app.synthetic import PASSWORD, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Generate seeded synthetic graphs, questions, tests, students and attempts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synthetic', help='Prefix for generated usernames and titles.')
+        parser.add_argument('--graphs', type=int, default=1)
+        parser.add_argument('--nodes', type=int, default=50, help='Nodes per graph.')
+        parser.add_argument('--density', type=float, default=0.05,
+                            help='Fraction of earlier nodes each node takes as prerequisites.')
+        parser.add_argument('--questions-per-node', type=int, default=2)
+        parser.add_argument('--tests', type=int, default=1, help='Tests per graph.')
+        parser.add_argument('--questions-per-test', type=int, default=None,
+                            help='Questions sampled into each test (default: all questions of the graph).')
+        parser.add_argument('--students', type=int, default=100)
+        parser.add_argument('--attempts', type=int, default=1, help='Attempts per student and test.')
+        parser.add_argument('--slip', type=float, default=0.1,
+                            help='Probability of answering a mastered node incorrectly.')
+        parser.add_argument('--guess', type=float, default=0.2,
+                            help='Probability of answering an unmastered node correctly.')
+
+    def handle(self, *args, **options):
+        data = generate_dataset(
+            seed=options['seed'],
+            prefix=options['prefix'],
+            graphs=options['graphs'],
+            nodes=options['nodes'],
+            density=options['density'],
+            questions_per_node=options['questions_per_node'],
+            tests=options['tests'],
+            questions_per_test=options['questions_per_test'],
+            students=options['students'],
+            attempts=options['attempts'],
+            slip=options['slip'],
+            guess=options['guess'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(data['graphs'])} graph(s), {len(data['tests'])} test(s), "
+            f"{len(data['students'])} student(s) and {data['attempts']} attempt(s). "
+            f"All synthetic users share the password '{PASSWORD}'."
+        ))
@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.models import KnowledgeGraph
+from app.qti_import import BATCH_SIZE, import_items
+
+
+class Command(BaseCommand):
+    help = "Import the choice items of a QTI 3.0 document or zip package as questions on a graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='QTI XML document or zip content package.')
+        parser.add_argument('--graph', type=int, required=True, help='Graph the questions belong to.')
+        parser.add_argument('--node', type=int, help='Node for items the node map does not place.')
+        parser.add_argument('--node-map', help='JSON file mapping item identifiers to node ids or titles.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            graph = KnowledgeGraph.objects.get(pk=options['graph'])
+        except KnowledgeGraph.DoesNotExist:
+            raise CommandError(f"Graph {options['graph']} does not exist.")
+        node_map = None
+        if options['node_map']:
+            with open(options['node_map'], encoding='utf-8') as f:
+                node_map = json.load(f)
+            if not isinstance(node_map, dict):
+                raise CommandError('The node map must be a JSON object.')
+
+        def progress(report):
+            self.stdout.write(f"{report['total']} items read, {report['created']} created, {len(report['errors'])} errors")
+
+        try:
+            report = import_items(
+                options['source'], graph, options['node'], node_map,
+                batch_size=options['batch_size'], progress=progress,
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        for error in report['errors']:
+            self.stderr.write(f"Item {error['item']} ({error['identifier'] or 'no identifier'}, {error['file']}): {error['error']}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {report['created']} of {report['total']} items."))
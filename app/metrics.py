@@ -0,0 +1,62 @@
+"""In-process Prometheus metrics. Each worker process keeps (and exposes) its own registry."""
+import threading
+from bisect import bisect_left
+
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labelnames=('method', 'route')):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Total request latency.', DURATION_BUCKETS)
+DB_DURATION = Histogram('http_request_db_duration_seconds', 'Time spent in database queries per request.', DURATION_BUCKETS)
+RENDER_DURATION = Histogram('http_request_render_duration_seconds', 'Time spent rendering the response body.', DURATION_BUCKETS)
+QUERY_COUNT = Histogram('http_request_queries', 'Database queries per request.', QUERY_BUCKETS)
+DUPLICATE_QUERY_COUNT = Histogram('http_request_duplicate_queries', 'Repeated identical queries per request.', QUERY_BUCKETS)
+RESPONSE_SIZE = Histogram('http_response_size_bytes', 'Response body size.', SIZE_BUCKETS)
+
+REGISTRY = [REQUEST_DURATION, DB_DURATION, RENDER_DURATION, QUERY_COUNT, DUPLICATE_QUERY_COUNT, RESPONSE_SIZE]
+
+
+def metrics_view(request):
+    """Prometheus text exposition of the request histograms."""
+    body = '\n'.join(histogram.expose() for histogram in REGISTRY) + '\n'
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,177 @@
+import gzip
+import hashlib
+import logging
+import time
+import traceback
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:  # Falls back to gzip
+    brotli = None
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = str(Path(__file__).resolve().parent)
+
+
+class RequestStats:
+    """Collects the queries of one request. Installed as a database execute wrapper."""
+
+    def __init__(self):
+        self.query_count = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.sql = {}
+        self.sites = {}
+        self.render_start = None
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        fingerprint = hashlib.sha1(sql.encode()).hexdigest()[:12]
+        self.fingerprints[fingerprint] += 1
+        if self.fingerprints[fingerprint] == 1:
+            self.sql[fingerprint] = sql
+        elif fingerprint not in self.sites:
+            # Only repeated queries pay for a stack walk: those are the N+1 sites
+            self.sites[fingerprint] = app_stack_site()
+
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.query_count += 1
+
+    @property
+    def duplicates(self):
+        return {fingerprint: count for fingerprint, count in self.fingerprints.items() if count > 1}
+
+    def render_finished(self, response):
+        self.render_time = time.perf_counter() - self.render_start
+
+
+def app_stack_site():
+    """The innermost frame of our own code that led to the current query."""
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(APP_DIR) and frame.filename != __file__:
+            return f'{frame.filename}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records query count, database time, duplicate queries, render time and response
+    size per request. The numbers are sent back in a ``Server-Timing`` header and fed
+    into the histograms served at ``/metrics``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'QUERY_COUNT_LOG_THRESHOLD', 50)
+
+    def __call__(self, request):
+        stats = request.instrumentation = RequestStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        route = match.route if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        duplicates = stats.duplicates
+
+        metrics.REQUEST_DURATION.observe(total, request.method, route)
+        metrics.DB_DURATION.observe(stats.db_time, request.method, route)
+        metrics.RENDER_DURATION.observe(stats.render_time, request.method, route)
+        metrics.QUERY_COUNT.observe(stats.query_count, request.method, route)
+        metrics.DUPLICATE_QUERY_COUNT.observe(sum(duplicates.values()) - len(duplicates), request.method, route)
+        if size is not None:
+            metrics.RESPONSE_SIZE.observe(size, request.method, route)
+
+        if getattr(settings, 'SERVER_TIMING_HEADER', True):
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={stats.db_time * 1000:.1f};desc="{stats.query_count} queries"',
+                f'render;dur={stats.render_time * 1000:.1f}',
+                f'app;dur={(total - stats.db_time - stats.render_time) * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ])
+
+        if stats.query_count > self.threshold:
+            logger.warning(
+                "%s %s ran %d queries (%.1f ms in the database, threshold %d). Repeated queries:\n%s",
+                request.method, request.path, stats.query_count, stats.db_time * 1000, self.threshold,
+                '\n'.join(
+                    f'  {count}x at {stats.sites[fingerprint]}: {stats.sql[fingerprint]}'
+                    for fingerprint, count in sorted(duplicates.items(), key=lambda item: -item[1])
+                ) or '  none',
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered (serialized to bytes) after the view returns
+        stats = request.instrumentation
+        stats.render_start = time.perf_counter()
+        response.add_post_render_callback(stats.render_finished)
+        return response
+
+
+ACCEPTS_BROTLI = _lazy_re_compile(r'\bbr\b')
+ACCEPTS_GZIP = _lazy_re_compile(r'\bgzip\b')
+# Already compressed payloads gain nothing from another pass
+INCOMPRESSIBLE_TYPES = ('image/', 'video/', 'audio/', 'application/zip', 'application/gzip')
+
+
+class CompressionMiddleware:
+    """
+    Brotli or gzip encoding for responses of at least ``COMPRESSION_MIN_SIZE`` bytes,
+    depending on what the client accepts. Unlike Django's GZipMiddleware, small
+    responses are left alone, where compression costs more than it saves.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if response.get('Content-Type', '').startswith(INCOMPRESSIBLE_TYPES):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_size:
+            return response
+
+        accept = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and ACCEPTS_BROTLI.search(accept):
+            encoding, content = 'br', brotli.compress(response.content, quality=self.brotli_quality)
+        elif ACCEPTS_GZIP.search(accept):
+            encoding, content = 'gzip', gzip.compress(response.content, compresslevel=self.gzip_level, mtime=0)
+        else:
+            return response
+        if len(content) >= len(response.content):
+            return response
+
+        response.content = content
+        response['Content-Length'] = str(len(content))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and not etag.startswith('W/'):
+            # The compressed body is a different representation
+            response['ETag'] = 'W/' + etag
+        return response
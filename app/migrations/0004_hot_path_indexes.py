@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_remove_test_questions_old_test_questions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='graphnode',
+            index=models.Index(fields=['graph', 'title'], name='graphnode_graph_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testattempt',
+            index=models.Index(fields=['test', 'student'], name='testattempt_test_student_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testquestion',
+            index=models.Index(fields=['test', 'order'], name='testquestion_test_order_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgegraph',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_knowledgegraph_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GraphRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.PositiveIntegerField()),
+                ('kind', models.CharField(choices=[('node', 'Node'), ('edge', 'Edge'), ('question', 'Question')], max_length=10)),
+                ('action', models.CharField(choices=[('upsert', 'Created or updated'), ('delete', 'Deleted')], max_length=10)),
+                ('data', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('graph', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='app.knowledgegraph')),
+            ],
+            options={
+                'ordering': ['revision'],
+                'unique_together': {('graph', 'revision')},
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Expressions must stay identical to NODE_DOCUMENT / QUESTION_DOCUMENT in app/search.py
+QUESTION_DOCUMENT = "(text || ' ' || correct_answer || ' ' || other_answers::text)"
+
+CREATE_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS graphnode_title_trgm_idx ON app_graphnode USING gin (title gin_trgm_ops)',
+    "CREATE INDEX IF NOT EXISTS graphnode_title_fts_idx ON app_graphnode USING gin (to_tsvector('simple', title))",
+    f'CREATE INDEX IF NOT EXISTS question_document_trgm_idx ON app_question USING gin ({QUESTION_DOCUMENT} gin_trgm_ops)',
+    f"CREATE INDEX IF NOT EXISTS question_document_fts_idx ON app_question USING gin (to_tsvector('simple', {QUESTION_DOCUMENT}))",
+]
+
+DROP_INDEXES = [
+    'DROP INDEX IF EXISTS graphnode_title_trgm_idx',
+    'DROP INDEX IF EXISTS graphnode_title_fts_idx',
+    'DROP INDEX IF EXISTS question_document_trgm_idx',
+    'DROP INDEX IF EXISTS question_document_fts_idx',
+]
+
+
+def run_on_postgres(statements):
+    """Other databases search with the in-process index in app/search.py instead."""
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_graphrevision'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_on_postgres(CREATE_INDEXES), run_on_postgres(DROP_INDEXES)),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_question_signatures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemStatistics',
+            fields=[
+                ('test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='item_statistics', serialize=False, to='app.test')),
+                ('last_attempt_id', models.BigIntegerField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('sums', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='testattempt',
+            name='responses',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_item_statistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IITAStatistics',
+            fields=[
+                ('test', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='iita_statistics', serialize=False, to='app.test')),
+                ('nodes', models.JSONField(default=list)),
+                ('last_attempt_id', models.BigIntegerField(default=0)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('solved', models.JSONField(default=list)),
+                ('counterexamples', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:25
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_iita_statistics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testattempt',
+            name='submitted_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='testattempt',
+            index=models.Index(fields=['submitted_at'], name='testattempt_submitted_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:29
+
+import datetime
+import re
+
+from django.db import migrations, models
+
+TABLE = 'app_testattempt'
+MONTHS_AHEAD = 3
+
+
+def next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def months(first, last):
+    """First-of-month UTC datetimes from the month of ``first`` through that of ``last``."""
+    first = first.astimezone(datetime.timezone.utc)
+    month = datetime.datetime(first.year, first.month, 1, tzinfo=datetime.timezone.utc)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def rebuild(partitioned):
+    """
+    Recreate the attempts table, partitioned by month of submitted_at or plain, and copy
+    its rows over. A partitioned table's primary key must contain the partition key, so
+    it becomes (id, submitted_at); nothing references attempts by foreign key. The
+    other indexes and foreign keys are recreated from their current definitions.
+    """
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        old = f'{TABLE}_old'
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT i.indexdef FROM pg_indexes i JOIN pg_class c ON c.relname = i.indexname '
+                'JOIN pg_index x ON x.indexrelid = c.oid WHERE i.tablename = %s AND NOT x.indisprimary',
+                [TABLE],
+            )
+            indexes = [definition for definition, in cursor.fetchall()]
+            cursor.execute(
+                "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                [TABLE],
+            )
+            foreign_keys = cursor.fetchall()
+            cursor.execute(f'SELECT MIN(submitted_at) FROM {TABLE}')
+            first = cursor.fetchone()[0]
+
+        schema_editor.execute(f'ALTER TABLE {TABLE} RENAME TO {old}')
+        partition_by = ' PARTITION BY RANGE (submitted_at)' if partitioned else ''
+        schema_editor.execute(f'CREATE TABLE {TABLE} (LIKE {old} INCLUDING DEFAULTS INCLUDING IDENTITY){partition_by}')
+        if partitioned:
+            schema_editor.execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for month in months(min(first or now, now), now + datetime.timedelta(days=30 * MONTHS_AHEAD)):
+                schema_editor.execute(
+                    f'CREATE TABLE {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                    [month, next_month(month)],
+                )
+        schema_editor.execute(f'INSERT INTO {TABLE} SELECT * FROM {old}')
+        schema_editor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)"
+        )
+        schema_editor.execute(f'DROP TABLE {old}')
+        schema_editor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY ({'id, submitted_at' if partitioned else 'id'})")
+        for definition in indexes:
+            schema_editor.execute(re.sub(r' ON (ONLY )?\S+ ', f' ON {TABLE} ', definition, count=1))
+        for name, definition in foreign_keys:
+            schema_editor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_attempt_submitted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttemptArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('since', models.DateTimeField()),
+                ('until', models.DateTimeField()),
+                ('path', models.CharField(max_length=500, unique=True)),
+                ('attempts', models.PositiveIntegerField()),
+                ('rows', models.PositiveIntegerField()),
+                ('size', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['since'],
+            },
+        ),
+        migrations.RunPython(rebuild(partitioned=True), rebuild(partitioned=False)),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_submission_receipts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='knowledgegraph',
+            name='derived_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='derived_graphs', to='app.knowledgegraph'),
+        ),
+    ]
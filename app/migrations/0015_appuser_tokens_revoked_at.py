@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_knowledgegraph_derived_from'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appuser',
+            name='tokens_revoked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_appuser_tokens_revoked_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testattempt',
+            name='inferred_nodes',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group, Permission
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 
 class AppUser(AbstractUser):
@@ -12,6 +13,8 @@ class AppUser(AbstractUser):
     ]
 
     user_type = models.CharField(max_length=10, choices=USER_TYPE_CHOICES, default='admin')
+    # Tokens issued before this are rejected; see app/authentication.py
+    tokens_revoked_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         permissions = [
@@ -39,15 +42,28 @@ class AppUser(AbstractUser):
 class KnowledgeGraph(models.Model):
     title = models.CharField(max_length=255)
     created_by = models.ForeignKey(AppUser, on_delete=models.CASCADE, related_name='created_graphs')
+    version = models.PositiveIntegerField(default=0)  # Bumped on every node, edge or question change
+    # The graph whose test attempts IITA derived this graph's edges from
+    derived_from = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL, related_name='derived_graphs')
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def bump_version(cls, **filters):
+        """Invalidate everything cached per graph version for the matching graphs."""
+        cls.objects.filter(**filters).update(version=models.F('version') + 1)
+
 class GraphNode(models.Model):
     graph = models.ForeignKey(KnowledgeGraph, on_delete=models.CASCADE, related_name='nodes')
     title = models.CharField(max_length=255)
     dependent_nodes = models.ManyToManyField('self', symmetrical=False, blank=True, related_name='prerequisite_nodes')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['graph', 'title'], name='graphnode_graph_title_idx'),
+        ]
+
     def __str__(self):
         return f"{self.title} (Graph: {self.graph.title})"
 
@@ -59,7 +75,77 @@ class Question(models.Model):
 
     def __str__(self):
         return f"Question on {self.node.title}: {self.text}"
-    
+
+
+class QuestionSignature(models.Model):
+    """MinHash signature of a question's text and answers, for near-duplicate detection."""
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    content_hash = models.CharField(max_length=40)  # Skips recomputing when the content is unchanged
+    minhash = models.JSONField()
+
+
+class QuestionBucket(models.Model):
+    """LSH bucket of one band of a question's signature; questions sharing a bucket are candidates."""
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='buckets')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bucket'], name='questionbucket_bucket_idx'),
+        ]
+
+
+class ItemStatistics(models.Model):
+    """
+    Running sums over a test's attempts for item analysis; attempts up to
+    ``last_attempt_id`` are already counted. See app/item_analysis.py.
+    """
+    test = models.OneToOneField('Test', on_delete=models.CASCADE, primary_key=True, related_name='item_statistics')
+    last_attempt_id = models.BigIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    sums = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class IITAStatistics(models.Model):
+    """
+    IITA sufficient statistics of a test over its graph's nodes (ordered by id);
+    attempts up to ``last_attempt_id`` are counted. See app/iita.py.
+    """
+    test = models.OneToOneField('Test', on_delete=models.CASCADE, primary_key=True, related_name='iita_statistics')
+    nodes = models.JSONField(default=list)
+    last_attempt_id = models.BigIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    solved = models.JSONField(default=list)  # Per node: attempts solving it
+    counterexamples = models.JSONField(default=list)  # [i][j]: attempts failing node i but solving node j
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class GraphRevision(models.Model):
+    """One entry of a graph's change log; ``revision`` is the graph version it produced."""
+    KIND_CHOICES = [
+        ('node', 'Node'),
+        ('edge', 'Edge'),
+        ('question', 'Question'),
+    ]
+    ACTION_CHOICES = [
+        ('upsert', 'Created or updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    graph = models.ForeignKey(KnowledgeGraph, on_delete=models.CASCADE, related_name='revisions')
+    revision = models.PositiveIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['revision']
+        unique_together = ('graph', 'revision')
+
+
 User = get_user_model()
 
 
@@ -85,16 +171,60 @@ class TestQuestion(models.Model):
     class Meta:
         ordering = ['order']
         unique_together = ('test', 'question')
+        indexes = [
+            models.Index(fields=['test', 'order'], name='testquestion_test_order_idx'),
+        ]
 
 class TestAttempt(models.Model):
     test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='attempts')
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='test_attempts')
     answers = models.JSONField()  # Format: {"question_id": 0/1}
+    responses = models.JSONField(default=dict, blank=True)  # Format: {"question_id": "submitted answer"}
+    # Adaptive attempts only ask some questions; the session's verdict for every node: {"node_id": 0/1}
+    inferred_nodes = models.JSONField(null=True, blank=True)
     completed = models.BooleanField(default=False)
     score = models.FloatField(null=True, blank=True)  # Calculated after submission
+    submitted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['test', 'student'], name='testattempt_test_student_idx'),
+            models.Index(fields=['submitted_at'], name='testattempt_submitted_idx'),
+        ]
 
     def calculate_score(self):
         correct_answers = sum(value for value in self.answers.values())
         total_questions = len(self.answers)
         self.score = (correct_answers / total_questions) * 100
-        self.save()
\ No newline at end of file
+        self.save()
+
+class SubmissionReceipt(models.Model):
+    """
+    The response to a test submission made with an idempotency key, replayed when the
+    student retries with the same key. See app/idempotency.py.
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submission_receipts')
+    key = models.CharField(max_length=255)
+    test = models.ForeignKey(Test, on_delete=models.CASCADE, related_name='submission_receipts')
+    attempt_id = models.PositiveBigIntegerField()  # Attempts are partitioned, so no foreign key
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('student', 'key')
+
+class AttemptArchive(models.Model):
+    """
+    Attempts submitted in [since, until) that archive_attempts moved out of the
+    database into a Parquet file in the export format. See app/partitions.py.
+    """
+    since = models.DateTimeField()
+    until = models.DateTimeField()
+    path = models.CharField(max_length=500, unique=True)
+    attempts = models.PositiveIntegerField()
+    rows = models.PositiveIntegerField()  # One per answered question
+    size = models.PositiveBigIntegerField()  # Bytes
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['since']
@@ -0,0 +1,171 @@
+"""
+Time partitioning and cold archival of TestAttempt.
+
+On PostgreSQL, migration 0012 turns the attempts table into one partitioned by month
+of ``submitted_at``. A default partition catches anything outside the monthly ones.
+Queries that filter on ``submitted_at`` only touch the partitions they need. A
+closed month is archived by detaching and dropping its partition rather than
+deleting its rows. Other databases keep a plain table and archive with DELETE.
+
+Archived attempts are written as zstd Parquet in the export format of app/export.py
+and recorded in AttemptArchive, so exports keep including them.
+"""
+import datetime
+import os
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from . import export
+from .models import AttemptArchive, TestAttempt
+
+TABLE = TestAttempt._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+MONTHLY_PARTITION = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+# Monthly partitions kept ready ahead of the current month
+MONTHS_AHEAD = 3
+
+
+def month_start(moment):
+    moment = moment.astimezone(datetime.timezone.utc)
+    return datetime.datetime(moment.year, moment.month, 1, tzinfo=datetime.timezone.utc)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y%m}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s)',
+            [TABLE],
+        )
+        return cursor.fetchone()[0]
+
+
+def monthly_partitions():
+    """Month start -> partition name of the attached monthly partitions."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s',
+            [TABLE],
+        )
+        names = [name for name, in cursor.fetchall()]
+    partitions = {}
+    for name in names:
+        match = MONTHLY_PARTITION.match(name)
+        if match:
+            month = datetime.datetime(int(match[1]), int(match[2]), 1, tzinfo=datetime.timezone.utc)
+            partitions[month] = name
+    return dict(sorted(partitions.items()))
+
+
+def create_partition(month):
+    """Create the partition for ``month``, moving its rows out of the default partition."""
+    name, upper = partition_name(month), add_months(month, 1)
+    bounds = [month, upper]
+    create = f'CREATE TABLE {name} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE submitted_at >= %s AND submitted_at < %s)', bounds,
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(create, bounds)
+            return name
+        # Rows already in the default partition would violate the new bounds
+        cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}')
+        cursor.execute(create, bounds)
+        cursor.execute(
+            f'INSERT INTO {TABLE} SELECT * FROM {DEFAULT_PARTITION} WHERE submitted_at >= %s AND submitted_at < %s', bounds,
+        )
+        cursor.execute(f'DELETE FROM {DEFAULT_PARTITION} WHERE submitted_at >= %s AND submitted_at < %s', bounds)
+        cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT')
+    return name
+
+
+def ensure_partitions(since, through):
+    """Create any missing monthly partitions from ``since`` through ``through``. Returns their names."""
+    existing = monthly_partitions()
+    created = []
+    month = month_start(since)
+    while month <= month_start(through):
+        if month not in existing:
+            created.append(create_partition(month))
+        month = add_months(month, 1)
+    return created
+
+
+def archive(since, until, directory=None):
+    """
+    Move the attempts submitted in [since, until) to a Parquet file. Returns the new
+    AttemptArchive, or None when there was nothing to archive.
+    """
+    directory = directory or settings.ATTEMPT_ARCHIVE_DIR
+    attempts = export.attempts_queryset(since=since, until=until)
+    # Attempts committed while the file is written are left for the next run
+    watermark = attempts.aggregate(Max('id'))['id__max']
+    if watermark is None:
+        return None
+    attempts = attempts.filter(id__lte=watermark)
+    count = attempts.count()
+
+    chunks = export.encode(export.export_rows(attempts), 'parquet')
+    path = os.path.join(directory, f'attempts-{since:%Y%m%dT%H%M%S}-{until:%Y%m%dT%H%M%S}.parquet')
+    if os.path.exists(path) or AttemptArchive.objects.filter(path=path).exists():
+        raise ValueError(f"{path} already exists.")
+    os.makedirs(directory, exist_ok=True)
+    partial = f'{path}.partial'
+    with open(partial, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+
+    try:
+        with transaction.atomic():
+            removed = _remove(since, until, watermark)
+            if removed != count:
+                raise RuntimeError(f"Attempts changed while archiving: wrote {count}, found {removed} to remove.")
+            return AttemptArchive.objects.create(
+                since=since, until=until, path=path, attempts=count,
+                rows=export.load_pyarrow().parquet.ParquetFile(path).metadata.num_rows, size=os.path.getsize(path),
+            )
+    except Exception:
+        os.remove(path)
+        raise
+
+
+def _remove(since, until, watermark):
+    removed = 0
+    if is_partitioned():
+        with connection.cursor() as cursor:
+            for month, name in monthly_partitions().items():
+                if month < since or add_months(month, 1) > until:
+                    continue
+                cursor.execute(f'SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {name}')
+                rows, latest = cursor.fetchone()
+                if latest > watermark:
+                    continue  # Deleted row by row below
+                # Whole month in range: dropping it is instant and leaves no dead tuples
+                cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+                removed += rows
+    deleted, _ = TestAttempt.objects.filter(submitted_at__gte=since, submitted_at__lt=until, id__lte=watermark).delete()
+    return removed + deleted
+
+
+def earliest_attempt():
+    return TestAttempt.objects.aggregate(Min('submitted_at'))['submitted_at__min']
@@ -1,88 +1,164 @@
+"""
+IMS QTI export of tests.
+
+Each question is rendered to a ``qti-assessment-item`` fragment. The fragment is cached
+under the question id, a hash of its content and the shuffle seed, so it is built
+only once however many tests and downloads include the question. Editing a question
+changes its hash, and the stale fragment is left for the cache to evict. Fragments
+have their own cache, CACHES['qti'], so they never push out other cached entries.
+A test's document is its cached fragments concatenated inside the ``qti-assessment``
+root.
+
+Answers are shuffled with a seed derived from the export seed and the question id.
+The same seed always gives the same order, and every test shares one fragment per
+question.
+"""
+import hashlib
+import json
+import random
 import xml.etree.ElementTree as ET
+
+from django.core.cache import caches
 from django.core.exceptions import ObjectDoesNotExist
-import random
-from app.models import Test
 
-def generate_qti(test_id):
+from app.models import Question, Test, TestQuestion
+
+# Bump when the item markup changes, so cached fragments are not reused
+FRAGMENT_VERSION = 1
+FRAGMENT_TIMEOUT = 7 * 24 * 60 * 60
+DEFAULT_SEED = 0
+
+XML_DECLARATION = b"<?xml version='1.0' encoding='utf-8'?>\n"
+
+
+def _root_tags():
+    """Opening and closing tags of the qti-assessment root."""
+    qti_root = ET.Element("qti-assessment", xmlns="http://www.imsglobal.org/xsd/imsqtiasi_v3p0",
+                          xsi_schemaLocation="http://www.imsglobal.org/xsd/imsqtiasi_v3p0 "
+                                             "https://purl.imsglobal.org/spec/qti/v3p0/schema/xsd/imsqti_asiv3p0p1_v1p0.xsd",
+                          xml_lang="en-US")
+    closing = b'</qti-assessment>'
+    document = ET.tostring(qti_root, encoding='utf-8', xml_declaration=False, short_empty_elements=False)
+    return document[:-len(closing)], closing
+
+
+ROOT_OPEN, ROOT_CLOSE = _root_tags()
+
+
+def content_hash(question):
+    content = json.dumps([question.text, question.correct_answer, question.other_answers])
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def fragment_key(question, seed):
+    return f'qti-item:{FRAGMENT_VERSION}:{question.id}:{content_hash(question)}:{seed}'
+
+
+def render_item(question, seed=DEFAULT_SEED):
+    """The question's qti-assessment-item element as UTF-8 bytes."""
+    question_text = question.text
+    correct_answer = question.correct_answer
+    other_answers = question.other_answers
+    all_answers = [correct_answer] + other_answers
+
+    # Shuffle the answers so they are not always in the same order
+    shuffled_answers = all_answers[:]
+    random.Random(f'{seed}:{question.id}').shuffle(shuffled_answers)
+
+    # Create the qti-assessment-item for the question
+    assessment_item = ET.Element("qti-assessment-item",
+                                 identifier=f"item_{question.id}",
+                                 title=question_text,
+                                 adaptive="false",
+                                 time_dependent="false")
+
+    # qti-response-declaration (this part defines the correct response)
+    response_declaration = ET.SubElement(assessment_item, "qti-response-declaration",
+                                         identifier="RESPONSE",
+                                         cardinality="single",
+                                         base_type="identifier")
+    correct_response = ET.SubElement(response_declaration, "qti-correct-response")
+    # Set the identifier of the correct answer (not the answer text)
+    correct_answer_index = shuffled_answers.index(correct_answer)
+    ET.SubElement(correct_response, "qti-value").text = f"answer_{correct_answer_index}"
+
+    # qti-item-body (contains the question prompt and answer choices)
+    item_body = ET.SubElement(assessment_item, "qti-item-body")
+    choice_interaction = ET.SubElement(item_body, "qti-choice-interaction",
+                                       response_identifier="RESPONSE",
+                                       shuffle="false",
+                                       max_choices="1")
+    prompt = ET.SubElement(choice_interaction, "qti-prompt")
+    prompt.text = question_text
+
+    # Add the shuffled choices (both correct and other answers)
+    for idx, answer in enumerate(shuffled_answers):
+        simple_choice = ET.SubElement(choice_interaction, "qti-simple-choice",
+                                      identifier=f"answer_{idx}")  # Use answer index as identifier
+        simple_choice.text = answer
+
+    # qti-response-processing (for scoring logic)
+    response_processing = ET.SubElement(assessment_item, "qti-response-processing")
+    set_outcome_value = ET.SubElement(response_processing, "qti-set-outcome-value",
+                                      identifier="FEEDBACK")
+    ET.SubElement(set_outcome_value, "qti-base-value", base_type="identifier").text = "NOHINT"
+
+    # Create response condition to check if the answer is correct
+    response_condition = ET.SubElement(response_processing, "qti-response-condition")
+    response_if = ET.SubElement(response_condition, "qti-response-if")
+    match = ET.SubElement(response_if, "qti-match")
+    ET.SubElement(match, "qti-variable", identifier="RESPONSE")
+    ET.SubElement(match, "qti-correct", identifier="RESPONSE")
+    set_outcome_value_score = ET.SubElement(response_if, "qti-set-outcome-value",
+                                            identifier="SCORE")
+    ET.SubElement(set_outcome_value_score, "qti-base-value", base_type="float").text = "1"
+
+    # Set default score if the answer is wrong
+    response_else = ET.SubElement(response_condition, "qti-response-else")
+    set_outcome_value_score_else = ET.SubElement(response_else, "qti-set-outcome-value",
+                                                 identifier="SCORE")
+    ET.SubElement(set_outcome_value_score_else, "qti-base-value", base_type="float").text = "0"
+
+    return ET.tostring(assessment_item, encoding='utf-8', xml_declaration=False)
+
+
+def item_fragments(questions, seed=DEFAULT_SEED):
+    """Question id -> rendered item, from the cache where possible, in one round trip."""
+    keys = {question.id: fragment_key(question, seed) for question in questions}
+    cache = caches['qti']
+    cached = cache.get_many(keys.values())
+    fragments = {question_id: cached[key] for question_id, key in keys.items() if key in cached}
+    fresh = {question.id: render_item(question, seed) for question in questions if question.id not in fragments}
+    if fresh:
+        cache.set_many({keys[question_id]: fragment for question_id, fragment in fresh.items()}, FRAGMENT_TIMEOUT)
+        fragments.update(fresh)
+    return fragments
+
+
+def assessment(question_ids, fragments):
+    """The QTI document of the questions, from their rendered items."""
+    return b''.join([XML_DECLARATION, ROOT_OPEN, *(fragments[question_id] for question_id in question_ids), ROOT_CLOSE])
+
+
+def generate_qti(test_id, seed=DEFAULT_SEED):
+    """The test's QTI document as UTF-8 bytes, or None if there is no such test."""
     try:
         test = Test.objects.get(id=test_id)
-        test_title = test.title
-        questions = test.questions.all()
-
-        # Initialize the root for the final XML file, which will contain all the questions
-        qti_root = ET.Element("qti-assessment", xmlns="http://www.imsglobal.org/xsd/imsqtiasi_v3p0",
-                              xsi_schemaLocation="http://www.imsglobal.org/xsd/imsqtiasi_v3p0 "
-                                                 "https://purl.imsglobal.org/spec/qti/v3p0/schema/xsd/imsqti_asiv3p0p1_v1p0.xsd",
-                              xml_lang="en-US")
-        
-        # Loop through each question and create a separate qti-assessment-item for each
-        for question in questions:
-            question_text = question.text
-            correct_answer = question.correct_answer
-            other_answers = question.other_answers
-            all_answers = [correct_answer] + other_answers
-
-            # Shuffle the answers so they are not always in the same order
-            shuffled_answers = all_answers[:]
-            random.shuffle(shuffled_answers)
-
-            # Create the qti-assessment-item for the question
-            assessment_item = ET.SubElement(qti_root, "qti-assessment-item", 
-                                            identifier=f"item_{question.id}", 
-                                            title=question_text, 
-                                            adaptive="false", 
-                                            time_dependent="false")
-
-            # qti-response-declaration (this part defines the correct response)
-            response_declaration = ET.SubElement(assessment_item, "qti-response-declaration", 
-                                                 identifier="RESPONSE", 
-                                                 cardinality="single", 
-                                                 base_type="identifier")
-            correct_response = ET.SubElement(response_declaration, "qti-correct-response")
-            # Set the identifier of the correct answer (not the answer text)
-            correct_answer_index = shuffled_answers.index(correct_answer)
-            ET.SubElement(correct_response, "qti-value").text = f"answer_{correct_answer_index}"
-
-            # qti-item-body (contains the question prompt and answer choices)
-            item_body = ET.SubElement(assessment_item, "qti-item-body")
-            choice_interaction = ET.SubElement(item_body, "qti-choice-interaction", 
-                                               response_identifier="RESPONSE", 
-                                               shuffle="false", 
-                                               max_choices="1")
-            prompt = ET.SubElement(choice_interaction, "qti-prompt")
-            prompt.text = question_text
-
-            # Add the shuffled choices (both correct and other answers)
-            for idx, answer in enumerate(shuffled_answers):
-                simple_choice = ET.SubElement(choice_interaction, "qti-simple-choice", 
-                                              identifier=f"answer_{idx}")  # Use answer index as identifier
-                simple_choice.text = answer
-
-            # qti-response-processing (for scoring logic)
-            response_processing = ET.SubElement(assessment_item, "qti-response-processing")
-            set_outcome_value = ET.SubElement(response_processing, "qti-set-outcome-value", 
-                                              identifier="FEEDBACK")
-            ET.SubElement(set_outcome_value, "qti-base-value", base_type="identifier").text = "NOHINT"
-            
-            # Create response condition to check if the answer is correct
-            response_condition = ET.SubElement(response_processing, "qti-response-condition")
-            response_if = ET.SubElement(response_condition, "qti-response-if")
-            match = ET.SubElement(response_if, "qti-match")
-            ET.SubElement(match, "qti-variable", identifier="RESPONSE")
-            ET.SubElement(match, "qti-correct", identifier="RESPONSE")
-            set_outcome_value_score = ET.SubElement(response_if, "qti-set-outcome-value", 
-                                                     identifier="SCORE")
-            ET.SubElement(set_outcome_value_score, "qti-base-value", base_type="float").text = "1"
-            
-            # Set default score if the answer is wrong
-            response_else = ET.SubElement(response_condition, "qti-response-else")
-            set_outcome_value_score_else = ET.SubElement(response_else, "qti-set-outcome-value", 
-                                                         identifier="SCORE")
-            ET.SubElement(set_outcome_value_score_else, "qti-base-value", base_type="float").text = "0"
-
-        # Generate the final XML string
-        tree = ET.ElementTree(qti_root)
-        return tree
-
     except ObjectDoesNotExist:
         print(f"Test with ID {test_id} not found!")
+        return None
+    questions = list(test.questions.order_by('testquestion__order'))
+    return assessment([question.id for question in questions], item_fragments(questions, seed))
+
+
+def generate_qti_many(test_ids, seed=DEFAULT_SEED):
+    """
+    Test id -> QTI document for many tests. Questions are loaded in one query and
+    each distinct question is fetched or rendered once, however many tests share it.
+    """
+    question_ids = {test_id: [] for test_id in test_ids}
+    for test_id, question_id in TestQuestion.objects.filter(test_id__in=test_ids).values_list('test_id', 'question_id'):
+        question_ids[test_id].append(question_id)
+    questions = Question.objects.filter(id__in={question_id for ids in question_ids.values() for question_id in ids})
+    fragments = item_fragments(list(questions), seed)
+    return {test_id: assessment(ids, fragments) for test_id, ids in question_ids.items()}
@@ -0,0 +1,199 @@
+"""
+Streaming import of IMS QTI 3.0 items into the question bank.
+
+A source is a single XML document, which holds one item or many (as app/qti_generator.py
+writes them), or a zip content package of such documents. Documents are read with
+iterparse. Each ``qti-assessment-item`` is converted as soon as it closes, then
+cleared together with what the root still holds, so memory does not grow with the
+number of items.
+
+Only single-answer choice interactions map onto Question. The prompt becomes the
+text, the correct choice becomes ``correct_answer`` and the other choices become
+``other_answers``. Other items are reported with their position and identifier and
+skipped. Questions are inserted with bulk_create in batches, which bypasses the
+save signals. Each batch therefore bumps the graph version itself, and near-duplicate
+signatures are computed for the new questions at the end.
+"""
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+from django.db import transaction
+
+from . import dedup
+from .models import GraphNode, KnowledgeGraph, Question
+
+BATCH_SIZE = 1000
+MAX_LENGTH = Question._meta.get_field('text').max_length
+
+_SPACE = re.compile(r'\s+')
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else ''
+
+
+def _attr(elem, name):
+    # QTI 3.0 attributes are hyphenated; app/qti_generator.py writes them with underscores
+    return elem.get(name, elem.get(name.replace('-', '_')))
+
+
+def _descendants(elem, name):
+    return [child for child in elem.iter() if _local(child.tag) == name]
+
+
+def _text(parts):
+    return _SPACE.sub(' ', ''.join(part for part in parts if part)).strip()
+
+
+def _text_outside(elem, skip):
+    """Text of ``elem`` without the subtree of ``skip``."""
+    if elem is skip:
+        return
+    yield elem.text
+    for child in elem:
+        yield from _text_outside(child, skip)
+        yield child.tail
+
+
+def parse_item(item):
+    """(identifier, text, correct_answer, other_answers) of an item; raises ValueError."""
+    identifier = item.get('identifier')
+    interactions = [elem for elem in item.iter() if _local(elem.tag).endswith('-interaction')]
+    if not interactions:
+        raise ValueError("The item has no interaction.")
+    if len(interactions) > 1:
+        raise ValueError("Items with more than one interaction are not supported.")
+    interaction = interactions[0]
+    if _local(interaction.tag) != 'qti-choice-interaction':
+        raise ValueError(f"Unsupported interaction {_local(interaction.tag)}; only choice interactions are imported.")
+
+    choices = {}
+    for choice in _descendants(interaction, 'qti-simple-choice'):
+        answer = _text(choice.itertext())
+        if not answer:
+            raise ValueError(f"Choice {choice.get('identifier')} has no text.")
+        choices[choice.get('identifier')] = answer
+    if len(choices) < 2:
+        raise ValueError("A choice interaction needs at least two choices.")
+
+    response = _attr(interaction, 'response-identifier') or 'RESPONSE'
+    declarations = [elem for elem in _descendants(item, 'qti-response-declaration') if elem.get('identifier') == response]
+    values = [
+        _text(value.itertext())
+        for declaration in declarations
+        for correct in _descendants(declaration, 'qti-correct-response')
+        for value in _descendants(correct, 'qti-value')
+    ]
+    if len(values) != 1:
+        raise ValueError(f"Expected one correct response for {response}, found {len(values)}.")
+    if values[0] not in choices:
+        raise ValueError(f"The correct response {values[0]} is not one of the choices.")
+
+    prompts = _descendants(interaction, 'qti-prompt')
+    text = _text(prompts[0].itertext()) if prompts else ''
+    if not text:
+        bodies = _descendants(item, 'qti-item-body')
+        text = _text(_text_outside(bodies[0], interaction)) if bodies else ''
+    text = text or _SPACE.sub(' ', item.get('title') or '').strip()
+    if not text:
+        raise ValueError("The item has no prompt.")
+
+    correct_answer = choices.pop(values[0])
+    other_answers = list(choices.values())
+    for value in (text, correct_answer, *other_answers):
+        if len(value) > MAX_LENGTH:
+            raise ValueError(f"Text longer than {MAX_LENGTH} characters: {value[:40]}...")
+    return identifier, text, correct_answer, other_answers
+
+
+def iter_items(source, name=None):
+    """
+    Yield (file name, identifier, parsed item or ValueError) for every item of an XML
+    document or zip package. ``source`` is a path or a binary file object.
+    """
+    if zipfile.is_zipfile(source):
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        with zipfile.ZipFile(source) as package:
+            for member in package.infolist():
+                member_name = member.filename.rsplit('/', 1)[-1].lower()
+                if member.is_dir() or not member_name.endswith('.xml') or member_name == 'imsmanifest.xml':
+                    continue
+                with package.open(member) as document:
+                    yield from _iter_document(document, member.filename)
+        return
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    yield from _iter_document(source, name or getattr(source, 'name', None) or str(source))
+
+
+def _iter_document(document, name):
+    root = None
+    try:
+        for event, elem in ET.iterparse(document, events=('start', 'end')):
+            if root is None:
+                root = elem
+            if event != 'end' or _local(elem.tag) != 'qti-assessment-item':
+                continue
+            try:
+                yield name, elem.get('identifier'), parse_item(elem)
+            except ValueError as e:
+                yield name, elem.get('identifier'), e
+            # Items never nest, so nothing the parser still needs is dropped
+            elem.clear()
+            if root is not elem:
+                root.clear()
+    except ET.ParseError as e:
+        # The rest of a malformed document cannot be read
+        yield name, None, ValueError(f"Invalid XML: {e}")
+
+
+def import_items(source, graph, node=None, node_map=None, batch_size=BATCH_SIZE, progress=None, name=None):
+    """
+    Create questions from the items of ``source`` on nodes of ``graph``. ``node_map``
+    maps item identifiers to node ids or titles. Unmapped items go to ``node``.
+    Items that fail are reported with their 1-based position, and the rest are still
+    imported. Returns {'total', 'created', 'errors'}.
+    """
+    nodes = dict(GraphNode.objects.filter(graph=graph).values_list('id', 'id'))
+    nodes.update(GraphNode.objects.filter(graph=graph).values_list('title', 'id'))
+    if node is not None and node not in nodes:
+        raise ValueError(f"Node {node} is not in graph {graph.id}.")
+    node_map = node_map or {}
+    unknown = sorted({str(target) for target in node_map.values() if target not in nodes})
+    if unknown:
+        raise ValueError(f"Not nodes of graph {graph.id}: {', '.join(unknown)}.")
+
+    report = {'total': 0, 'created': 0, 'errors': []}
+    batch = []
+    for number, (file_name, identifier, item) in enumerate(iter_items(source, name), start=1):
+        report['total'] += 1
+        target = node_map.get(identifier, node)
+        if not isinstance(item, ValueError) and target is None:
+            item = ValueError("No target node for this item.")
+        if isinstance(item, ValueError):
+            report['errors'].append({'item': number, 'file': file_name, 'identifier': identifier, 'error': str(item)})
+            continue
+        _, text, correct_answer, other_answers = item
+        batch.append(Question(node_id=nodes[target], text=text, correct_answer=correct_answer, other_answers=other_answers))
+        if len(batch) >= batch_size:
+            _import_batch(batch, graph, report)
+            batch = []
+            if progress:
+                progress(report)
+    if batch:
+        _import_batch(batch, graph, report)
+    if progress:
+        progress(report)
+    if report['created']:
+        dedup.index_missing()
+    return report
+
+
+def _import_batch(batch, graph, report):
+    with transaction.atomic():
+        Question.objects.bulk_create(batch)
+        # Cached per-version structures and clients' delta sync must see the new questions
+        KnowledgeGraph.bump_version(pk=graph.pk)
+    report['created'] += len(batch)
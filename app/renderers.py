@@ -0,0 +1,85 @@
+"""
+Compact renderers for large graph payloads, selected with the Accept header or
+``?format=``: ``columnar`` JSON and ``msgpack``.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+
+try:
+    import msgpack
+except ImportError:  # Only needed for the msgpack format
+    msgpack = None
+
+
+def columnar(data):
+    """
+    Turn every top-level list of objects into an object of parallel arrays, and each
+    list of a top-level list of lists, such as the attempts of a test. When a
+    ``nodes`` list is present, link ``source``/``target`` node ids become indices into
+    the node arrays. Links to nodes outside the payload, such as prerequisites in
+    another graph, have no index; they go to ``external_links`` with their node ids.
+    """
+    if isinstance(data, list):
+        return _columns(data)
+    if not isinstance(data, dict):
+        return data
+
+    result = dict(data)
+    nodes = data.get('nodes')
+    if isinstance(nodes, list) and isinstance(data.get('links'), list):
+        index = {node['id']: idx for idx, node in enumerate(nodes)}
+        links = [link for link in data['links'] if link['source'] in index and link['target'] in index]
+        result['links'] = {
+            'source': [index[link['source']] for link in links],
+            'target': [index[link['target']] for link in links],
+        }
+        if len(links) < len(data['links']):
+            result['external_links'] = [
+                link for link in data['links'] if link['source'] not in index or link['target'] not in index
+            ]
+    for key, value in result.items():
+        if isinstance(value, list) and value and all(isinstance(rows, list) for rows in value):
+            result[key] = [_columns(rows) for rows in value]
+        elif isinstance(value, list):
+            result[key] = _columns(value)
+    return result
+
+
+def _columns(rows):
+    if not rows or not all(isinstance(row, dict) for row in rows):
+        return rows
+    keys = list(rows[0])
+    for row in rows[1:]:
+        keys.extend(key for key in row if key not in keys)
+    return {key: [row.get(key) for row in rows] for key in keys}
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    media_type = 'application/vnd.learning-graph.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None and response.exception:
+            return super().render(data, accepted_media_type, renderer_context)
+        return super().render(columnar(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Dates, decimals and UUIDs are encoded the same way as in JSON responses
+        return msgpack.packb(data, default=lambda value: json.loads(json.dumps(value, cls=DjangoJSONEncoder)))
+
+
+GRAPH_RENDERERS = [JSONRenderer, BrowsableAPIRenderer, ColumnarJSONRenderer]
+if msgpack is not None:
+    GRAPH_RENDERERS.append(MessagePackRenderer)
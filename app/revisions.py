@@ -0,0 +1,61 @@
+"""
+Per-graph change log for delta sync.
+
+Every node, edge and question change bumps the graph version and records a
+GraphRevision whose ``revision`` is the new version, so a client holding revision
+``n`` only needs the entries after ``n``. Bulk writes that call
+``KnowledgeGraph.bump_version`` directly leave a gap in the log; clients behind such a
+gap, or behind the pruned part of the log, get a full snapshot instead.
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import GraphRevision, KnowledgeGraph
+
+# Revisions kept per graph; older ones are pruned
+HISTORY = 1000
+# Clients further behind than this get a snapshot, it is smaller than the deltas
+MAX_DELTAS = 500
+
+_deleting = threading.local()
+
+
+def deleting_graphs():
+    """Ids of graphs being deleted in this thread; their cascaded deletes are not logged."""
+    if not hasattr(_deleting, 'ids'):
+        _deleting.ids = set()
+    return _deleting.ids
+
+
+def record_change(graph_id, kind, action, data):
+    """Bump the graph version and log the change under it. Returns the new revision."""
+    if graph_id is None or graph_id in deleting_graphs():
+        return None
+    with transaction.atomic():
+        # The update locks the graph row, so concurrent writers get distinct revisions
+        if not KnowledgeGraph.objects.filter(pk=graph_id).update(version=F('version') + 1):
+            return None
+        revision = KnowledgeGraph.objects.filter(pk=graph_id).values_list('version', flat=True).get()
+        GraphRevision.objects.create(graph_id=graph_id, revision=revision, kind=kind, action=action, data=data)
+        if revision % 100 == 0:
+            GraphRevision.objects.filter(graph_id=graph_id, revision__lte=revision - HISTORY).delete()
+    return revision
+
+
+def changes_since(graph_id, since, current):
+    """
+    Logged changes after revision ``since`` up to ``current``, or None when the log
+    cannot bridge that range and the client needs a snapshot.
+    """
+    if since > current or current - since > MAX_DELTAS:
+        return None
+    changes = list(
+        GraphRevision.objects.filter(graph_id=graph_id, revision__gt=since, revision__lte=current)
+        .values('revision', 'kind', 'action', 'data')
+    )
+    # A missing revision was a bulk write or has been pruned
+    if len(changes) != current - since:
+        return None
+    return changes
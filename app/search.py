@@ -0,0 +1,184 @@
+"""
+Ranked search over node titles and question texts and answers.
+
+On PostgreSQL the pg_trgm and full-text GIN indexes from migration 0007 answer the
+query: a result matches when its words are similar to the query (typo tolerant) or
+when it contains the query terms. Other databases use an in-process inverted index
+per graph version with exact, prefix and trigram-fuzzy term matching.
+"""
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+
+from django.db import connection
+
+from .models import GraphNode, KnowledgeGraph, Question
+
+KINDS = ('node', 'question')
+TOKEN = re.compile(r'\w+')
+# Minimum trigram overlap for a fuzzy term match, pg_trgm's default similarity threshold
+FUZZY_THRESHOLD = 0.3
+
+NODE_TABLE = GraphNode._meta.db_table
+QUESTION_TABLE = Question._meta.db_table
+# Must stay identical to the expressions indexed in migration 0007
+NODE_DOCUMENT = 'n.title'
+QUESTION_DOCUMENT = "(q.text || ' ' || q.correct_answer || ' ' || q.other_answers::text)"
+
+
+def search(query, graph_id=None, kinds=KINDS, limit=20, offset=0):
+    """Returns (total matches, results) with results ordered by descending score."""
+    if not TOKEN.search(query):
+        return 0, []
+    if connection.vendor == 'postgresql':
+        return _search_postgres(query, graph_id, kinds, limit, offset)
+    return _search_index(query, graph_id, kinds, limit, offset)
+
+
+def _search_postgres(query, graph_id, kinds, limit, offset):
+    scope = 'AND n.graph_id = %(graph)s' if graph_id is not None else ''
+    parts = []
+    if 'node' in kinds:
+        parts.append(f"""
+            SELECT 'node' AS kind, n.id, n.graph_id, NULL::bigint AS node_id, n.title AS label,
+                   GREATEST(word_similarity(%(query)s, {NODE_DOCUMENT}),
+                            ts_rank(to_tsvector('simple', {NODE_DOCUMENT}), terms.tsquery)) AS score
+            FROM {NODE_TABLE} n, terms
+            WHERE (%(query)s <%% {NODE_DOCUMENT} OR to_tsvector('simple', {NODE_DOCUMENT}) @@ terms.tsquery) {scope}
+        """)
+    if 'question' in kinds:
+        parts.append(f"""
+            SELECT 'question' AS kind, q.id, n.graph_id, q.node_id, q.text AS label,
+                   GREATEST(word_similarity(%(query)s, {QUESTION_DOCUMENT}),
+                            ts_rank(to_tsvector('simple', {QUESTION_DOCUMENT}), terms.tsquery)) AS score
+            FROM {QUESTION_TABLE} q JOIN {NODE_TABLE} n ON n.id = q.node_id, terms
+            WHERE (%(query)s <%% {QUESTION_DOCUMENT} OR to_tsvector('simple', {QUESTION_DOCUMENT}) @@ terms.tsquery) {scope}
+        """)
+    sql = f"""
+        WITH terms AS (SELECT websearch_to_tsquery('simple', %(query)s) AS tsquery)
+        SELECT kind, id, graph_id, node_id, label, score, COUNT(*) OVER () AS total
+        FROM ({' UNION ALL '.join(parts)}) matches
+        ORDER BY score DESC, kind, id
+        LIMIT %(limit)s OFFSET %(offset)s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'query': query, 'graph': graph_id, 'limit': limit, 'offset': offset})
+        rows = cursor.fetchall()
+    if not rows:
+        return 0, []
+    return rows[0][-1], [_result(*row[:-1]) for row in rows]
+
+
+def _result(kind, object_id, graph_id, node_id, label, score):
+    result = {"kind": kind, "id": object_id, "graph": graph_id}
+    if kind == 'node':
+        result["title"] = label
+    else:
+        result["node"] = node_id
+        result["text"] = label
+    result["score"] = round(float(score), 4)
+    return result
+
+
+def tokens(text):
+    return TOKEN.findall(text.lower())
+
+
+def trigrams(term):
+    padded = f'  {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class InvertedIndex:
+    """Term -> documents index with a trigram index over the vocabulary for fuzzy lookups."""
+
+    def __init__(self, documents):
+        """``documents`` are (result fields, searchable text) pairs."""
+        self.documents = []
+        self.postings = defaultdict(dict)
+        for fields, text in documents:
+            doc = len(self.documents)
+            self.documents.append(fields)
+            for term in tokens(text):
+                self.postings[term][doc] = self.postings[term].get(doc, 0) + 1
+        self.vocabulary = sorted(self.postings)
+        self.term_trigrams = defaultdict(set)
+        for term in self.vocabulary:
+            for trigram in trigrams(term):
+                self.term_trigrams[trigram].add(term)
+
+    def _matching_terms(self, token):
+        """(term, weight) for exact, prefix and fuzzy matches of one query token."""
+        matches = {}
+        if token in self.postings:
+            matches[token] = 1.0
+        # Prefix matches keep type-ahead queries useful
+        start = bisect_left(self.vocabulary, token)
+        for term in self.vocabulary[start:start + 50]:
+            if not term.startswith(token):
+                break
+            matches.setdefault(term, 0.9)
+        if len(token) >= 3:
+            query_trigrams = trigrams(token)
+            shared = defaultdict(int)
+            for trigram in query_trigrams:
+                for term in self.term_trigrams.get(trigram, ()):
+                    shared[term] += 1
+            for term, count in shared.items():
+                similarity = count / (len(query_trigrams) + len(trigrams(term)) - count)
+                if similarity >= FUZZY_THRESHOLD:
+                    matches[term] = max(matches.get(term, 0.0), 0.8 * similarity)
+        return matches
+
+    def search(self, query):
+        """(score, result fields) for every matching document; scores are in [0, 1]."""
+        query_tokens = tokens(query)
+        scores = defaultdict(float)
+        for token in query_tokens:
+            best = {}
+            for term, weight in self._matching_terms(token).items():
+                postings = self.postings[term]
+                # Rarer terms say more about a document
+                idf = math.log(1 + len(self.documents) / len(postings)) / math.log(1 + len(self.documents))
+                for doc in postings:
+                    best[doc] = max(best.get(doc, 0.0), weight * (0.5 + 0.5 * idf))
+            for doc, score in best.items():
+                scores[doc] += score
+        return [(score / len(query_tokens), self.documents[doc]) for doc, score in scores.items()]
+
+
+@lru_cache(maxsize=256)
+def _graph_search_index(graph_id, version):
+    documents = [
+        ({"kind": 'node', "id": node_id, "graph": graph_id, "title": title}, title)
+        for node_id, title in GraphNode.objects.filter(graph_id=graph_id).values_list('id', 'title')
+    ]
+    questions = Question.objects.filter(node__graph_id=graph_id).values_list(
+        'id', 'node_id', 'text', 'correct_answer', 'other_answers'
+    )
+    documents.extend(
+        (
+            {"kind": 'question', "id": question_id, "graph": graph_id, "node": node_id, "text": text},
+            ' '.join([text, correct_answer, *map(str, other_answers or [])]),
+        )
+        for question_id, node_id, text, correct_answer, other_answers in questions
+    )
+    return InvertedIndex(documents)
+
+
+def _search_index(query, graph_id, kinds, limit, offset):
+    graphs = KnowledgeGraph.objects.all()
+    if graph_id is not None:
+        graphs = graphs.filter(pk=graph_id)
+    matches = [
+        (score, fields)
+        for graph_id, version in graphs.values_list('id', 'version')
+        for score, fields in _graph_search_index(graph_id, version).search(query)
+        if fields["kind"] in kinds
+    ]
+    matches.sort(key=lambda match: (-match[0], match[1]["kind"], match[1]["id"]))
+    return len(matches), [
+        dict(fields, score=round(score, 4)) for score, fields in matches[offset:offset + limit]
+    ]
@@ -1,7 +1,11 @@
 # your_app_name/serializers.py
 from rest_framework import serializers
 from .models import AppUser, KnowledgeGraph, GraphNode, Question, Test , TestAttempt
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import issued_before_revocation
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -27,9 +31,41 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             token['user_type'] = user.user_type
         else:
             token['user_type'] = 'admin'
+        # Claims read by AppTokenUser so authenticated requests need no user query
+        token['username'] = user.get_username()
+        token['is_staff'] = user.is_staff
+        token['is_superuser'] = user.is_superuser
+        token['perms'] = sorted(user.get_all_permissions())
         return token
 
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh that rejects revoked refresh tokens and issues tokens with the user's
+    current claims, instead of copying user_type and permissions from the old token.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        user = AppUser.objects.filter(pk=user_id).first() if user_id else None
+        if (user is None or not api_settings.USER_AUTHENTICATION_RULE(user)
+                or issued_before_revocation(refresh.payload.get('iat', 0), user.tokens_revoked_at)):
+            raise AuthenticationFailed('Token has been revoked.', code='token_revoked')
+
+        token = CustomTokenObtainPairSerializer.get_token(user)
+        data = {'access': str(token.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                try:
+                    refresh.blacklist()
+                except AttributeError:
+                    # The blacklist app is not installed
+                    pass
+            data['refresh'] = str(token)
+        return data
+
+
 class QuestionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Question
@@ -71,6 +107,12 @@ class KnowledgeGraphSerializer(serializers.ModelSerializer):
         model = KnowledgeGraph
         fields = ['id', 'title', 'created_by', 'nodes']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Lets callers that do not need question bodies skip them (and their prefetch)
+        if not self.context.get('include_questions', True):
+            self.fields['nodes'].child.fields.pop('questions')
+
 
 
 class TestSerializer(serializers.ModelSerializer):
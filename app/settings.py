@@ -1,6 +1,7 @@
 from datetime import timedelta
 from pathlib import Path
 import os
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -58,10 +59,18 @@ INSTALLED_APPS = [
 
 AUTHENTICATION_BACKENDS = [
     'app.authentication.AppUserBackend',  # Ensure this is your custom backend
-    'django.contrib.auth.backends.ModelBackend',     # Keep the default backend if you want to allow other users as well
 ]
 
+# Processes used to hash passwords during bulk enrollment (defaults to the CPU count)
+ENROLLMENT_HASH_WORKERS = int(os.environ.get('ENROLLMENT_HASH_WORKERS', 0)) or None
+# Where archive_attempts writes the Parquet files of archived attempts
+ATTEMPT_ARCHIVE_DIR = os.environ.get('ATTEMPT_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'attempts'))
+# Processes used for IITA bootstrap resamples (defaults to the CPU count)
+IITA_BOOTSTRAP_WORKERS = int(os.environ.get('IITA_BOOTSTRAP_WORKERS', 0)) or None
+
 MIDDLEWARE = [
+    'app.middleware.QueryInstrumentationMiddleware',  # Query counts, Server-Timing and /metrics
+    'app.middleware.CompressionMiddleware',  # Brotli/gzip above COMPRESSION_MIN_SIZE
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',   # Enable CORS
@@ -74,6 +83,15 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'app.urls'
 
+# Requests running more queries than this are logged with their repeated queries
+QUERY_COUNT_LOG_THRESHOLD = int(os.environ.get('QUERY_COUNT_LOG_THRESHOLD', 50))
+SERVER_TIMING_HEADER = True
+
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -140,7 +158,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'app.authentication.StatelessJWTAuthentication',  # Builds the user from token claims, no DB query
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
@@ -150,8 +168,29 @@ SIMPLE_JWT = {
      'ACCESS_TOKEN_LIFETIME': timedelta(minutes=10),
      'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
      'ROTATE_REFRESH_TOKENS': True,
-     'BLACKLIST_AFTER_ROTATION': True
+     'BLACKLIST_AFTER_ROTATION': True,
+     'TOKEN_USER_CLASS': 'app.authentication.AppTokenUser',
+}
+
+# Short-lived caches that can be rebuilt; point this at Redis or Memcached when running
+# more than one worker process. Token revocation is stored on the user row instead.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+    # Rendered QTI items (app/qti_generator.py); kept apart so bulk exports cannot
+    # evict sessions and other entries of the default cache
+    'qti': {
+        'BACKEND': os.environ.get('QTI_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('QTI_CACHE_LOCATION', 'qti-items'),
+    },
 }
+if CACHES['qti']['BACKEND'].endswith('LocMemCache'):
+    CACHES['qti']['OPTIONS'] = {'MAX_ENTRIES': 20_000}
 
 # CORS settings (allow frontend to access API)
 CORS_ALLOW_ALL_ORIGINS = True   # Allow all origins in development; restrict in production
+# Sent by the frontend with test submissions so retries are not stored twice
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
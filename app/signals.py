@@ -0,0 +1,138 @@
+from django.contrib.auth.models import Group
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .authentication import StatelessJWTAuthentication, revoke_tokens
+from .models import AppUser, GraphNode, KnowledgeGraph, Question
+from .revisions import deleting_graphs, record_change
+from .serializers import QuestionSerializer
+
+
+# AppUser fields copied into token claims
+CLAIM_FIELDS = ('user_type', 'is_staff', 'is_superuser')
+
+
+@receiver(pre_save, sender=AppUser)
+def note_claim_changes(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None or (update_fields is not None and not set(CLAIM_FIELDS) & set(update_fields)):
+        return
+    previous = AppUser.objects.filter(pk=instance.pk).values_list(*CLAIM_FIELDS).first()
+    instance._claims_changed = previous is not None and previous != tuple(getattr(instance, field) for field in CLAIM_FIELDS)
+
+
+@receiver(post_save, sender=AppUser)
+def revoke_tokens_on_credentials_change(sender, instance, created, **kwargs):
+    """Tokens carry user_type and permissions, so they must not outlive a change to them."""
+    claims_changed = getattr(instance, '_claims_changed', False)
+    instance._claims_changed = False
+    if created:
+        return
+    # set_password() leaves the raw password on the instance until save() finishes
+    if instance._password is not None or not instance.is_active or claims_changed:
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_delete, sender=AppUser)
+def forget_deleted_user(sender, instance, **kwargs):
+    # Without a user row every token of the user is rejected; drop this process's cached copies
+    StatelessJWTAuthentication.forget(instance.pk)
+
+
+# Clearing reports no pk_set, so the affected rows are read before they are removed
+PERMISSION_ACTIONS = ('post_add', 'post_remove', 'pre_clear')
+
+
+@receiver(m2m_changed, sender=AppUser.groups.through)
+@receiver(m2m_changed, sender=AppUser.user_permissions.through)
+def revoke_tokens_on_permission_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in PERMISSION_ACTIONS:
+        return
+    if not reverse:
+        user_ids = [instance.pk]
+    elif action == 'pre_clear':
+        user_ids = instance.appuser_set.values_list('id', flat=True)
+    else:
+        user_ids = pk_set
+    revoke_tokens(*user_ids)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def revoke_tokens_on_group_permission_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in PERMISSION_ACTIONS:
+        return
+    if not reverse:
+        groups = [instance]
+    elif action == 'pre_clear':
+        groups = instance.group_set.all()
+    else:
+        groups = Group.objects.filter(pk__in=pk_set)
+    revoke_tokens(*AppUser.objects.filter(groups__in=groups).values_list('id', flat=True).distinct())
+
+
+@receiver(pre_delete, sender=KnowledgeGraph)
+def stop_logging_deleted_graph(sender, instance, **kwargs):
+    # Its nodes and questions are deleted first; logging them would reference a deleted graph
+    deleting_graphs().add(instance.pk)
+
+
+@receiver(post_delete, sender=KnowledgeGraph)
+def forget_deleted_graph(sender, instance, **kwargs):
+    deleting_graphs().discard(instance.pk)
+
+
+@receiver(post_save, sender=GraphNode)
+def log_node_saved(sender, instance, **kwargs):
+    record_change(instance.graph_id, 'node', 'upsert', {'id': instance.pk, 'title': instance.title})
+
+
+@receiver(post_delete, sender=GraphNode)
+def log_node_deleted(sender, instance, **kwargs):
+    # Clients drop the node's links and questions with it
+    record_change(instance.graph_id, 'node', 'delete', {'id': instance.pk})
+
+
+def _question_graph(question):
+    return GraphNode.objects.filter(pk=question.node_id).values_list('graph_id', flat=True).first()
+
+
+@receiver(post_save, sender=Question)
+def log_question_saved(sender, instance, **kwargs):
+    record_change(_question_graph(instance), 'question', 'upsert', QuestionSerializer(instance).data)
+
+
+@receiver(post_save, sender=Question)
+def sign_question(sender, instance, raw=False, **kwargs):
+    # dedup loads numpy; importing it here keeps it out of AppConfig.ready()
+    from .dedup import index_question
+
+    if not raw:
+        index_question(instance)
+
+
+@receiver(post_delete, sender=Question)
+def log_question_deleted(sender, instance, **kwargs):
+    record_change(_question_graph(instance), 'question', 'delete', {'id': instance.pk, 'node': instance.node_id})
+
+
+@receiver(m2m_changed, sender=GraphNode.dependent_nodes.through)
+def log_edge_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Links are logged as D3 links: ``source`` is the prerequisite, ``target`` the dependent."""
+    if action == 'pre_clear':
+        # Clearing reports no pk_set, so the removed links are read before they go
+        other = 'prerequisite_nodes' if reverse else 'dependent_nodes'
+        pk_set = set(getattr(instance, other).values_list('id', flat=True))
+        instance._cleared_links = pk_set
+        return
+    if action == 'post_clear':
+        pk_set, change = getattr(instance, '_cleared_links', set()), 'delete'
+    elif action in ('post_add', 'post_remove'):
+        change = 'upsert' if action == 'post_add' else 'delete'
+    else:
+        return
+    if not pk_set:
+        return
+    links = [
+        {'source': other_id, 'target': instance.pk} if reverse else {'source': instance.pk, 'target': other_id}
+        for other_id in sorted(pk_set)
+    ]
+    record_change(instance.graph_id, 'edge', change, {'links': links})
@@ -0,0 +1,137 @@
+"""Seeded synthetic data for reproducing production scale locally."""
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import AppUser, GraphNode, KnowledgeGraph, Question, Test, TestAttempt, TestQuestion
+
+PASSWORD = 'synthetic-password'
+
+
+def create_graph(rng, teacher, title, nodes, density, questions_per_node):
+    """
+    Create a DAG-shaped graph. Node ``j`` takes roughly ``density * j`` of the earlier
+    nodes as prerequisites, so the node order is always a topological order.
+    Returns the graph, its nodes in topological order and the prerequisite index lists.
+    """
+    graph = KnowledgeGraph.objects.create(title=title, created_by=teacher)
+    graph_nodes = GraphNode.objects.bulk_create(
+        GraphNode(graph=graph, title=f'{title} concept {n}') for n in range(nodes)
+    )
+
+    prerequisites = []
+    edges = []
+    for j, node in enumerate(graph_nodes):
+        count = min(j, int(density * j + rng.random()))
+        prerequisites.append(sorted(rng.sample(range(j), count)))
+        edges.extend(
+            GraphNode.dependent_nodes.through(from_graphnode_id=graph_nodes[i].id, to_graphnode_id=node.id)
+            for i in prerequisites[j]
+        )
+    GraphNode.dependent_nodes.through.objects.bulk_create(edges, batch_size=1000)
+
+    Question.objects.bulk_create(
+        (
+            Question(
+                node=node,
+                text=f'{node.title} question {q}',
+                correct_answer=f'correct {q}',
+                other_answers=[f'wrong {q}.{a}' for a in range(3)],
+            )
+            for node in graph_nodes
+            for q in range(questions_per_node)
+        ),
+        batch_size=1000,
+    )
+    return graph, graph_nodes, prerequisites
+
+
+def sample_knowledge_state(rng, prerequisites, ability):
+    """Sample a set of mastered node indices that is closed under prerequisites."""
+    mastered = set()
+    for j, prereqs in enumerate(prerequisites):
+        if all(i in mastered for i in prereqs) and rng.random() < ability:
+            mastered.add(j)
+    return mastered
+
+
+@transaction.atomic
+def generate_dataset(seed=0, prefix='synthetic', graphs=1, nodes=50, density=0.05, questions_per_node=2,
+                     tests=1, questions_per_test=None, students=100, attempts=1, slip=0.1, guess=0.2):
+    """
+    Generate graphs, questions, tests, students and attempts. Answers are drawn from a
+    latent knowledge state per student: mastered nodes are answered correctly unless the
+    student slips, unmastered ones only by a lucky guess.
+    """
+    rng = random.Random(seed)
+    response_rng = random.Random(f'{seed}-responses')
+    teacher = AppUser.objects.create(
+        username=f'{prefix}-teacher', user_type='teacher', password=make_password(PASSWORD)
+    )
+
+    # Hash once; every synthetic student shares the password
+    student_password = make_password(PASSWORD)
+    student_users = AppUser.objects.bulk_create(
+        (
+            AppUser(username=f'{prefix}-student-{s}', user_type='student', password=student_password,
+                    first_name='Student', last_name=str(s))
+            for s in range(students)
+        ),
+        batch_size=1000,
+    )
+
+    created_graphs = []
+    created_tests = []
+    attempt_count = 0
+    for g in range(graphs):
+        graph, graph_nodes, prerequisites = create_graph(
+            rng, teacher, f'{prefix} graph {g}', nodes, density, questions_per_node
+        )
+        created_graphs.append(graph)
+        node_index = {node.id: idx for idx, node in enumerate(graph_nodes)}
+        questions = sorted(
+            Question.objects.filter(node__graph=graph).values_list('id', 'node_id', 'correct_answer', 'other_answers'),
+            key=lambda question: node_index[question[1]],
+        )
+
+        for t in range(tests):
+            chosen = questions
+            if questions_per_test and questions_per_test < len(questions):
+                chosen = sorted(rng.sample(questions, questions_per_test), key=lambda question: node_index[question[1]])
+            test = Test.objects.create(graph=graph, title=f'{graph.title} test {t}', author=teacher)
+            TestQuestion.objects.bulk_create(
+                (TestQuestion(test=test, question_id=question[0], order=idx) for idx, question in enumerate(chosen)),
+                batch_size=1000,
+            )
+            created_tests.append(test)
+
+            test_attempts = []
+            for student in student_users:
+                ability = rng.random()
+                for _ in range(attempts):
+                    state = sample_knowledge_state(rng, prerequisites, ability)
+                    answers = {
+                        str(question_id): int(rng.random() < (1 - slip if node_index[node_id] in state else guess))
+                        for question_id, node_id, _, _ in chosen
+                    }
+                    # Separate generator, so the answers stay the same for a given seed
+                    responses = {
+                        str(question_id): correct_answer if answers[str(question_id)] else response_rng.choice(other_answers)
+                        for question_id, _, correct_answer, other_answers in chosen
+                    }
+                    score = sum(answers.values()) / len(answers) * 100 if answers else None
+                    test_attempts.append(
+                        TestAttempt(test=test, student=student, answers=answers, responses=responses,
+                                    completed=True, score=score)
+                    )
+            TestAttempt.objects.bulk_create(test_attempts, batch_size=1000)
+            attempt_count += len(test_attempts)
+
+    return {
+        'teacher': teacher,
+        'students': student_users,
+        'graphs': created_graphs,
+        'tests': created_tests,
+        'attempts': attempt_count,
+    }
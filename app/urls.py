@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from app.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('app.api.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
\ No newline at end of file
@@ -1,37 +1,95 @@
 # your_app_name/views.py
+import asyncio
+import json
 from collections import defaultdict, deque
-from django.http import HttpResponse
-from learning_spaces.kst import iita
-import pandas as pd
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 import random
 from django.shortcuts import get_object_or_404
+from django.views import View
 from rest_framework import generics, viewsets, status, permissions
 
-from app.qti_generator import generate_qti
+# assembly, dedup, iita, item_analysis and qti_import load numpy, so they are imported
+# by the views that need them rather than by every worker at start-up
+from app import adaptive, derived_graphs, export, idempotency, live, search
+from app.authentication import stream_user
+from app.enrollment import ROSTER_FORMATS, enroll, read_roster, roster_format
+from app.knowledge_space import structure_for
+from app.layout import layout_for
+from app.learning_path import path_for_attempt, paths_for_students
+from app.qti_generator import DEFAULT_SEED as DEFAULT_QTI_SEED, generate_qti
+from app.renderers import GRAPH_RENDERERS
+from app.revisions import changes_since
 from .models import AppUser, KnowledgeGraph, GraphNode, Question, Test, TestAttempt, TestQuestion
 from .serializers import (
-    CustomTokenObtainPairSerializer, TestAttemptDetailSerializer, TestGraphSerializer, UserSerializer,
+    CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer, TestAttemptDetailSerializer, TestGraphSerializer, UserSerializer,
     KnowledgeGraphSerializer, GraphNodeSerializer, QuestionSerializer,TestSerializer, TestAttemptSerializer
 )
 from rest_framework.permissions import IsAuthenticated
 from .permissions import IsTeacher, IsExpert, IsStudent
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.decorators import action
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def graph_detail_queryset(questions=True):
+    """KnowledgeGraph queryset prefetching everything KnowledgeGraphSerializer touches."""
+    related = ['prerequisite_nodes', 'dependent_nodes'] + (['questions'] if questions else [])
+    return KnowledgeGraph.objects.prefetch_related(
+        Prefetch('nodes', queryset=GraphNode.objects.prefetch_related(*related))
+    )
+
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
+
 class UserRegistrationView(generics.CreateAPIView):
     queryset = AppUser.objects.all()
     serializer_class = UserSerializer
 
 
+class BulkEnrollmentView(APIView):
+    """
+    Enroll a roster of users in one request: either a CSV/JSONL file uploaded as
+    ``roster`` or a JSON list under ``students``. Rows that fail are reported, not fatal.
+    Teachers enroll students only, into groups they belong to themselves.
+    """
+    permission_classes = [IsTeacher]
+
+    def post(self, request):
+        roster = request.FILES.get('roster')
+        if roster is not None:
+            fmt = request.data.get('format') or roster_format(roster.name)
+            if fmt not in ROSTER_FORMATS:
+                return Response(
+                    {"error": f"Unsupported roster format. Use one of: {', '.join(ROSTER_FORMATS)}."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            rows = read_roster(roster, fmt)
+        else:
+            rows = request.data.get('students')
+            if not isinstance(rows, list):
+                return Response(
+                    {"error": "Upload a roster file or send a list of students."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        groups = AppUser.objects.filter(pk=request.user.id, groups__isnull=False).values_list('groups__name', flat=True)
+        report = enroll(rows, user_types={'student'}, groups=set(groups))
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST)
+
+
 class TeacherView(APIView):
     permission_classes = [IsTeacher]
 
@@ -209,14 +267,22 @@ class FirstQuestionView(APIView):
             return Response({'error': 'Question with id=1 does not exist.'}, status=404)
 
 
+def apply_layout(d3_data, graph):
+    """Add the cached x/y/layer coordinates of ``graph`` to D3 nodes in place."""
+    layout = layout_for(graph)
+    for node in d3_data["nodes"]:
+        node.update(layout[node["id"]])
+
+
 class KnowledgeGraphWithTestResultDetailView(APIView):
     permission_classes = [IsAuthenticated]
+    renderer_classes = GRAPH_RENDERERS
 
     def get(self, request, test_attempt_id):
         """Retrieve a specific knowledge graph with D3.js structure, including the question results."""
-        test_attempt = get_object_or_404(TestAttempt, pk=test_attempt_id)
+        test_attempt = get_object_or_404(TestAttempt.objects.select_related('test', 'student'), pk=test_attempt_id)
         
-        graph = get_object_or_404(KnowledgeGraph, id=test_attempt.test.graph.id)
+        graph = get_object_or_404(graph_detail_queryset(), id=test_attempt.test.graph_id)
         serializer = KnowledgeGraphSerializer(graph)
         
         d3_data = {
@@ -240,10 +306,9 @@ class KnowledgeGraphWithTestResultDetailView(APIView):
 
             for question in node_data['questions']:
                 question_id = question['id']  # Extract the ID from the dictionary
-                question_instance = Question.objects.get(id=question_id)  # Use the extracted ID
-                is_correct = answers.get(str(question_instance.id), 0) 
+                is_correct = answers.get(str(question_id), 0) 
                 node["answer_correctness"].append({
-                    "question_id": question_instance.id,
+                    "question_id": question_id,
                     "answered_correctly": is_correct
                 })
             
@@ -260,61 +325,336 @@ class KnowledgeGraphWithTestResultDetailView(APIView):
                 }
                 d3_data["links"].append(link)
 
+        if request.query_params.get('layout') == 'precomputed':
+            try:
+                apply_layout(d3_data, graph)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
         return Response(d3_data)
 
     
 
+def graph_d3_data(graph, questions=True):
+    """D3.js structure of a graph fetched with graph_detail_queryset(questions)."""
+    serializer = KnowledgeGraphSerializer(graph, context={'include_questions': questions})
+
+    d3_data = {
+        "nodes": [],
+        "links": [],
+        "revision": graph.version,  # Pass as ?since= to the changes endpoint
+    }
+
+    for node_data in serializer.data['nodes']:
+        node = {
+            "id": node_data['id'],
+            "title": node_data['title'],
+        }
+        if questions:
+            node["questions"] = node_data['questions']
+        d3_data["nodes"].append(node)
+
+    for node_data in serializer.data['nodes']:
+        source_id = node_data['id']  
+        for prerequisite_id in node_data['prerequisite_nodes']:
+            target_id = prerequisite_id  
+            link = {
+                "source": target_id, 
+                "target": source_id
+            }   
+            d3_data["links"].append(link)
+
+    return d3_data
+
+
 class KnowledgeGraphDetailView(APIView):
+    renderer_classes = GRAPH_RENDERERS
+
+    def get(self, request, pk):
+        """
+        Retrieve a specific knowledge graph with D3.js structure. Question bodies are
+        left out when ``include`` is given without ``questions``.
+        """
+        include = request.query_params.get('include')
+        questions = include is None or 'questions' in include.split(',')
+        graph = get_object_or_404(graph_detail_queryset(questions), pk=pk)
+        d3_data = graph_d3_data(graph, questions)
+
+        if request.query_params.get('layout') == 'precomputed':
+            try:
+                apply_layout(d3_data, graph)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(d3_data)
+
+
+class KnowledgeGraphChangesView(APIView):
+    """
+    Changes to a graph after revision ``since``, for clients patching a local copy.
+    Each change has a ``kind`` (node, edge, question), an ``action`` (upsert, delete)
+    and the changed data. Clients the change log cannot catch up get a ``snapshot``
+    in the graph detail format instead.
+    """
+    renderer_classes = GRAPH_RENDERERS
+
+    def get(self, request, pk):
+        try:
+            since = int(request.query_params['since'])
+        except (KeyError, ValueError):
+            return Response({"error": "since must be an integer revision."}, status=status.HTTP_400_BAD_REQUEST)
+
+        graph = get_object_or_404(KnowledgeGraph.objects.only('id', 'version'), pk=pk)
+        changes = changes_since(graph.id, since, graph.version)
+        if changes is not None:
+            return Response({"revision": graph.version, "changes": changes})
+
+        graph = get_object_or_404(graph_detail_queryset(), pk=pk)
+        return Response({"revision": graph.version, "snapshot": graph_d3_data(graph)})
+
+
+class KnowledgeGraphReductionView(APIView):
+    """
+    Edges of a graph implied by other paths (GET), or remove them (POST), leaving the
+    transitive reduction, which has the same prerequisite closure.
+    """
+    permission_classes = [IsTeacher | IsExpert]
+
     def get(self, request, pk):
-        """Retrieve a specific knowledge graph with D3.js structure."""
         graph = get_object_or_404(KnowledgeGraph, pk=pk)
-        serializer = KnowledgeGraphSerializer(graph)
+        try:
+            redundant = derived_graphs.redundant_edges(structure_for(graph))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "graph": graph.id,
+            "redundant": [{"source": source, "target": target} for source, target in redundant],
+        })
 
-        d3_data = {
-            "nodes": [],
-            "links": []
-        }
+    def post(self, request, pk):
+        graph = get_object_or_404(KnowledgeGraph, pk=pk)
+        try:
+            removed = derived_graphs.reduce_graph(graph)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "graph": graph.id,
+            "removed": [{"source": source, "target": target} for source, target in removed],
+        })
 
-        node_mapping = {}
 
-        for idx, node_data in enumerate(serializer.data['nodes']):
-            node = {
-                "id": node_data['id'],
-                "title": node_data['title'],
-                "questions": node_data['questions']
+class KnowledgeGraphDiffView(APIView):
+    """
+    Structural diff of graph ``other_pk`` against graph ``pk``, nodes matched by title:
+    added, transitively implied, removed and indirect edges, with precision and recall
+    over direct edges and over prerequisite closures.
+    """
+    permission_classes = [IsTeacher | IsExpert]
+
+    def get(self, request, pk, other_pk):
+        reference = get_object_or_404(KnowledgeGraph, pk=pk)
+        candidate = get_object_or_404(KnowledgeGraph, pk=other_pk)
+        try:
+            return Response(derived_graphs.diff(reference, candidate))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class KnowledgeSpaceView(APIView):
+    """
+    Knowledge space of a graph: how many feasible states it has (counted up to ``limit``),
+    optional uniform-ish ``sample`` of states, and for a ``state`` given as comma-separated
+    node ids whether it is feasible plus its inner and outer fringe. ``limit`` and
+    ``sample`` are clamped to ``max_limit`` and ``max_samples``.
+    """
+    permission_classes = [IsAuthenticated]
+    max_limit = 100000
+    max_samples = 1000
+
+    def get(self, request, pk):
+        graph = get_object_or_404(KnowledgeGraph, pk=pk)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10000)), 1), self.max_limit)
+            sample = min(int(request.query_params.get('sample', 0)), self.max_samples)
+            state_ids = [int(node_id) for node_id in request.query_params.get('state', '').split(',') if node_id]
+        except ValueError:
+            return Response({"error": "limit, sample and state must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            knowledge = structure_for(graph)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        count, complete = knowledge.count_states(limit)
+        data = {"version": graph.version, "nodes": knowledge.size, "states": count, "complete": complete}
+
+        if sample > 0:
+            data["samples"] = [knowledge.node_set(state) for state in knowledge.sample(sample)]
+
+        if 'state' in request.query_params:
+            try:
+                state = knowledge.mask(state_ids)
+            except KeyError:
+                return Response({"error": "State contains nodes outside this graph."}, status=status.HTTP_400_BAD_REQUEST)
+            data["state"] = {
+                "nodes": knowledge.node_set(state),
+                "feasible": knowledge.is_feasible(state),
+                "closure": knowledge.node_set(knowledge.closure(state)),
+                "inner_fringe": knowledge.node_set(knowledge.inner_fringe(state)),
+                "outer_fringe": knowledge.node_set(knowledge.outer_fringe(state)),
             }
-            d3_data["nodes"].append(node)
-            node_mapping[node_data['id']] = idx
+        return Response(data)
 
-        for node_data in serializer.data['nodes']:
-            source_id = node_data['id']  
-            for prerequisite_id in node_data['prerequisite_nodes']:
-                target_id = prerequisite_id  
-                link = {
-                    "source": target_id, 
-                    "target": source_id
-                }   
-                d3_data["links"].append(link)
 
-        return Response(d3_data)
+class LearningPathView(APIView):
+    """
+    Ordered study path of unmastered prerequisite nodes leading to ``targets`` (comma-separated
+    node ids, default: the whole graph). Based on one ``attempt_id``, or on the aggregated
+    attempts of ``student_id`` (comma-separated for dashboards) on ``graph_id``.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            target_ids = [int(node_id) for node_id in params.get('targets', '').split(',') if node_id]
+            student_ids = [int(student_id) for student_id in params.get('student_id', '').split(',') if student_id]
+        except ValueError:
+            return Response({"error": "targets and student_id must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        is_student = request.user.user_type == 'student'
+
+        try:
+            if params.get('attempt_id'):
+                attempt = get_object_or_404(TestAttempt.objects.select_related('test__graph'), pk=params['attempt_id'])
+                if is_student and attempt.student_id != request.user.id:
+                    return Response({"error": "You can only view your own attempts."}, status=status.HTTP_403_FORBIDDEN)
+                return Response(path_for_attempt(attempt, target_ids))
+
+            graph = get_object_or_404(KnowledgeGraph, pk=params.get('graph_id'))
+            if is_student:
+                if student_ids and student_ids != [request.user.id]:
+                    return Response({"error": "You can only view your own path."}, status=status.HTTP_403_FORBIDDEN)
+                student_ids = [request.user.id]
+            if not student_ids:
+                return Response({"error": "Provide attempt_id, or graph_id and student_id."}, status=status.HTTP_400_BAD_REQUEST)
+            paths = paths_for_students(graph, student_ids, target_ids)
+        except KeyError:
+            return Response({"error": "Targets contain nodes outside this graph."}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if len(student_ids) == 1:
+            return Response(paths[student_ids[0]])
+        return Response({str(student_id): path for student_id, path in paths.items()})
+
+
+class DuplicateQuestionsView(APIView):
+    """
+    Clusters of near-duplicate questions across all graphs, optionally only those
+    touching ``graph_id``. ``threshold`` is the minimum estimated similarity (0-1).
+    """
+    permission_classes = [IsTeacher | IsExpert]
+
+    def get(self, request):
+        from app import dedup
+
+        try:
+            graph_id = int(request.query_params['graph_id']) if request.query_params.get('graph_id') else None
+            threshold = float(request.query_params.get('threshold', dedup.THRESHOLD))
+        except ValueError:
+            return Response({"error": "graph_id must be an integer and threshold a number."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < threshold <= 1:
+            return Response({"error": "threshold must be between 0 and 1."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"clusters": dedup.find_clusters(graph_id, threshold)})
+
+
+class QTIImportView(APIView):
+    """
+    Import the choice items of an uploaded QTI 3.0 document or zip package (``package``)
+    as questions on ``graph_id``. ``node_map`` (a JSON object, item identifier -> node
+    id or title) places items on nodes; the rest go to ``node_id``. Items that fail
+    are reported, not fatal.
+    """
+    permission_classes = [IsTeacher | IsExpert]
+
+    def post(self, request):
+        package = request.FILES.get('package')
+        if package is None:
+            return Response({"error": "Upload a QTI document or package as package."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            graph_id = int(request.data['graph_id'])
+            node_id = int(request.data['node_id']) if request.data.get('node_id') else None
+            node_map = request.data.get('node_map') or {}
+            if isinstance(node_map, str):
+                node_map = json.loads(node_map)
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "graph_id is required, node_id must be an integer and node_map a JSON object."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not isinstance(node_map, dict):
+            return Response({"error": "node_map must be a JSON object."}, status=status.HTTP_400_BAD_REQUEST)
+        graph = get_object_or_404(KnowledgeGraph, pk=graph_id)
+
+        from app import qti_import
+
+        try:
+            report = qti_import.import_items(package, graph, node_id, node_map, name=package.name)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_201_CREATED if report['created'] else status.HTTP_400_BAD_REQUEST)
+
+
+class SearchView(APIView):
+    """
+    Ranked, paginated search over node titles and question texts and answers.
+    ``q`` is required; ``graph_id`` scopes the search and ``kind`` (node or question)
+    restricts the result type.
+    """
+    permission_classes = [IsTeacher | IsExpert]
+    max_page_size = 100
+
+    def get(self, request):
+        params = request.query_params
+        query = params.get('q', '').strip()
+        if not query:
+            return Response({"error": "q is required."}, status=status.HTTP_400_BAD_REQUEST)
+        kinds = [params['kind']] if params.get('kind') else search.KINDS
+        if any(kind not in search.KINDS for kind in kinds):
+            return Response({"error": f"kind must be one of {', '.join(search.KINDS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            graph_id = int(params['graph_id']) if params.get('graph_id') else None
+            page = max(int(params.get('page', 1)), 1)
+            page_size = min(max(int(params.get('page_size', 20)), 1), self.max_page_size)
+        except ValueError:
+            return Response({"error": "graph_id, page and page_size must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        count, results = search.search(query, graph_id, kinds, limit=page_size, offset=(page - 1) * page_size)
+        return Response({"count": count, "page": page, "page_size": page_size, "results": results})
 
 
 class TestListView(APIView):
 
     def get(self, request):
-        tests = Test.objects.all()
+        tests = Test.objects.select_related('author', 'graph').prefetch_related('questions')
         serializer = TestSerializer(tests, many=True)
         return Response(serializer.data)
 
 class TestListGraphView(APIView):
 
     def get(self, request):
-        tests = Test.objects.all()
+        tests = Test.objects.select_related('author', 'graph')
         serializer = TestGraphSerializer(tests, many=True)
         return Response(serializer.data)
     
 
 class TestCreationView(APIView):
+    """
+    Create a test on a graph from the given ``question_ids``, or, without them,
+    assemble one of ``length`` questions that best tells knowledge states apart.
+    Assembly takes optional ``required_node_ids`` (each gets a question),
+    ``node_ids`` (the nodes to draw the other questions from) and ``seed``.
+    """
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -322,62 +662,26 @@ class TestCreationView(APIView):
         question_ids = request.data.get('question_ids', [])
 
         graph = get_object_or_404(KnowledgeGraph, pk=graph_id)
-        questions = Question.objects.filter(id__in=question_ids).select_related('node')
 
-        # Get all nodes in the graph prefetched for performance
-        all_nodes = {node.id: node for node in graph.nodes.prefetch_related('prerequisite_nodes')}
-
-        # Memo dictionary to cache ancestor counts
-        ancestor_count_cache = {}
-
-        def count_ancestors(node):
-            # If cached, return
-            if node.id in ancestor_count_cache:
-                return ancestor_count_cache[node.id]
-
-            # No prerequisites = 0 ancestors
-            prereqs = node.prerequisite_nodes.all()
-            if not prereqs:
-                ancestor_count_cache[node.id] = 0
-                return 0
-
-            # Calculate unique ancestors count recursively
-            ancestors = set()
-            for prereq in prereqs:
-                ancestors.add(prereq.id)
-                # Add ancestors of prerequisite
-                ancestors.update(self.get_ancestor_ids(prereq, all_nodes, ancestor_count_cache))
-            ancestor_count_cache[node.id] = len(ancestors)
-            return len(ancestors)
-
-        # Helper to get all ancestor IDs of a node recursively (to avoid recounting)
-        def get_ancestor_ids(node, all_nodes, cache):
-            if node.id in cache and isinstance(cache[node.id], set):
-                return cache[node.id]
-
-            prereqs = node.prerequisite_nodes.all()
-            if not prereqs:
-                cache[node.id] = set()
-                return set()
-
-            ancestors = set()
-            for prereq in prereqs:
-                ancestors.add(prereq.id)
-                ancestors.update(get_ancestor_ids(prereq, all_nodes, cache))
-            cache[node.id] = ancestors
-            return ancestors
-
-        # We'll use get_ancestor_ids, so cache must store sets during recursion
-        ancestor_count_cache = {}
-
-        # Replacing count_ancestors with get_ancestor_ids length
-        def count_ancestors_final(node):
-            return len(get_ancestor_ids(node, all_nodes, ancestor_count_cache))
+        try:
+            knowledge = structure_for(graph)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        assembled = None
+        if not question_ids and request.data.get('length') is not None:
+            assembled = self.assemble(request, graph, knowledge)
+            if isinstance(assembled, Response):
+                return assembled
+            question_ids = assembled["question_ids"]
+
+        questions = Question.objects.filter(id__in=question_ids).select_related('node')
 
         # Map questions to ancestor counts
         question_ancestors = {}
         for q in questions:
-            anc_count = count_ancestors_final(q.node)
+            node_index = knowledge.index.get(q.node_id)
+            anc_count = knowledge.ancestors[node_index].bit_count() if node_index is not None else 0
             question_ancestors[q] = anc_count
             logger.debug(f"Question ID {q.id} | Text: {q.text[:50]}... | Node ID {q.node.id} has {anc_count} ancestors")
 
@@ -388,13 +692,55 @@ class TestCreationView(APIView):
         test = Test.objects.create(
             graph=graph,
             title=f"Test for {graph.title}",
-            author=request.user,
+            author_id=request.user.id,
         )
 
         for idx, (question, _) in enumerate(sorted_questions):
             TestQuestion.objects.create(test=test, question=question, order=idx)
 
-        return Response({"test_id": test.id}, status=status.HTTP_201_CREATED)
+        return Response({"test_id": test.id, **(assembled or {})}, status=status.HTTP_201_CREATED)
+
+    def assemble(self, request, graph, knowledge):
+        try:
+            length = int(request.data['length'])
+            required_nodes = [int(node_id) for node_id in request.data.get('required_node_ids') or []]
+            candidate_nodes = request.data.get('node_ids')
+            if candidate_nodes is not None:
+                candidate_nodes = [int(node_id) for node_id in candidate_nodes]
+            seed = request.data.get('seed')
+            seed = int(seed) if seed is not None else None
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "length and seed must be integers, required_node_ids and node_ids lists of node IDs."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not 1 <= length <= 500 or len(required_nodes) > length:
+            return Response(
+                {"error": "length must be between 1 and 500 and at least the number of required nodes."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        node_questions = defaultdict(list)
+        for node_id, question_id in Question.objects.filter(node__graph=graph).order_by('node_id', 'id').values_list('node_id', 'id'):
+            node_questions[node_id].append(question_id)
+        missing = [node_id for node_id in required_nodes if node_id not in node_questions]
+        if missing:
+            return Response(
+                {"error": f"Required nodes without questions in this graph: {missing}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        from app import assembly
+
+        question_ids, discrimination = assembly.assemble(
+            knowledge, node_questions, length, list(dict.fromkeys(required_nodes)), candidate_nodes, seed=seed,
+        )
+        if not question_ids:
+            return Response(
+                {"error": "No questions could be selected from the candidate nodes."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return {"question_ids": question_ids, "discrimination": round(discrimination, 4)}
     
 class TestAttemptView(APIView):
     permission_classes = [IsAuthenticated, IsStudent]
@@ -418,6 +764,18 @@ class TestAttemptView(APIView):
         return Response(serialized_questions)
 
     def post(self, request, test_id):
+        """
+        Score and store a submission. With an ``Idempotency-Key`` header, a retry returns
+        the first submission's response instead of storing another attempt.
+        """
+        try:
+            key = idempotency.submission_key(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if key is not None:
+            replayed = self.replay(request, test_id, key)
+            if replayed is not None:
+                return replayed
 
         test = get_object_or_404(Test, pk=test_id)
 
@@ -433,46 +791,159 @@ class TestAttemptView(APIView):
             user_answer = submitted_answers.get(str(question.id))
             correct_answers[str(question.id)] = int(user_answer == question.correct_answer)
 
+        try:
+            with transaction.atomic():
+                test_attempt = TestAttempt.objects.create(
+                    test=test,
+                    student_id=request.user.id,
+                    answers=correct_answers,
+                    responses={
+                        question_id: str(submitted_answers[question_id])
+                        for question_id in correct_answers if submitted_answers.get(question_id) is not None
+                    },
+                    completed=True
+                )
+                test_attempt.calculate_score()
+                response = {
+                    "message": "Test submitted successfully.",
+                    "attempt_id": test_attempt.id,
+                    "score": test_attempt.score,
+                    "total_questions": len(correct_answers),
+                    "correct_answers": sum(correct_answers.values()),
+                    "answers": correct_answers
+                }
+                if key is not None:
+                    idempotency.record(request.user.id, key, test.id, test_attempt.id, response)
+                transaction.on_commit(lambda: live.publish(test_attempt), robust=True)
+        except IntegrityError:
+            # A concurrent retry with the same key committed first
+            replayed = self.replay(request, test_id, key) if key is not None else None
+            if replayed is None:
+                raise
+            return replayed
+
+        return Response(response, status=status.HTTP_201_CREATED)
+
+    def replay(self, request, test_id, key):
+        """The stored response of an earlier submission with ``key``, or None."""
+        receipt = idempotency.find(request.user.id, key)
+        if receipt is None:
+            return None
+        receipt_test_id, response = receipt
+        if receipt_test_id != test_id:
+            return Response(
+                {"error": "This idempotency key was already used for another test."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(response, status=status.HTTP_201_CREATED, headers={'Idempotent-Replayed': 'true'})
+    
+
+
+class AdaptiveTestStartView(APIView):
+    """Start an adaptive session that only asks the questions the graph cannot infer."""
+    permission_classes = [IsAuthenticated, IsStudent]
+
+    def post(self, request, test_id):
+        get_object_or_404(Test, pk=test_id)
+        try:
+            session_id, session, structure = adaptive.start_session(test_id, request.user.id)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if session['pending'] is None:
+            adaptive.end_session(session_id)
+            return Response({"error": "This test has no questions."}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "session_id": session_id,
+            "question": adaptive.serialize_question(structure, session['pending']),
+            "total_questions": len(structure['questions']),
+        }, status=status.HTTP_201_CREATED)
+
+
+class AdaptiveTestAnswerView(APIView):
+    """Answer the pending question of an adaptive session; returns the next question or the result."""
+    permission_classes = [IsAuthenticated, IsStudent]
+
+    def post(self, request, test_id, session_id):
+        with adaptive.session_lock(session_id) as acquired:
+            if not acquired:
+                return Response(
+                    {"error": "An answer to this session is already being processed."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return self.answer(request, test_id, session_id)
+
+    def answer(self, request, test_id, session_id):
+        session = adaptive.load_session(session_id)
+        if session is None or session['test'] != test_id or session['student'] != request.user.id:
+            return Response({"error": "Session not found or expired."}, status=status.HTTP_404_NOT_FOUND)
+
+        question_id = request.data.get("question_id")
+        if str(question_id) != str(session['pending']):
+            return Response(
+                {"error": "Answer the pending question first.", "pending_question_id": session['pending']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        structure, beliefs = adaptive.record_answer(session_id, session, request.data.get("answer"))
+        if session['pending'] is not None:
+            return Response({
+                "question": adaptive.serialize_question(structure, session['pending']),
+                "questions_asked": len(session['answers']),
+            })
+
+        answers = {str(question_id): correct for question_id, correct in session['answers']}
+        inferred_nodes = adaptive.inferred_nodes(structure, beliefs)
         test_attempt = TestAttempt.objects.create(
-            test=test,
-            student=request.user,
-            answers=correct_answers,
+            test_id=test_id,
+            student_id=request.user.id,
+            answers=answers,
+            inferred_nodes=inferred_nodes,
             completed=True
         )
         test_attempt.calculate_score()
+        adaptive.end_session(session_id)
+        transaction.on_commit(lambda: live.publish(test_attempt), robust=True)
 
         return Response({
             "message": "Test submitted successfully.",
             "attempt_id": test_attempt.id,
             "score": test_attempt.score,
-            "total_questions": len(correct_answers),
-            "correct_answers": sum(correct_answers.values()),
-            "answers": correct_answers
+            "questions_asked": len(answers),
+            "total_questions": len(structure['questions']),
+            "correct_answers": sum(answers.values()),
+            "answers": answers,
+            "mastered_nodes": [int(node_id) for node_id, mastered in inferred_nodes.items() if mastered],
         }, status=status.HTTP_201_CREATED)
-    
 
 
 class TestAttemptsView(APIView):
+    renderer_classes = GRAPH_RENDERERS
 
     def get(self, request, test_id):
-        test = get_object_or_404(Test, pk=test_id)
+        test = get_object_or_404(Test.objects.select_related('graph'), pk=test_id)
         
         graph = test.graph
         
-        attempts = TestAttempt.objects.filter(test=test)
+        attempts = list(TestAttempt.objects.filter(test=test).values_list('answers', flat=True))
+
+        # Resolve every answered question to its node in a single query
+        question_ids = {question_id for answers in attempts for question_id in answers}
+        question_nodes = {
+            str(question_id): node_id
+            for question_id, node_id in Question.objects.filter(id__in=question_ids).values_list('id', 'node_id')
+        }
+        if len(question_nodes) != len(question_ids):
+            raise Http404("No Question matches the given query.")
         
         result = []
         
-        for attempt in attempts:
+        for answers in attempts:
             attempt_result = []
             
-            for question_id, answer in attempt.answers.items():
-                question = get_object_or_404(Question, pk=question_id)
-                
-                node = question.node
-                
+            for question_id, answer in answers.items():
                 attempt_result.append({
-                    'node': node.id,  
+                    'node': question_nodes[question_id],  
                     'answer': answer
                 })
             
@@ -488,6 +959,61 @@ class TestAttemptsView(APIView):
         
         return Response(response_data)
     
+class ItemStatisticsView(APIView):
+    """
+    Item analysis of a test over all complete attempts: p-values, point-biserial and
+    corrected item-total discrimination, Cronbach's alpha and distractor statistics.
+    Running sums are stored per test, so only attempts submitted since the last
+    request are read.
+    """
+    permission_classes = [IsTeacher | IsExpert]
+
+    def get(self, request, test_id):
+        from app import item_analysis
+
+        test = get_object_or_404(Test, pk=test_id)
+        return Response(item_analysis.analyze(item_analysis.refresh(test)))
+
+
+class AttemptExportView(APIView):
+    """
+    Stream attempts as CSV or Parquet (``file_format``), one row per answered question
+    with its node. Scope with ``test``, ``graph`` and a ``since``/``until`` submission date range.
+    """
+    permission_classes = [IsTeacher | IsExpert]
+
+    def get(self, request):
+        # Not ``format``, which selects the DRF renderer
+        fmt = request.query_params.get('file_format', 'csv')
+        if fmt not in export.EXPORT_FORMATS:
+            return Response(
+                {"error": f"file_format must be one of {', '.join(export.EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            scope = {
+                key: int(request.query_params[key])
+                for key in ('test', 'graph') if request.query_params.get(key)
+            }
+        except ValueError:
+            return Response({"error": "test and graph must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            bounds = {
+                key: export.parse_bound(request.query_params[key])
+                for key in ('since', 'until') if request.query_params.get(key)
+            }
+            chunks = export.export(fmt, scope.get('test'), scope.get('graph'), **bounds)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if isinstance(request._request, ASGIRequest):
+            chunks = export.async_chunks(chunks)
+        response = StreamingHttpResponse(chunks, content_type=export.CONTENT_TYPES[fmt])
+        name = '-'.join(f'{key}-{value}' for key, value in scope.items()) or 'all'
+        response['Content-Disposition'] = f'attachment; filename="attempts-{name}.{fmt}"'
+        return response
+
+
 class TestResultsView(APIView):
     def get(self, request, test_id):
         try:
@@ -501,13 +1027,147 @@ class TestResultsView(APIView):
         except Test.DoesNotExist:
             return Response({"error": "Test not found."}, status=status.HTTP_404_NOT_FOUND)
         
+class LiveTestResultsView(View):
+    """
+    Server-sent events for a test's results dashboard: a ``snapshot`` of the running
+    summary, then one ``attempt`` event per submitted attempt. Only the ASGI application
+    (app/asgi.py) serves it: under WSGI the open stream would hold a worker thread and be
+    buffered, so it answers 501 there. EventSource cannot set headers, so the token may
+    come as ``?token=``.
+    """
+
+    async def get(self, request, test_id):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"error": "Live results are only available from the ASGI server."}, status=501)
+        user = await sync_to_async(stream_user)(request)
+        if user is None:
+            return JsonResponse({"error": "Authentication credentials were not provided or are invalid."}, status=401)
+        if user.user_type not in ('teacher', 'expert'):
+            return JsonResponse({"error": "You do not have permission to perform this action."}, status=403)
+        if not await Test.objects.filter(pk=test_id).aexists():
+            return JsonResponse({"error": "Test not found."}, status=404)
+
+        live.ensure_listener()
+        response = StreamingHttpResponse(self.events(test_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Keep proxies from buffering the stream
+        return response
+
+    async def events(self, test_id):
+        # Subscribed before the snapshot is read, so no attempt falls in between
+        queue = live.hub.subscribe(test_id)
+        try:
+            yield live.sse('snapshot', await sync_to_async(live.results_summary)(test_id))
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), live.HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield live.sse('attempt', event, event["attempt"])
+        finally:
+            live.hub.unsubscribe(test_id, queue)
+
+
 class GenerateGraphFromIITA(APIView):
+    """
+    Derive prerequisite edges from the test's attempts with IITA and write them to a
+    clone of the test's graph. ``incremental`` estimates from the per-test running
+    IITA statistics instead of rebuilding the attempts matrix; ``target_graph_id``
+    updates the edges of an earlier derived graph in place instead of cloning again.
+    ``bootstrap`` reruns IITA on that many resamples of the attempts (at most
+    iita.MAX_RESAMPLES) and keeps only edges whose support reaches ``support_threshold``
+    (default 0.5). ``reduce`` writes the transitive reduction of the implications
+    instead of all of them.
+
+    Only a graph derived from the test's graph and owned by the caller can be a target.
+    """
+    permission_classes = [IsTeacher | IsExpert]
+
     def post(self, request, test_id):
-        test = get_object_or_404(Test, pk=test_id)
+        from app.iita import (
+            MAX_RESAMPLES, attempts_matrix, bootstrap as bootstrap_iita, implications as iita_implications,
+            refresh as refresh_iita_statistics,
+        )
+
+        test = get_object_or_404(Test.objects.select_related('graph'), pk=test_id)
         original_graph = test.graph
+        nodes = list(original_graph.nodes.prefetch_related('questions'))
+
+        target_graph = None
+        if request.data.get('target_graph_id') is not None:
+            target_graph = get_object_or_404(KnowledgeGraph, pk=request.data['target_graph_id'])
+            if target_graph.derived_from_id != original_graph.id or target_graph.created_by_id != request.user.id:
+                return Response(
+                    {"error": "The target must be a graph you derived from this test's graph."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        support = None
+        if request.data.get('bootstrap'):
+            try:
+                resamples = int(request.data['bootstrap'])
+                threshold = float(request.data.get('support_threshold', 0.5))
+                seed = request.data.get('seed')
+                seed = int(seed) if seed is not None else None
+            except (TypeError, ValueError):
+                return Response(
+                    {"error": "bootstrap and seed must be integers, support_threshold a number."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            if not 1 <= resamples <= MAX_RESAMPLES or not 0 <= threshold <= 1:
+                return Response(
+                    {"error": f"bootstrap must be between 1 and {MAX_RESAMPLES}, support_threshold between 0 and 1."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            node_ids = [node.id for node in nodes]
+            matrix = attempts_matrix(test, node_ids)
+            if not len(matrix):
+                return Response({"error": "No attempts to analyze."}, status=status.HTTP_400_BAD_REQUEST)
+            frequencies = bootstrap_iita(matrix, resamples, seed=seed)
+            support = [
+                {"source": node_ids[prereq_idx], "target": node_ids[target_idx], "support": round(frequency, 4)}
+                for prereq_idx, row in enumerate(frequencies.tolist())
+                for target_idx, frequency in enumerate(row)
+                if frequency > 0 and prereq_idx != target_idx
+            ]
+            support.sort(key=lambda edge: -edge["support"])
+            implied_edges = [(edge["source"], edge["target"]) for edge in support if edge["support"] >= threshold]
+        elif request.data.get('incremental'):
+            stats = refresh_iita_statistics(test)
+            if not stats.attempts:
+                return Response({"error": "No attempts to analyze."}, status=status.HTTP_400_BAD_REQUEST)
+            pairs, error_rate, fit = iita_implications(stats.attempts, stats.solved, stats.counterexamples)
+            logger.debug("Incremental IITA over %d attempts: error rate %.4f, fit %.4f", stats.attempts, error_rate, fit)
+            implied_edges = [(stats.nodes[prereq_idx], stats.nodes[target_idx]) for prereq_idx, target_idx in pairs]
+        else:
+            implied_edges = self.implied_edges(test, nodes)
+            if isinstance(implied_edges, Response):
+                return implied_edges
+
+        if request.data.get('reduce'):
+            try:
+                implied_edges = derived_graphs.reduce_edges(implied_edges)
+            except ValueError:
+                # Three or more equivalent nodes leave a cycle; write every implication
+                logger.warning("IITA implications for test %s are cyclic, not reducing them", test.id)
+
+        if target_graph is not None:
+            response = self.update_graph(target_graph, nodes, implied_edges)
+        else:
+            response = self.clone_graph(original_graph, nodes, implied_edges, request.user.id)
+        if support is not None and response.status_code < 400:
+            response.data["support"] = support
+        return response
+
+    def implied_edges(self, test, nodes):
+        """(prerequisite node id, dependent node id) pairs from IITA over all attempts."""
+        # Imported on first use: pandas and learning_spaces dominate worker start-up
+        # time and memory, and nothing else needs them
+        import pandas as pd
+        from learning_spaces.kst import iita
 
         attempts = TestAttempt.objects.filter(test=test)
-        nodes = list(original_graph.nodes.all())
 
         # Map index -> original node ID
         index_to_node_id = {idx: node.id for idx, node in enumerate(nodes)}
@@ -515,6 +1175,10 @@ class GenerateGraphFromIITA(APIView):
         # Create the binary matrix (users x questions)
         data = []
         for attempt in attempts:
+            if attempt.inferred_nodes is not None:
+                # Adaptive attempt: the session decided every node, asked or not
+                data.append([int(bool(attempt.inferred_nodes.get(str(node.id)))) for node in nodes])
+                continue
             row = []
             for node_index, node in enumerate(nodes):
                 node_questions = node.questions.all()
@@ -550,11 +1214,17 @@ class GenerateGraphFromIITA(APIView):
 
         implications = response.get("implications", [])
         logger.debug("IITA raw implications (index-based): %s", implications)
+        return [
+            (index_to_node_id.get(prereq_idx), index_to_node_id.get(target_idx))
+            for prereq_idx, target_idx in implications
+        ]
 
-        # Create new graph
+    def clone_graph(self, original_graph, nodes, implied_edges, created_by_id):
+        # Create new graph, owned by the caller so they can update it later
         new_graph = KnowledgeGraph.objects.create(
             title=f"{original_graph.title} (IITA)",
-            created_by=original_graph.created_by
+            created_by_id=created_by_id,
+            derived_from=original_graph,
         )
 
         # Clone nodes and questions
@@ -577,10 +1247,7 @@ class GenerateGraphFromIITA(APIView):
         # Apply implications: A → B means B has A as prerequisite
         added_dependencies = set()
 
-        for prereq_idx, target_idx in implications:
-            prereq_node_id = index_to_node_id.get(prereq_idx)
-            target_node_id = index_to_node_id.get(target_idx)
-
+        for prereq_node_id, target_node_id in implied_edges:
             prerequisite_node = node_mapping.get(prereq_node_id)
             target_node = node_mapping.get(target_node_id)
 
@@ -597,14 +1264,66 @@ class GenerateGraphFromIITA(APIView):
                     target_node.prerequisite_nodes.add(prerequisite_node)
                     added_dependencies.add(forward_edge)
 
-        return Response({"message": "New graph created successfully"}, status=status.HTTP_201_CREATED)
+        return Response({"message": "New graph created successfully", "graph_id": new_graph.id}, status=status.HTTP_201_CREATED)
+
+    def update_graph(self, target_graph, nodes, implied_edges):
+        """Replace the edges of a graph derived earlier, matching its nodes by title."""
+        target_nodes = {}
+        for node in target_graph.nodes.all():
+            target_nodes.setdefault(node.title, []).append(node)
+        mapping = {}
+        for node in nodes:
+            matches = target_nodes.get(node.title, [])
+            if len(matches) != 1:
+                return Response(
+                    {"error": f"Target graph must have exactly one node titled '{node.title}'."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            mapping[node.id] = matches[0]
+
+        desired = set()
+        for prereq_node_id, target_node_id in implied_edges:
+            if prereq_node_id not in mapping or target_node_id not in mapping:
+                continue
+            edge = (mapping[prereq_node_id].id, mapping[target_node_id].id)
+            # Equivalent nodes imply both directions; keep the first, as when cloning
+            if edge[::-1] not in desired:
+                desired.add(edge)
+
+        # Edges touching nodes the test's graph does not have are the teacher's; leave them
+        mapped = [node.id for node in mapping.values()]
+        Edge = GraphNode.dependent_nodes.through
+        current = set(
+            Edge.objects.filter(from_graphnode_id__in=mapped, to_graphnode_id__in=mapped)
+            .values_list('from_graphnode_id', 'to_graphnode_id')
+        )
+        added, removed = defaultdict(list), defaultdict(list)
+        for prereq_id, dependent_id in desired - current:
+            added[dependent_id].append(prereq_id)
+        for prereq_id, dependent_id in current - desired:
+            removed[dependent_id].append(prereq_id)
+
+        nodes_by_id = {node.id: node for node in mapping.values()}
+        with transaction.atomic():
+            # Through the related managers, so the graph's change log records the edges
+            for dependent_id, prereq_ids in removed.items():
+                nodes_by_id[dependent_id].prerequisite_nodes.remove(*prereq_ids)
+            for dependent_id, prereq_ids in added.items():
+                nodes_by_id[dependent_id].prerequisite_nodes.add(*prereq_ids)
+
+        return Response({
+            "message": "Graph updated successfully",
+            "graph_id": target_graph.id,
+            "added": len(desired - current),
+            "removed": len(current - desired),
+        }, status=status.HTTP_200_OK)
 
 class TestsForGraphView(APIView):
     """
     Retrieve all tests for a specific graph.
     """
     def get(self, request, graph_id):
-        tests = Test.objects.filter(graph_id=graph_id)
+        tests = Test.objects.filter(graph_id=graph_id).select_related('author', 'graph')
         serializer = TestGraphSerializer(tests, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -620,16 +1339,20 @@ class QuestionsForTestView(APIView):
 
 class DownloadIQTFormView(APIView):
     """
-    Generate and return an IMS QTI file for the test.
+    Generate and return an IMS QTI file for the test. ``seed`` picks another answer
+    order; the same seed always gives the same file.
     """
     def get(self, request, test_id):
         test = get_object_or_404(Test, pk=test_id)
 
-        tree = generate_qti(test_id)
-        
-        response = HttpResponse(content_type='application/xml')
+        try:
+            seed = int(request.query_params.get('seed', DEFAULT_QTI_SEED))
+        except ValueError:
+            return Response({"error": "seed must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        document = generate_qti(test_id, seed)
+
+        response = HttpResponse(document, content_type='application/xml')
         response['Content-Disposition'] = f'attachment; filename="test_{test_id}_qti.xml"'
-        tree.write(response, encoding="utf-8", xml_declaration=True)
 
         return response
     
\ No newline at end of file
@@ -0,0 +1,12 @@
+"""
+Initializers for process pools. Workers are spawned rather than forked so they never
+share the parent's database connections; this module must therefore stay importable
+before Django is set up (no model imports at module level).
+"""
+import os
+
+
+def setup_django():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    django.setup()